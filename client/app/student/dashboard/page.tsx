@@ -12,7 +12,9 @@ import { getAuthToken } from "@/lib/auth"
 interface Quiz {
   id: number
   title: string
-  questions: Array<{
+  // Dashboard summaries carry question_count; /student/quizzes/available carries the questions
+  question_count?: number
+  questions?: Array<{
     question_text: string
     options: string[]
     correct_answer: number
@@ -147,6 +149,7 @@ export default function StudentDashboard() {
   const pendingQuizzesCount = dashboardData?.pending_quizzes || pendingQuizzes.length
   const pendingEssaysCount = dashboardData?.pending_essays || pendingEssays.length
   const completedCount = dashboardData?.completed_assignments || 0
+  const questionCount = (quiz: Quiz) => quiz.question_count ?? quiz.questions?.length ?? 0
 
   return (
     <StudentLayout>
@@ -215,7 +218,7 @@ export default function StudentDashboard() {
                       <div className="flex-1">
                         <h3 className="font-medium">{quiz.title}</h3>
                         <p className="text-sm text-muted-foreground">
-                          {quiz.questions.length} question{quiz.questions.length !== 1 ? 's' : ''}
+                          {questionCount(quiz)} question{questionCount(quiz) !== 1 ? 's' : ''}
                         </p>
                         <div className="flex items-center mt-2">
                           <Clock className="h-4 w-4 mr-1 text-muted-foreground" />
@@ -11,11 +11,7 @@ import { getAuthToken } from "@/lib/auth" // Import the auth function
 interface Quiz {
   id: number
   title: string
-  questions: Array<{
-    question_text: string
-    options: string[]
-    correct_answer: number
-  }>
+  question_count: number
   teacher_id: number
   created_at: string
 }
@@ -66,8 +62,8 @@ export default function TeacherDashboard() {
         const quizzesData = await quizzesResponse.json()
         setQuizzes(quizzesData)
 
-        // Fetch essays with proper authorization
-        const essaysResponse = await fetch('https://atheno-1.onrender.com/teacher/essays', {
+        // Fetch essays with proper authorization (rubric is not in the default summary)
+        const essaysResponse = await fetch('https://atheno-1.onrender.com/teacher/essays?fields=all', {
           method: 'GET',
           headers: {
             'Authorization': `Bearer ${token}`,
@@ -168,7 +164,7 @@ export default function TeacherDashboard() {
             </CardHeader>
             <CardContent>
               <div className="text-2xl font-bold">
-                {quizzes.reduce((total, quiz) => total + quiz.questions.length, 0)}
+                {quizzes.reduce((total, quiz) => total + quiz.question_count, 0)}
               </div>
               <p className="text-xs text-muted-foreground">Across all quizzes</p>
             </CardContent>
@@ -252,7 +248,7 @@ export default function TeacherDashboard() {
                       <div className="flex-1">
                         <p className="font-medium truncate">{quiz.title}</p>
                         <p className="text-sm text-muted-foreground">
-                          {quiz.questions.length} question{quiz.questions.length !== 1 ? 's' : ''}
+                          {quiz.question_count} question{quiz.question_count !== 1 ? 's' : ''}
                         </p>
                         <div className="flex items-center mt-1 text-xs text-muted-foreground">
                           <Calendar className="h-3 w-3 mr-1" />
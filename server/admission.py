@@ -0,0 +1,88 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from fastapi import Depends, HTTPException, Request
+
+import lifecycle
+import models
+from auth import get_current_user
+from config import settings
+
+# Bounded so one worker can't grow without limit on distinct users
+MAX_BUCKETS = 50000
+
+
+def _parse_limit(value: str) -> Tuple[float, float]:
+    """"per_minute:burst" -> (tokens per second, capacity)."""
+    per_minute, _, burst = value.partition(":")
+    rate = float(per_minute) / 60.0
+    return rate, float(burst or per_minute)
+
+
+class TokenBuckets:
+    """Per-key token buckets, kept per worker in LRU order."""
+
+    def __init__(self):
+        self._buckets: "OrderedDict[Tuple[int, str], Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: Tuple[int, str], rate: float, capacity: float) -> float:
+        """Spend one token; returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate if rate > 0 else 60.0
+            while len(self._buckets) > MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+buckets = TokenBuckets()
+
+LIMITS: Dict[str, Tuple[float, float]] = {
+    "read": _parse_limit(settings.RATE_LIMIT_READ),
+    "write": _parse_limit(settings.RATE_LIMIT_WRITE),
+    "llm": _parse_limit(settings.RATE_LIMIT_LLM),
+}
+
+
+def check_rate(user_id: int, route_class: str):
+    rate, capacity = LIMITS[route_class]
+    if rate <= 0:
+        return
+    wait = buckets.take((user_id, route_class), rate, capacity)
+    if wait:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests, retry in {math.ceil(wait)}s",
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
+
+
+def rate_limit_request(request: Request, current_user: models.User = Depends(get_current_user)):
+    """Router-wide dependency: reads and writes are limited separately."""
+    route_class = "read" if request.method in ("GET", "HEAD", "OPTIONS") else "write"
+    check_rate(current_user.id, route_class)
+
+
+def admit_llm(current_user: models.User = Depends(get_current_user)):
+    """For endpoints that call the LLM: a stricter per-user rate plus a cap on
+    grading already in flight on this worker. Over capacity answers 503 at
+    once instead of queueing behind minutes of LLM calls."""
+    check_rate(current_user.id, "llm")
+    in_flight = lifecycle.in_flight_counts().get("essay_grading", 0)
+    if in_flight >= settings.LLM_MAX_IN_FLIGHT:
+        raise HTTPException(
+            status_code=503,
+            detail="Essay grading is at capacity, please retry shortly",
+            headers={"Retry-After": str(settings.LLM_RETRY_AFTER_SECONDS)}
+        )
@@ -1,62 +1,179 @@
-from groq import Groq
-from typing import Dict, Any
-import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+import asyncio
+import contextvars
+import time
+
+import section_cache
+from config import settings
+from feedback_parser import parse_feedback, record as record_parse
+from lifecycle import in_flight
+from llm_router import ProviderRouter, parse_providers
+from model_policy import Decision, class_providers, decide
+from prompt_builder import EssayPrompt, count_tokens, merge_chunk_feedback
+from text_metrics import apply_essay_metrics, metrics_summary, provisional_scores
+
+MAX_PARALLEL_CHUNKS = 4
 
 class AIFeedbackService:
     def __init__(self):
-        # Initialize Groq client (make sure GROQ_API_KEY is set in your env)
-        self.client = Groq()
+        # One provider router per model class (GROQ_API_KEY / OPENAI_API_KEY must be
+        # set for those backends); classes with the same provider list share a router
+        by_spec: Dict[str, ProviderRouter] = {}
+        self.routers: Dict[str, ProviderRouter] = {}
+        for model_class, spec in class_providers().items():
+            if spec not in by_spec:
+                by_spec[spec] = ProviderRouter(parse_providers(spec))
+            self.routers[model_class] = by_spec[spec]
+
+    def reset_client(self):
+        # Provider clients own connection pools; never share them across a fork
+        for router in set(self.routers.values()):
+            router.reset()
+
+    def provider_stats(self) -> Dict[str, Any]:
+        return {model_class: router.stats() for model_class, router in self.routers.items()}
 
-    async def generate_essay_feedback(self, essay_text: str, rubric: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate_essay_feedback(
+        self, essay_text: str, rubric: Dict[str, Any], metrics: Optional[Dict[str, Any]] = None,
+        tier: Optional[str] = None, revision: bool = False
+    ) -> Dict[str, Any]:
+        """`revision`: the essay was graded before in some form (see
+        crud.is_revision); only revisions are graded in cached sections."""
+        # Grading blocks on the LLM; off the event loop so this worker keeps
+        # serving (and admit_llm sees the in-flight count) meanwhile
+        with in_flight("essay_grading"):
+            return await asyncio.to_thread(self._generate_essay_feedback, essay_text, rubric, metrics, tier, revision)
+
+    def _generate_essay_feedback(
+        self, essay_text: str, rubric: Dict[str, Any], metrics: Optional[Dict[str, Any]] = None,
+        tier: Optional[str] = None, revision: bool = False
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        decision = decide(essay_text, rubric, tier)
         try:
-            prompt = f"""
-            Analyze this essay and provide feedback based on the following rubric: {rubric}
-            
-            Essay: {essay_text}
-            
-            Provide feedback in JSON format with:
-            - grammar_score (0-100)
-            - clarity_score (0-100)
-            - keyword_usage_score (0-100)
-            - overall_feedback (string)
-            - strengths (list of strings)
-            - weaknesses (list of strings)
-            - suggestions (list of strings)
-            """
-
-            response = self.client.chat.completions.create(
-                model="openai/gpt-oss-20b",  # Groq model
-                messages=[
-                    {"role": "system", "content": "You are an experienced English teacher providing detailed essay feedback."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_completion_tokens=1000,
-                top_p=1,
-                reasoning_effort="medium",
-                stream=False  # disable streaming for easier parsing
+            notes = metrics_summary(metrics) if metrics else ""
+            essay_prompt = EssayPrompt(
+                essay_text, rubric, notes=notes, max_output_tokens=decision.max_output_tokens,
+                section_tokens=settings.ESSAY_SECTION_TOKENS if settings.ESSAY_INCREMENTAL_GRADING and revision else None
             )
 
-            feedback_text = response.choices[0].message.content
-            return self._parse_feedback(feedback_text)
+            if not essay_prompt.chunked:
+                feedback = self._complete(essay_prompt, 0, decision)
+            else:
+                count = len(essay_prompt.chunks)
+                # Sections graded before (e.g. in an earlier draft) come from the
+                # cache; only the changed ones go to the LLM
+                keys = [
+                    section_cache.key(decision.model_class, decision.reasoning_effort,
+                                      essay_prompt.max_output_tokens, essay_prompt.messages(i))
+                    for i in range(count)
+                ] if essay_prompt.sectioned else []
+                cached = section_cache.load(keys)
+                pending = [i for i in range(count) if not keys or keys[i] not in cached]
+
+                # Map: grade chunks concurrently (same cached prefix), then reduce locally
+                fresh = {}
+                if pending:
+                    with ThreadPoolExecutor(max_workers=min(len(pending), MAX_PARALLEL_CHUNKS)) as pool:
+                        futures = {
+                            i: pool.submit(contextvars.copy_context().run, self._complete, essay_prompt, i, decision)
+                            for i in pending
+                        }
+                        fresh = {i: future.result() for i, future in futures.items()}
+                if keys:
+                    section_cache.store({keys[i]: result for i, result in fresh.items() if "error" not in result})
+
+                results = [fresh[i] if i in fresh else cached[keys[i]] for i in range(count)]
+                feedback = merge_chunk_feedback(results, [count_tokens(c) for c in essay_prompt.chunks])
+                feedback["chunks"] = count
+                if essay_prompt.sectioned:
+                    feedback["sections_reused"] = count - len(pending)
+                    if metrics:
+                        # Section prompts carry no whole-essay notes (they'd change the
+                        # cache key on every edit), so those measures are applied here
+                        apply_essay_metrics(feedback, metrics)
+                providers = {r["provider"] for r in fresh.values() if r.get("provider")}
+                feedback["provider"] = ",".join(sorted(providers)) or "cache"
+
+            if essay_prompt.truncated:
+                feedback["truncated"] = True
+            outcome = "unparsed" if "error" in feedback else "ok"
 
         except Exception as e:
+            outcome = "failed"
+            if metrics:
+                # Better than nothing: metric-based estimates, clearly marked
+                feedback = {
+                    **provisional_scores(metrics),
+                    "overall_feedback": "AI feedback is unavailable; scores are estimated from text statistics.",
+                    "strengths": [],
+                    "weaknesses": [],
+                    "suggestions": [
+                        f"Consider addressing: {', '.join(metrics['keywords_missing'][:5])}"
+                    ] if metrics.get("keywords_missing") else [],
+                    "provisional": True,
+                    "provider": "local",
+                    "error": str(e)
+                }
+            else:
+                feedback = {
+                    "grammar_score": 75,
+                    "clarity_score": 70,
+                    "keyword_usage_score": 65,
+                    "overall_feedback": "Basic feedback generated",
+                    "strengths": ["Good structure", "Clear introduction"],
+                    "weaknesses": ["Need more examples", "Grammar needs improvement"],
+                    "suggestions": ["Add more supporting evidence", "Review grammar rules"],
+                    "provider": "fallback",
+                    "error": str(e)
+                }
+
+        # Popped and stored by crud.save_essay_feedback
+        feedback["routing"] = decision.record((time.perf_counter() - started) * 1000, outcome)
+        return feedback
+
+    def _complete(self, essay_prompt: EssayPrompt, index: int, decision: Decision) -> Dict[str, Any]:
+        # Provider-neutral; each provider adds its model (see llm_router.py)
+        request = {
+            "messages": essay_prompt.messages(index),
+            "temperature": 0.7,
+            "max_completion_tokens": essay_prompt.max_output_tokens,
+            "top_p": 1,
+            "reasoning_effort": decision.reasoning_effort,
+        }
+        response_format = self._response_format(essay_prompt)
+        if response_format:
+            request["response_format"] = response_format
+
+        # Near-valid JSON is repaired locally; only unusable responses are retried
+        for attempt in range(settings.LLM_PARSE_RETRIES + 1):
+            if attempt:
+                record_parse("retried")
+            feedback_text, provider = self.routers[decision.model_class].complete(request)
+            decision.add_usage(provider, request["messages"], feedback_text)
+            feedback = self._parse_feedback(feedback_text, essay_prompt.rubric)
+            feedback["provider"] = provider
+            if "error" not in feedback:
+                break
+        return feedback
+
+    def _response_format(self, essay_prompt: EssayPrompt) -> Optional[Dict[str, Any]]:
+        if settings.LLM_RESPONSE_FORMAT == "json_schema":
             return {
-                "grammar_score": 75,
-                "clarity_score": 70,
-                "keyword_usage_score": 65,
-                "overall_feedback": "Basic feedback generated",
-                "strengths": ["Good structure", "Clear introduction"],
-                "weaknesses": ["Need more examples", "Grammar needs improvement"],
-                "suggestions": ["Add more supporting evidence", "Review grammar rules"],
-                "error": str(e)
+                "type": "json_schema",
+                "json_schema": {"name": "essay_feedback", "schema": essay_prompt.schema}
             }
+        if settings.LLM_RESPONSE_FORMAT == "json_object":
+            return {"type": "json_object"}
+        return None
 
-    def _parse_feedback(self, feedback_text: str) -> Dict[str, Any]:
-        try:
-            return json.loads(feedback_text)
-        except:
+    def _parse_feedback(self, feedback_text: str, rubric: Any = None) -> Dict[str, Any]:
+        feedback, outcome = parse_feedback(feedback_text, rubric)
+        record_parse(outcome)
+        if feedback is None:
             return {"error": "Could not parse AI feedback", "raw": feedback_text}
+        return feedback.model_dump(exclude_none=True)
 
 
 # Usage
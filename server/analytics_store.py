@@ -0,0 +1,541 @@
+# Columnar copy of submissions and scores for analytics.
+#
+# With ANALYTICS_CHANGE_FEED on, every ORM write to a submission adds a row to
+# the submission_changes outbox in the same transaction. The sidecar
+# (`python analytics_store.py`, one per deployment) drains it into append-only
+# Parquet segments under ANALYTICS_STORE_DIR, snapshots the small quizzes /
+# essays / users tables and compacts segments. With ANALYTICS_READS on,
+# analytics endpoints query those files through embedded DuckDB while the
+# store is within ANALYTICS_MAX_STALENESS_SECONDS, and the database otherwise.
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event, func, literal, select
+from sqlalchemy.orm import Session
+
+import roster
+import timeseries
+from config import settings
+from database import SessionLocal
+from models import Essay, EssaySubmission, Quiz, QuizSubmission, SubmissionChange, User
+
+MANIFEST = "manifest.json"
+# Files dropped from the manifest are deleted after this, so in-flight reads finish
+DELETE_GRACE_SECONDS = 300
+# Outbox batches per sync before publishing what's done
+MAX_BATCHES_PER_SYNC = 100
+
+# Table -> (model, replicated columns)
+FACTS = {
+    "quiz_submissions": (QuizSubmission, ("id", "quiz_id", "student_id", "score", "answers", "submitted_at")),
+    "essay_submissions": (EssaySubmission, ("id", "essay_id", "student_id", "score", "submitted_at")),
+}
+DIMENSIONS = {
+    "quizzes": (Quiz, ("id", "teacher_id", "title")),
+    "essays": (Essay, ("id", "teacher_id")),
+    "users": (User, ("id", "name")),
+}
+_TEXT_COLUMNS = {"title", "name", "answers"}
+
+logger = logging.getLogger(__name__)
+
+
+# Change feed
+
+def _record_change(mapper, connection, target):
+    connection.execute(SubmissionChange.__table__.insert(), {"table_name": target.__tablename__, "row_id": target.id})
+
+
+def record_rows(connection, table: str, whereclause=None):
+    """Queue every row of a fact table matching `whereclause` as changed.
+    For writes the mapper events never see: bulk and Core deletes/updates
+    (recorded by _record_bulk_write) and dropped partitions. Call before
+    the rows go; the sidecar turns ids it can't find into tombstones."""
+    if not settings.ANALYTICS_CHANGE_FEED:
+        return
+    columns = FACTS[table][0].__table__.c
+    ids = select(literal(table), columns.id)
+    if whereclause is not None:
+        ids = ids.where(whereclause)
+    connection.execute(SubmissionChange.__table__.insert().from_select(["table_name", "row_id"], ids))
+
+
+def _record_bulk_write(state):
+    # query().delete()/update() and session.execute(table.delete()) bypass after_* events
+    if (state.is_delete or state.is_update) and getattr(state.statement, "table", None) is not None:
+        table = state.statement.table.name
+        if table in FACTS:
+            record_rows(state.session.connection(), table, state.statement.whereclause)
+
+
+if settings.ANALYTICS_CHANGE_FEED:
+    for _model in (QuizSubmission, EssaySubmission):
+        for _name in ("after_insert", "after_update", "after_delete"):
+            event.listen(_model, _name, _record_change)
+    event.listen(Session, "do_orm_execute", _record_bulk_write)
+
+
+# Sidecar
+
+def _path(*parts: str) -> str:
+    return os.path.join(settings.ANALYTICS_STORE_DIR, *parts)
+
+
+def load_manifest() -> Optional[Dict[str, Any]]:
+    try:
+        with open(_path(MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(manifest: Dict[str, Any]):
+    temporary = _path(MANIFEST + ".tmp")
+    with open(temporary, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temporary, _path(MANIFEST))
+
+
+def _schema(columns: Sequence[str], fact: bool):
+    import pyarrow as pa
+
+    fields = []
+    for name in columns:
+        if name == "submitted_at":
+            # Naive UTC: DuckDB buckets it without a time zone setting
+            fields.append((name, pa.timestamp("us")))
+        elif name == "score":
+            fields.append((name, pa.float64()))
+        elif name in _TEXT_COLUMNS:
+            fields.append((name, pa.string()))
+        else:
+            fields.append((name, pa.int64()))
+    if fact:
+        fields += [("_seq", pa.int64()), ("_deleted", pa.bool_())]
+    return pa.schema(fields)
+
+
+def _cell(name: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if name == "answers":
+        return json.dumps(value)
+    if name == "submitted_at" and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _write(path: str, rows: List[Dict[str, Any]], columns: Sequence[str], fact: bool) -> str:
+    """Write rows to a Parquet file (atomically) and return its store-relative path."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(_path(path)), exist_ok=True)
+    temporary = _path(path + ".tmp")
+    pq.write_table(pa.Table.from_pylist(rows, schema=_schema(columns, fact)), temporary, compression="zstd")
+    os.replace(temporary, _path(path))
+    return path
+
+
+def _fact_rows(db, table: str, ids: Optional[List[int]], seq: int) -> List[Dict[str, Any]]:
+    """Current state of the given rows (all rows if `ids` is None); ids that
+    no longer exist become tombstones."""
+    model, columns = FACTS[table]
+    query = db.query(*(getattr(model, name) for name in columns))
+    found = []
+    if ids is None:
+        found = query.order_by(model.id).yield_per(10000)
+    else:
+        found = [row for start in range(0, len(ids), 1000)
+                 for row in query.filter(model.id.in_(ids[start:start + 1000]))]
+    rows, seen = [], set()
+    for row in found:
+        rows.append({**{name: _cell(name, value) for name, value in zip(columns, row)}, "_seq": seq, "_deleted": False})
+        seen.add(row[0])
+    for missing in sorted(set(ids or ()) - seen):
+        rows.append({**{name: None for name in columns}, "id": missing, "_seq": seq, "_deleted": True})
+    return rows
+
+
+def _retire(manifest: Dict[str, Any], paths: Sequence[str]):
+    manifest["retired"] = manifest.get("retired", []) + [{"path": path, "at": time.time()} for path in paths]
+
+
+def _write_dimensions(db, manifest: Dict[str, Any]):
+    for name, (model, columns) in DIMENSIONS.items():
+        rows = [dict(zip(columns, row)) for row in db.query(*(getattr(model, column) for column in columns))]
+        if name in manifest["dimensions"]:
+            _retire(manifest, [manifest["dimensions"][name]])
+        manifest["dimensions"][name] = _write(f"dims/{name}-{manifest['seq']:08d}.parquet", rows, columns, fact=False)
+    manifest["dimensions_at"] = time.time()
+
+
+def _bootstrap(db) -> Dict[str, Any]:
+    """Full copy of every fact table as segment 1. Outbox rows already present
+    are applied afterwards anyway; re-applying a change is harmless."""
+    manifest = {"seq": 1, "synced_at": None, "facts": {}, "dimensions": {}}
+    for table, (_, columns) in FACTS.items():
+        rows = _fact_rows(db, table, None, 1)
+        manifest["facts"][table] = [_write(f"{table}/seg-00000001.parquet", rows, columns, fact=True)]
+    _write_dimensions(db, manifest)
+    return manifest
+
+
+def _compact(manifest: Dict[str, Any], table: str):
+    """Merge every segment of a table into one file with the latest version
+    of each row; tombstones have nothing left to shadow and are dropped."""
+    import duckdb
+
+    files = manifest["facts"][table]
+    path = f"{table}/base-{manifest['seq']:08d}.parquet"
+    temporary = _path(path + ".tmp")
+    connection = duckdb.connect()
+    try:
+        connection.execute(
+            f"COPY (SELECT * FROM {_read(files)} "
+            f"QUALIFY row_number() OVER (PARTITION BY id ORDER BY _seq DESC) = 1 AND NOT _deleted ORDER BY id) "
+            f"TO '{_quote(temporary)}' (FORMAT PARQUET, COMPRESSION ZSTD)"
+        )
+    finally:
+        connection.close()
+    os.replace(temporary, _path(path))
+    _retire(manifest, files)
+    manifest["facts"][table] = [path]
+
+
+def _remove_unlisted(manifest: Dict[str, Any]):
+    """Delete retired files once readers have had DELETE_GRACE_SECONDS to move
+    on, and files a crashed sync wrote but never published."""
+    cutoff = time.time() - DELETE_GRACE_SECONDS
+    manifest["retired"] = [entry for entry in manifest.get("retired", []) if entry["at"] >= cutoff]
+    keep = [path for paths in manifest["facts"].values() for path in paths]
+    keep += list(manifest["dimensions"].values()) + [entry["path"] for entry in manifest["retired"]]
+    keep = {os.path.normpath(_path(path)) for path in keep}
+    for directory, _, names in os.walk(settings.ANALYTICS_STORE_DIR):
+        for name in names:
+            path = os.path.normpath(os.path.join(directory, name))
+            if ".parquet" in name and path not in keep and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+
+
+def sync_once() -> Dict[str, Any]:
+    """Apply pending outbox changes as new segments and publish the manifest.
+    synced_at only advances when the outbox was drained, so it's a lower
+    bound: every change committed before it is in the store."""
+    os.makedirs(settings.ANALYTICS_STORE_DIR, exist_ok=True)
+    started = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        manifest = load_manifest() or _bootstrap(db)
+        applied = 0
+        drained = False
+        for _ in range(MAX_BATCHES_PER_SYNC):
+            changes = db.query(SubmissionChange.id, SubmissionChange.table_name, SubmissionChange.row_id).order_by(
+                SubmissionChange.id
+            ).limit(settings.ANALYTICS_SYNC_BATCH).all()
+            if not changes:
+                drained = True
+                break
+            manifest["seq"] += 1
+            for table, (_, columns) in FACTS.items():
+                ids = sorted({row_id for _, name, row_id in changes if name == table})
+                if ids:
+                    rows = _fact_rows(db, table, ids, manifest["seq"])
+                    manifest["facts"][table].append(
+                        _write(f"{table}/seg-{manifest['seq']:08d}.parquet", rows, columns, fact=True)
+                    )
+            # Publish before deleting: a crash in between only re-applies the batch
+            _write_manifest(manifest)
+            db.query(SubmissionChange).filter(
+                SubmissionChange.id.in_([change_id for change_id, _, _ in changes])
+            ).delete(synchronize_session=False)
+            db.commit()
+            applied += len(changes)
+            if len(changes) < settings.ANALYTICS_SYNC_BATCH:
+                drained = True
+                break
+
+        if applied or time.time() - manifest.get("dimensions_at", 0) > settings.ANALYTICS_DIMENSION_REFRESH_SECONDS:
+            _write_dimensions(db, manifest)
+        for table in FACTS:
+            if len(manifest["facts"][table]) > settings.ANALYTICS_COMPACT_SEGMENTS:
+                _compact(manifest, table)
+        if drained:
+            manifest["synced_at"] = started.isoformat()
+        _remove_unlisted(manifest)
+        _write_manifest(manifest)
+        return {"applied": applied, "drained": drained, "seq": manifest["seq"]}
+    finally:
+        db.close()
+
+
+def run_forever():
+    logger.info("Analytics sidecar syncing to %s every %ss", settings.ANALYTICS_STORE_DIR, settings.ANALYTICS_SYNC_SECONDS)
+    while True:
+        started = time.monotonic()
+        try:
+            result = sync_once()
+            if result["applied"]:
+                logger.info("Analytics sync: %s changes, seq %s", result["applied"], result["seq"])
+        except Exception:
+            logger.exception("Analytics sync failed")
+        time.sleep(max(0.0, settings.ANALYTICS_SYNC_SECONDS - (time.monotonic() - started)))
+
+
+def status(db) -> Dict[str, Any]:
+    manifest = load_manifest()
+    synced_at = datetime.fromisoformat(manifest["synced_at"]) if manifest and manifest.get("synced_at") else None
+    return {
+        "enabled": settings.ANALYTICS_READS,
+        "synced_at": synced_at,
+        "staleness_seconds": round((datetime.now(timezone.utc) - synced_at).total_seconds(), 1) if synced_at else None,
+        "max_staleness_seconds": settings.ANALYTICS_MAX_STALENESS_SECONDS,
+        "seq": manifest["seq"] if manifest else None,
+        "segments": {table: len(paths) for table, paths in manifest["facts"].items()} if manifest else {},
+        "pending_changes": db.query(func.count(SubmissionChange.id)).scalar(),
+    }
+
+
+# Readers
+
+def _quote(value: str) -> str:
+    return value.replace("'", "''")
+
+
+def _read(paths: Sequence[str]) -> str:
+    return "read_parquet([" + ", ".join(f"'{_quote(_path(path))}'" for path in paths) + "])"
+
+
+class Snapshot:
+    """One published manifest, queried through an in-memory DuckDB connection.
+    Fact views resolve each row to its latest segment and hide deletions."""
+
+    def __init__(self, manifest: Dict[str, Any], mtime: float):
+        import duckdb
+
+        self.mtime = mtime
+        self.as_of = datetime.fromisoformat(manifest["synced_at"])
+        self.files = _files(manifest)
+        self.pid = os.getpid()
+        self.connection = duckdb.connect()
+        for table, paths in manifest["facts"].items():
+            self.connection.execute(
+                f"CREATE VIEW {table} AS SELECT * EXCLUDE (_seq, _deleted) FROM {_read(paths)} "
+                f"QUALIFY row_number() OVER (PARTITION BY id ORDER BY _seq DESC) = 1 AND NOT _deleted"
+            )
+        for name, path in manifest["dimensions"].items():
+            self.connection.execute(f"CREATE VIEW {name} AS SELECT * FROM {_read([path])}")
+
+    def staleness(self) -> float:
+        return (datetime.now(timezone.utc) - self.as_of).total_seconds()
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        # A cursor per call: DuckDB connections aren't safe to share across threads
+        cursor = self.connection.cursor()
+        try:
+            return cursor.execute(sql, list(params)).fetchall()
+        finally:
+            cursor.close()
+
+    def student_analytics(
+        self,
+        teacher_id: int,
+        sort: str = "overall_score",
+        descending: bool = True,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+        at_risk: Optional[int] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Same contract as roster.student_analytics."""
+        having, params = [], [teacher_id, roster.UNSCORED_ESSAY_SCORE, teacher_id]
+        if min_score is not None:
+            having.append("overall_score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            having.append("overall_score <= ?")
+            params.append(max_score)
+        if at_risk is not None:
+            having.append("overall_score < ?")
+            params.append(roster.AT_RISK_THRESHOLD)
+            order = "overall_score ASC, u.id"
+            limit, offset = at_risk, 0
+        else:
+            column = {"overall_score": "overall_score", "student_name": "u.name",
+                      "quiz_count": "quiz_count", "essay_count": "essay_count"}[sort]
+            order = f"{column} {'DESC' if descending else 'ASC'}, u.id"
+
+        grouped = f"""
+            WITH scores AS (
+                SELECT s.student_id, s.score, TRUE AS is_quiz
+                FROM quiz_submissions s JOIN quizzes q ON q.id = s.quiz_id WHERE q.teacher_id = ?
+                UNION ALL
+                SELECT s.student_id, coalesce(s.score, ?), FALSE
+                FROM essay_submissions s JOIN essays e ON e.id = s.essay_id WHERE e.teacher_id = ?
+            )
+            SELECT u.id, u.name, coalesce(avg(score), 0) AS overall_score,
+                   avg(score) FILTER (WHERE is_quiz), avg(score) FILTER (WHERE NOT is_quiz),
+                   count(*) FILTER (WHERE is_quiz) AS quiz_count, count(*) FILTER (WHERE NOT is_quiz) AS essay_count
+            FROM scores JOIN users u ON u.id = scores.student_id
+            GROUP BY u.id, u.name
+            {"HAVING " + " AND ".join(having) if having else ""}
+        """
+        paged = f"SELECT *, count(*) OVER () FROM ({grouped}) u ORDER BY {order}"
+        page_params = list(params)
+        if limit is not None:
+            paged += " LIMIT ?"
+            page_params.append(limit)
+        if offset:
+            paged += " OFFSET ?"
+            page_params.append(offset)
+
+        result, total = [], 0
+        for *row, total in self.query(paged, page_params):
+            result.append(roster.student_row(*row))
+        if not result and offset:
+            total = self.query(f"SELECT count(*) FROM ({grouped})", params)[0][0]
+        return result, total
+
+    def score_series(
+        self,
+        teacher_id: int,
+        granularity: str = "week",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        kind: str = "all",
+        quiz_id: Optional[int] = None,
+        essay_id: Optional[int] = None,
+        student_id: Optional[int] = None,
+        fill: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Same contract as timeseries.score_series."""
+        end = end or datetime.now(timezone.utc)
+        start = start or end - timeseries.DEFAULT_SPAN[granularity]
+        selects, params = [], []
+        for table, dimension, key, enabled, assignment_id in (
+            ("quiz_submissions", "quizzes", "quiz_id", kind in ("all", "quiz") and essay_id is None, quiz_id),
+            ("essay_submissions", "essays", "essay_id", kind in ("all", "essay") and quiz_id is None, essay_id),
+        ):
+            if not enabled:
+                continue
+            sql = (f"SELECT s.submitted_at, s.score, s.student_id FROM {table} s JOIN {dimension} a ON a.id = s.{key} "
+                   f"WHERE a.teacher_id = ? AND s.submitted_at >= ? AND s.submitted_at < ?")
+            params += [teacher_id, _cell("submitted_at", start), _cell("submitted_at", end)]
+            if assignment_id is not None:
+                sql += f" AND s.{key} = ?"
+                params.append(assignment_id)
+            if student_id is not None:
+                sql += " AND s.student_id = ?"
+                params.append(student_id)
+            selects.append(sql)
+
+        rows = []
+        if selects:
+            rows = self.query(
+                f"SELECT date_trunc('{granularity}', submitted_at) AS bucket, avg(score), count(score), "
+                f"count(DISTINCT student_id) FROM ({' UNION ALL '.join(selects)}) GROUP BY bucket ORDER BY bucket",
+                params
+            )
+        return timeseries.series_from_rows(rows, granularity, start, end, fill)
+
+    def overview_scores(self, teacher_id: int) -> Tuple[float, int, Dict[int, float]]:
+        """(average score, at-risk student count, per-quiz averages) for the
+        teacher overview. Essays still waiting for feedback count as
+        roster.UNSCORED_ESSAY_SCORE, as in the database path."""
+        scores = """
+            SELECT s.student_id, s.quiz_id, s.score
+            FROM quiz_submissions s JOIN quizzes q ON q.id = s.quiz_id WHERE q.teacher_id = ?
+            UNION ALL
+            SELECT s.student_id, NULL, coalesce(s.score, ?)
+            FROM essay_submissions s JOIN essays e ON e.id = s.essay_id WHERE e.teacher_id = ?
+        """
+        params = [teacher_id, roster.UNSCORED_ESSAY_SCORE, teacher_id]
+        score_total, score_count, at_risk = self.query(
+            f"SELECT sum(total), sum(n), count(*) FILTER (WHERE total / n < ?) "
+            f"FROM (SELECT student_id, sum(score) AS total, count(*) AS n FROM ({scores}) GROUP BY student_id)",
+            [roster.AT_RISK_THRESHOLD, *params]
+        )[0]
+        averages = dict(self.query(
+            f"SELECT quiz_id, avg(score) FROM ({scores}) WHERE quiz_id IS NOT NULL GROUP BY quiz_id", params
+        ))
+        return score_total / score_count if score_count else 0, at_risk or 0, averages
+
+    def submission_stats(self, teacher_id: int) -> Tuple[int, int]:
+        """(count, max id) of the teacher's quiz submissions."""
+        count, max_id = self.query(
+            "SELECT count(*), max(s.id) FROM quiz_submissions s JOIN quizzes q ON q.id = s.quiz_id WHERE q.teacher_id = ?",
+            [teacher_id]
+        )[0]
+        return count, max_id or 0
+
+    def quiz_answers(self, teacher_id: int, after_id: int = 0):
+        """(id, student_id, quiz_id, answers, submitted_at) rows, oldest first."""
+        rows = self.query(
+            "SELECT s.id, s.student_id, s.quiz_id, s.answers, s.submitted_at "
+            "FROM quiz_submissions s JOIN quizzes q ON q.id = s.quiz_id WHERE q.teacher_id = ? AND s.id > ? ORDER BY s.id",
+            [teacher_id, after_id]
+        )
+        for submission_id, student_id, quiz_id, answers, submitted_at in rows:
+            yield submission_id, student_id, quiz_id, json.loads(answers) if answers else None, submitted_at
+
+
+def _files(manifest: Dict[str, Any]) -> Tuple:
+    return tuple(sorted((table, tuple(paths)) for table, paths in manifest["facts"].items())), \
+        tuple(sorted(manifest["dimensions"].items()))
+
+
+_lock = threading.Lock()
+_snapshot: Optional[Snapshot] = None
+
+
+def snapshot() -> Optional[Snapshot]:
+    """The current store if reads are on and it's within the staleness bound,
+    else None (callers then query the database)."""
+    global _snapshot
+    if not settings.ANALYTICS_READS:
+        return None
+    try:
+        mtime = os.path.getmtime(_path(MANIFEST))
+    except OSError:
+        return None
+    with _lock:
+        current = _snapshot
+        if current is None or current.mtime != mtime or current.pid != os.getpid():
+            manifest = load_manifest()
+            if not manifest or not manifest.get("synced_at"):
+                return None
+            if current is not None and current.pid == os.getpid() and current.files == _files(manifest):
+                # Only synced_at moved: keep the DuckDB views
+                current.mtime, current.as_of = mtime, datetime.fromisoformat(manifest["synced_at"])
+            else:
+                try:
+                    current = _snapshot = Snapshot(manifest, mtime)
+                except Exception:
+                    logger.exception("Analytics store unavailable")
+                    return None
+    if current.staleness() > settings.ANALYTICS_MAX_STALENESS_SECONDS:
+        return None
+    return current
+
+
+def tag(response, store: Optional[Snapshot]):
+    """Tell the client where the numbers came from and how fresh they are."""
+    response.headers["X-Analytics-Source"] = "columnar" if store is not None else "database"
+    if store is not None:
+        response.headers["X-Analytics-As-Of"] = store.as_of.isoformat()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if "--once" in sys.argv:
+        print(sync_once())
+    else:
+        run_forever()
@@ -0,0 +1,190 @@
+import json
+import os
+from datetime import date, datetime, time, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import JSON, BigInteger, Boolean, DateTime, Integer, func, select, text
+
+import analytics_store
+import partitions
+from config import settings
+from database import Base, SessionLocal
+from models import EssayLSHBucket, EssaySignature, SearchDocument, SubmissionArchive
+
+# Rows per Parquet row group, fetched per round trip from a server-side cursor
+BATCH_ROWS = 10000
+
+
+def _as_datetime(value: date) -> datetime:
+    return datetime.combine(value, time.min, tzinfo=timezone.utc)
+
+
+def _arrow_schema(table):
+    import pyarrow as pa
+
+    fields = []
+    for column in table.columns:
+        if isinstance(column.type, (Integer, BigInteger)):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us", tz="UTC")
+        else:
+            # Text, String and JSON (stored as JSON text)
+            arrow_type = pa.string()
+        fields.append((column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def _json_columns(table) -> List[str]:
+    return [column.name for column in table.columns if isinstance(column.type, JSON)]
+
+
+def _write_parquet(db, table, start: datetime, end: datetime, path: str) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(table)
+    json_columns = _json_columns(table)
+    query = select(table).where(table.c.submitted_at >= start, table.c.submitted_at < end).order_by(table.c.id)
+    result = db.execute(query.execution_options(yield_per=BATCH_ROWS))
+
+    row_count = 0
+    temporary = path + ".tmp"
+    with pq.ParquetWriter(temporary, schema, compression="zstd") as writer:
+        for batch in result.mappings().partitions():
+            rows = []
+            for row in batch:
+                row = dict(row)
+                for name in json_columns:
+                    row[name] = json.dumps(row[name]) if row[name] is not None else None
+                rows.append(row)
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            row_count += len(rows)
+    # Only a complete file is ever visible under the final name
+    os.replace(temporary, path)
+    return row_count
+
+
+def _drop_range(db, table, start: datetime, end: datetime, partition: str):
+    if table.name == "essay_submissions":
+        # Similarity and search index rows are only useful for open terms
+        archived_ids = select(table.c.id).where(table.c.submitted_at >= start, table.c.submitted_at < end)
+        db.query(EssayLSHBucket).filter(EssayLSHBucket.submission_id.in_(archived_ids)).delete(synchronize_session=False)
+        db.query(EssaySignature).filter(EssaySignature.submission_id.in_(archived_ids)).delete(synchronize_session=False)
+        db.query(SearchDocument).filter(
+            SearchDocument.kind == "submission", SearchDocument.ref_id.in_(archived_ids)
+        ).delete(synchronize_session=False)
+
+    connection = db.connection()
+    if partitions.enabled() and partitions.partition_exists(connection, partition):
+        # DDL bypasses the change feed; tombstone the rows in the analytics store first
+        analytics_store.record_rows(connection, table.name, (table.c.submitted_at >= start) & (table.c.submitted_at < end))
+        # Detach and drop: no row-by-row delete, no vacuum debt on the parent
+        connection.execute(text(f"ALTER TABLE {table.name} DETACH PARTITION {partition}"))
+        connection.execute(text(f"DROP TABLE {partition}"))
+    else:
+        # Non-partitioned, or rows that landed in the default partition (the
+        # change feed records this delete through the session)
+        db.execute(table.delete().where(table.c.submitted_at >= start, table.c.submitted_at < end))
+
+
+def archive_before(before: date) -> List[Dict[str, Any]]:
+    """Move every closed partition span that ends on or before `before` (and
+    before the current span) to zstd Parquet under ARCHIVE_DIR, then drop it
+    from the database. Safe to re-run: archived spans are skipped, and the
+    file is written before any row is removed."""
+    cutoff = min(partitions.span_start(before), partitions.current_span_start())
+    archived = []
+    db = SessionLocal()
+    try:
+        for name in partitions.TABLES:
+            table = Base.metadata.tables[name]
+            oldest = db.query(func.min(table.c.submitted_at)).scalar()
+            if oldest is None:
+                continue
+            directory = os.path.join(settings.ARCHIVE_DIR, name)
+            os.makedirs(directory, exist_ok=True)
+            for span_from, span_to in partitions.spans(oldest.date(), cutoff):
+                start, end = _as_datetime(span_from), _as_datetime(span_to)
+                done = db.query(SubmissionArchive.id).filter(
+                    SubmissionArchive.table_name == name, SubmissionArchive.range_start == start
+                ).first()
+                if done:
+                    continue
+                path = os.path.join(directory, f"{span_from:%Y-%m}.parquet")
+                row_count = _write_parquet(db, table, start, end, path)
+                _drop_range(db, table, start, end, partitions.partition_name(name, span_from))
+                if row_count:
+                    db.add(SubmissionArchive(
+                        table_name=name, range_start=start, range_end=end, path=path, row_count=row_count
+                    ))
+                else:
+                    os.remove(path)
+                db.commit()
+                if row_count:
+                    archived.append({"table": name, "range_start": start, "range_end": end, "rows": row_count})
+                    print(f"Archived {row_count} rows of {name} from {span_from} to {span_to}")
+    finally:
+        db.close()
+    return archived
+
+
+def list_archives(db) -> List[SubmissionArchive]:
+    return db.query(SubmissionArchive).order_by(SubmissionArchive.table_name, SubmissionArchive.range_start).all()
+
+
+def archived_rows(
+    db,
+    table_name: str,
+    student_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Optional[Sequence[str]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Rows from archived ranges, streamed back from Parquet one batch at a
+    time (nothing without pyarrow or archives). The student filter is pushed
+    down to the row groups."""
+    start, end = _utc(start), _utc(end)
+    archives = db.query(SubmissionArchive).filter(SubmissionArchive.table_name == table_name)
+    if start is not None:
+        archives = archives.filter(SubmissionArchive.range_end > start)
+    if end is not None:
+        archives = archives.filter(SubmissionArchive.range_start < end)
+    archives = archives.order_by(SubmissionArchive.range_start).all()
+    if not archives:
+        return
+    try:
+        import pyarrow.dataset as ds
+    except ImportError:
+        print("Archived submissions skipped: pyarrow is not installed")
+        return
+
+    json_columns = _json_columns(Base.metadata.tables[table_name])
+    if columns and (start or end) and "submitted_at" not in columns:
+        columns = [*columns, "submitted_at"]
+    condition = ds.field("student_id") == student_id if student_id is not None else None
+    for entry in archives:
+        dataset = ds.dataset(entry.path, format="parquet")
+        for batch in dataset.to_batches(
+            columns=list(columns) if columns else None, filter=condition, batch_size=BATCH_ROWS
+        ):
+            yield from _decode(batch.to_pylist(), json_columns, start, end)
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+
+def _decode(rows: Iterable[Dict[str, Any]], json_columns: List[str], start, end) -> Iterable[Dict[str, Any]]:
+    for row in rows:
+        submitted_at = row.get("submitted_at")
+        if submitted_at is not None and (
+            (start is not None and submitted_at < start) or (end is not None and submitted_at >= end)
+        ):
+            continue
+        for name in json_columns:
+            if row.get(name) is not None:
+                row[name] = json.loads(row[name])
+        yield row
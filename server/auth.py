@@ -11,17 +11,27 @@ from models import User
 from schemas import FirebaseUser
 
 # Initialize Firebase
-try:
-    # Parse the JSON string into a dict
-    cred_dict = json.loads(settings.FIREBASE_CREDENTIALS)
-    cred = credentials.Certificate(cred_dict)
+def init_firebase():
+    """(Re)create the default Firebase app; called again in each forked worker
+    so no HTTP session or credential refresh state is shared with the parent."""
+    try:
+        try:
+            firebase_admin.delete_app(firebase_admin.get_app())
+        except ValueError:
+            pass  # No app yet
+
+        # Parse the JSON string into a dict
+        cred_dict = json.loads(settings.FIREBASE_CREDENTIALS)
+        cred = credentials.Certificate(cred_dict)
 
-    # Initialize app with the credentials dict
-    firebase_admin.initialize_app(cred)
-    print("Firebase initialized successfully ✅")
+        # Initialize app with the credentials dict
+        firebase_admin.initialize_app(cred)
+        print("Firebase initialized successfully ✅")
 
-except Exception as e:
-    print("Firebase initialization failed - check credentials:", e)
+    except Exception as e:
+        print("Firebase initialization failed - check credentials:", e)
+
+init_firebase()
 
 security = HTTPBearer()
 
@@ -51,4 +61,19 @@ def get_teacher_user(current_user: User = Depends(get_current_user)) -> User:
 def get_student_user(current_user: User = Depends(get_current_user)) -> User:
     if current_user.role != "student":
         raise HTTPException(status_code=403, detail="Student access required")
-    return current_user
\ No newline at end of file
+    return current_user
+
+def is_admin_token(token: str) -> bool:
+    """Check a raw Firebase ID token against the configured admin UIDs."""
+    if not token or not settings.ADMIN_UIDS:
+        return False
+    try:
+        decoded_token = auth.verify_id_token(token)
+    except Exception:
+        return False
+    return decoded_token['uid'] in settings.ADMIN_UIDS
+
+def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.firebase_uid not in settings.ADMIN_UIDS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
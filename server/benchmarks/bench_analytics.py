@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from fastapi import Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from conftest import make_feedback, timestamp
+from database import Base
+from models import Essay, EssaySubmission, Quiz, QuizSubmission, User
+from psychometrics import ItemBank, compute
+from roster import student_analytics
+from routers import get_teacher_overview
+
+# (quizzes, essays, students, quiz submissions, essay submissions)
+SIZES = {
+    "small": (10, 5, 30, 300, 150),
+    "large": (200, 50, 500, 20000, 5000),
+}
+
+
+def _population(rng, size):
+    quiz_count, essay_count, student_count, quiz_subs, essay_subs = SIZES[size]
+    quizzes = [Quiz(id=i + 1, teacher_id=1, title=f"Unit {i + 1} review quiz", questions=[]) for i in range(quiz_count)]
+    essays = [Essay(id=i + 1, teacher_id=1, prompt=f"Essay prompt {i + 1}", rubric={}) for i in range(essay_count)]
+    students = [User(id=i + 2, firebase_uid=f"student-{i}", email=f"s{i}@example.com", name=f"Student {i}", role="student")
+                for i in range(student_count)]
+    quiz_submissions = [
+        QuizSubmission(id=i + 1, quiz_id=rng.randrange(quiz_count) + 1, student_id=rng.randrange(student_count) + 2,
+                       answers={}, score=rng.randint(20, 100), submitted_at=timestamp(rng))
+        for i in range(quiz_subs)
+    ]
+    essay_submissions = []
+    for i in range(essay_subs):
+        # A tenth of the essays are still waiting for AI feedback
+        feedback = make_feedback(rng) if rng.random() > 0.1 else None
+        essay_submissions.append(EssaySubmission(
+            id=i + 1, essay_id=rng.randrange(essay_count) + 1, student_id=rng.randrange(student_count) + 2,
+            text="", ai_feedback=feedback, score=feedback["overall_score"] if feedback else None,
+            submitted_at=timestamp(rng)
+        ))
+    return quizzes, essays, students, quiz_submissions, essay_submissions
+
+
+@pytest.fixture(scope="module")
+def analytics_db():
+    import random
+
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    quizzes, essays, students, quiz_submissions, essay_submissions = _population(random.Random(46), "large")
+    session.add(User(id=1, firebase_uid="teacher", email="t@example.com", name="Teacher", role="teacher"))
+    session.add_all(students)
+    session.flush()
+    session.add_all(quizzes + essays)
+    session.flush()
+    session.add_all(quiz_submissions + essay_submissions)
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"limit": 20},
+    {"at_risk": 10},
+    {"sort": "student_name", "descending": False, "min_score": 50, "limit": 50, "offset": 100},
+], ids=["all", "first_page", "at_risk", "filtered_page"])
+def bench_student_analytics(benchmark, peak_memory, analytics_db, params):
+    rows, total = benchmark(student_analytics, analytics_db, 1, **params)
+    assert total > 0
+    peak_memory(student_analytics, analytics_db, 1, **params)
+
+
+def _overview(db):
+    teacher = db.get(User, 1)
+    return asyncio.run(get_teacher_overview(Response(), teacher, db))
+
+
+def bench_teacher_overview(benchmark, peak_memory, analytics_db):
+    result = benchmark(_overview, analytics_db)
+    assert result.quiz_performance
+    peak_memory(_overview, analytics_db)
+
+
+@pytest.mark.parametrize("size", list(SIZES))
+def bench_item_analysis(benchmark, peak_memory, rng, size):
+    quizzes, _, _, quiz_submissions, _ = _population(rng, size)
+    bank = ItemBank([
+        (quiz.id, quiz.title, 1, [{"correct_answer": rng.randrange(4), "topic": f"Topic {i % 6}"} for i in range(20)])
+        for quiz in quizzes
+    ])
+    bank.add(
+        (sub.id, sub.student_id, sub.quiz_id, {str(i): rng.randrange(4) for i in range(20)}, sub.submitted_at)
+        for sub in quiz_submissions
+    )
+    result = benchmark(compute, bank)
+    assert result["items"]
+    peak_memory(compute, bank)
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from conftest import make_feedback
+from feedback_parser import parse_feedback
+
+RUBRIC = {name: {"description": f"{name} criterion", "max_score": 5}
+          for name in ("thesis", "evidence", "organization", "style")}
+
+
+def _responses(rng):
+    feedback = make_feedback(rng)
+    clean = json.dumps(feedback)
+    return {
+        "clean": clean,
+        # The common model failure modes the parser repairs
+        "fenced": f"Here is the feedback:\n```json\n{json.dumps(feedback, indent=2)}\n```\nLet me know if you need more.",
+        "trailing_comma": clean[:-1] + ",}",
+        "prose_wrapped": f"Sure! {clean} I hope this helps the student.",
+        "python_literal": repr(feedback),
+    }
+
+
+@pytest.mark.parametrize("shape", ["clean", "fenced", "trailing_comma", "prose_wrapped", "python_literal"])
+def bench_parse_feedback(benchmark, peak_memory, rng, shape):
+    text = _responses(rng)[shape]
+    feedback, outcome = benchmark(parse_feedback, text, RUBRIC)
+    assert feedback is not None, outcome
+    peak_memory(parse_feedback, text, RUBRIC)
+
+
+def bench_parse_feedback_unparseable(benchmark, rng):
+    text = "I'm sorry, I can't grade this essay. " * 40
+    feedback, _ = benchmark(parse_feedback, text, RUBRIC)
+    assert feedback is None
@@ -0,0 +1,19 @@
+import pytest
+
+from conftest import make_answers, make_questions
+from crud import score_answers
+
+
+@pytest.mark.parametrize("question_count", [50, 500, 5000])
+def bench_score_answers(benchmark, peak_memory, rng, question_count):
+    questions = make_questions(rng, question_count)
+    answers = make_answers(rng, questions)
+    score = benchmark(score_answers, questions, answers)
+    assert 0 <= score <= 100
+    peak_memory(score_answers, questions, answers)
+
+
+def bench_score_unanswered(benchmark, rng):
+    # Students who skip most questions: every lookup misses
+    questions = make_questions(rng, 500)
+    assert benchmark(score_answers, questions, {"0": questions[0]["correct_answer"]}) == 0
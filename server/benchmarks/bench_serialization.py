@@ -0,0 +1,64 @@
+import pytest
+
+import quiz_cache
+import schemas
+from conftest import make_questions, timestamp
+from models import Quiz
+
+
+def _quiz(rng, question_count, quiz_id=1):
+    return Quiz(id=quiz_id, teacher_id=1, title=f"Unit {quiz_id} review quiz", questions=make_questions(rng, question_count),
+                question_count=question_count, created_at=timestamp(rng), version=1)
+
+
+def _dump_quiz(quiz):
+    return schemas.Quiz.model_validate(quiz).model_dump_json()
+
+
+@pytest.mark.parametrize("question_count", [20, 200])
+def bench_quiz_serialization(benchmark, peak_memory, rng, question_count):
+    quiz = _quiz(rng, question_count)
+    assert benchmark(_dump_quiz, quiz)
+    peak_memory(_dump_quiz, quiz)
+
+
+@pytest.mark.parametrize("question_count", [20, 200])
+def bench_student_quiz_render(benchmark, peak_memory, rng, question_count):
+    # Built once per quiz version, then served from the cache
+    quiz = _quiz(rng, question_count)
+    rendered = benchmark(quiz_cache._render, quiz)
+    assert rendered.body
+    peak_memory(quiz_cache._render, quiz)
+
+
+def _dashboard(rng, pending):
+    return {
+        "pending_quizzes": pending,
+        "pending_essays": pending,
+        "completed_assignments": pending * 2,
+        "pending_quizzes_list": [
+            {"id": i, "teacher_id": 1, "title": f"Unit {i} review quiz", "question_count": 20, "created_at": timestamp(rng)}
+            for i in range(pending)
+        ],
+        "pending_essays_list": [
+            {"id": i, "teacher_id": 1, "prompt": f"Essay prompt {i} " * 10, "quality_tier": "standard",
+             "created_at": timestamp(rng)}
+            for i in range(pending)
+        ],
+        "recent_activity": [
+            {"type": "quiz" if i % 2 else "essay", "id": i, "title": f"Assignment {i}",
+             "score": rng.randint(40, 100) if i % 3 else "Pending", "submitted_at": timestamp(rng), "status": "completed"}
+            for i in range(10)
+        ],
+    }
+
+
+def _dump_dashboard(data):
+    return schemas.DashboardResponse(**data).model_dump_json(exclude_unset=True)
+
+
+@pytest.mark.parametrize("pending", [10, 200])
+def bench_dashboard_serialization(benchmark, peak_memory, rng, pending):
+    data = _dashboard(rng, pending)
+    assert benchmark(_dump_dashboard, data)
+    peak_memory(_dump_dashboard, data)
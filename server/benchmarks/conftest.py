@@ -0,0 +1,122 @@
+import json
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# Benchmarks never touch a real database; the app modules only need an engine to import
+os.environ["DATABASE__URL"] = "sqlite://"
+os.environ["ONE_SUBMISSION_PER_ASSIGNMENT"] = "false"
+os.environ["SUBMISSION_PARTITION_MONTHS"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MEMORY_SLACK_BYTES = 4096
+MEMORY_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "memory.json")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("memory gate")
+    group.addoption("--memory-save", action="store_true",
+                    help="Write measured peak allocations to baselines/memory.json")
+    group.addoption("--memory-threshold", type=float, default=0.25,
+                    help="Fail when peak allocation exceeds the baseline by this fraction (default 0.25)")
+
+
+def pytest_configure(config):
+    # Runs before pytest-benchmark's own configure: without a saved baseline
+    # for this machine there is nothing to compare against yet
+    if config.getoption("benchmark_compare", None) is not None:
+        from pytest_benchmark.utils import get_machine_id
+
+        storage = config.getoption("benchmark_storage").replace("file://", "", 1)
+        baseline_dir = os.path.join(storage, get_machine_id())
+        if not os.path.isdir(baseline_dir) or not any(name.endswith(".json") for name in os.listdir(baseline_dir)):
+            print(f"No benchmark baseline in {baseline_dir}; timings are not gated this run")
+            config.option.benchmark_compare = None
+            config.option.benchmark_compare_fail = None
+
+    config._memory_baseline = {}
+    config._memory_measured = {}
+    if os.path.exists(MEMORY_BASELINE):
+        with open(MEMORY_BASELINE) as f:
+            config._memory_baseline = json.load(f)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if config.getoption("--memory-save") and config._memory_measured:
+        baseline = {**config._memory_baseline, **config._memory_measured}
+        with open(MEMORY_BASELINE, "w") as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+            f.write("\n")
+
+
+@pytest.fixture
+def peak_memory(request):
+    """Run `fn` under tracemalloc and gate its peak allocation against the
+    stored baseline for this benchmark."""
+    config = request.config
+
+    def measure(fn, *args, **kwargs):
+        tracemalloc.start()
+        try:
+            fn(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        name = request.node.name
+        config._memory_measured[name] = peak
+        baseline = config._memory_baseline.get(name)
+        if baseline and not config.getoption("--memory-save"):
+            # Small allocations get a fixed allowance so interpreter noise can't fail them
+            limit = max(baseline * (1 + config.getoption("--memory-threshold")), baseline + MEMORY_SLACK_BYTES)
+            if peak > limit:
+                pytest.fail(f"{name}: peak allocation {peak} B exceeds baseline {baseline} B by more than "
+                            f"{config.getoption('--memory-threshold'):.0%}")
+        return peak
+
+    return measure
+
+
+# Fixed seed: every run measures the same data
+@pytest.fixture
+def rng():
+    return random.Random(46)
+
+
+def make_questions(rng, count):
+    return [
+        {
+            "question_text": f"Question {i}: which option best completes the statement about topic {i % 12}?",
+            "options": [f"Option {j} for question {i}" for j in range(4)],
+            "correct_answer": rng.randrange(4),
+            "explanation": f"Option {i % 4} is correct because of rule {i % 7}.",
+            "topic": f"Topic {i % 12}",
+        }
+        for i in range(count)
+    ]
+
+
+def make_answers(rng, questions):
+    return {str(i): rng.randrange(4) for i in range(len(questions))}
+
+
+def make_feedback(rng, criteria=("thesis", "evidence", "organization", "style")):
+    return {
+        "grammar_score": rng.randint(50, 100),
+        "clarity_score": rng.randint(50, 100),
+        "keyword_usage_score": rng.randint(50, 100),
+        "overall_score": rng.randint(40, 100),
+        "overall_feedback": "The essay takes a clear position but the middle paragraphs need more evidence. " * 3,
+        "strengths": ["Clear thesis", "Good paragraph structure"],
+        "weaknesses": ["Limited evidence", "Some run-on sentences"],
+        "suggestions": ["Cite a source for each claim", "Vary sentence length"],
+        "rubric_scores": {name: {"score": rng.randint(1, 5), "comment": f"{name} is adequate."} for name in criteria},
+    }
+
+
+def timestamp(rng, days=120):
+    return datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rng.randrange(days * 24 * 60))
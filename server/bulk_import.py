@@ -0,0 +1,317 @@
+import csv
+import io
+import json
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import schemas
+import search
+from models import Essay, Quiz, User
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ("csv", "jsonl")
+
+# (row number, parsed record or None, parse error or None)
+Record = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+
+class ImportReport:
+    def __init__(self, fmt: str):
+        self.format = fmt
+        self.total = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def error(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "format": self.format,
+            "total_rows": self.total,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def detect_format(filename: Optional[str], fmt: Optional[str]) -> Optional[str]:
+    if fmt:
+        return fmt if fmt in FORMATS else None
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension == "ndjson":
+        extension = "jsonl"
+    return extension if extension in FORMATS else None
+
+
+def read_records(file: BinaryIO, fmt: str) -> Iterator[Record]:
+    """Parse the upload lazily, one record at a time."""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        # Row numbers match the file: line 1 is the header
+        for row_number, row in enumerate(csv.DictReader(text), start=2):
+            yield row_number, {key.strip(): (value or "").strip() for key, value in row.items() if key}, None
+        return
+
+    for row_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield row_number, None, "Expected a JSON object"
+            continue
+        yield row_number, record, None
+
+
+def _batches(records: Iterator[Any], size: int = BATCH_SIZE) -> Iterator[List[Any]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+
+
+def _dialect_insert(db: Session):
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+# Users
+def _upsert_users(db: Session, rows: List[Tuple[int, Dict[str, Any]]], report: ImportReport):
+    uids = [row["firebase_uid"] for _, row in rows]
+    existing = {
+        uid: email for uid, email in db.query(User.firebase_uid, User.email).filter(User.firebase_uid.in_(uids))
+    }
+    # An email already owned by a different account can't be upserted by uid
+    taken = {
+        email: uid for email, uid in db.query(User.email, User.firebase_uid).filter(
+            User.email.in_([row["email"] for _, row in rows])
+        )
+    }
+    accepted = []
+    for row_number, row in rows:
+        owner = taken.get(row["email"])
+        if owner is not None and owner != row["firebase_uid"]:
+            report.error(row_number, f"Email {row['email']} belongs to another user")
+        else:
+            accepted.append((row_number, row))
+    if not accepted:
+        return
+
+    dialect_insert = _dialect_insert(db)
+    values = [row for _, row in accepted]
+    try:
+        if dialect_insert is not None:
+            # One multi-row INSERT ... ON CONFLICT (firebase_uid) DO UPDATE per batch
+            statement = dialect_insert(User).values(values)
+            statement = statement.on_conflict_do_update(
+                index_elements=[User.firebase_uid],
+                set_={
+                    "email": statement.excluded.email,
+                    "name": statement.excluded.name,
+                    "role": statement.excluded.role,
+                }
+            )
+            db.execute(statement)
+        else:
+            for row in values:
+                user = db.query(User).filter(User.firebase_uid == row["firebase_uid"]).first()
+                if user:
+                    user.email, user.name, user.role = row["email"], row["name"], row["role"]
+                else:
+                    db.add(User(**row))
+        db.commit()
+    except IntegrityError:
+        # Something in the batch conflicts (e.g. duplicate emails inside the
+        # file); retry row by row so only the offending rows fail
+        db.rollback()
+        for row_number, row in accepted:
+            try:
+                with db.begin_nested():
+                    user = db.query(User).filter(User.firebase_uid == row["firebase_uid"]).first()
+                    if user:
+                        user.email, user.name, user.role = row["email"], row["name"], row["role"]
+                    else:
+                        db.add(User(**row))
+            except IntegrityError as e:
+                report.error(row_number, f"Conflicts with an existing user: {e.orig}")
+                accepted = [item for item in accepted if item[0] != row_number]
+        db.commit()
+
+    for _, row in accepted:
+        if row["firebase_uid"] in existing:
+            report.updated += 1
+        else:
+            report.inserted += 1
+
+
+def import_users(db: Session, file: BinaryIO, fmt: str) -> ImportReport:
+    """Create or update users keyed on firebase_uid. Rows: firebase_uid, email, name, role."""
+    report = ImportReport(fmt)
+    for batch in _batches(read_records(file, fmt)):
+        valid: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        for row_number, record, parse_error in batch:
+            report.total += 1
+            if parse_error:
+                report.error(row_number, parse_error)
+                continue
+            try:
+                user = schemas.UserCreate.model_validate(record)
+            except ValidationError as e:
+                report.error(row_number, _validation_message(e))
+                continue
+            if user.role not in ("teacher", "student"):
+                report.error(row_number, "role must be 'teacher' or 'student'")
+                continue
+            if user.firebase_uid in valid:
+                # Later rows win; the earlier one is reported, not silently dropped
+                report.error(valid[user.firebase_uid][0], f"Superseded by row {row_number} (same firebase_uid)")
+            valid[user.firebase_uid] = (row_number, user.model_dump())
+        if valid:
+            _upsert_users(db, list(valid.values()), report)
+    return report
+
+
+# Quizzes
+def _validate_questions(questions: Any) -> List[Dict[str, Any]]:
+    if not isinstance(questions, list) or not questions:
+        raise ValueError("questions must be a non-empty list")
+    validated = []
+    for i, question in enumerate(questions):
+        try:
+            item = schemas.Question.model_validate(question)
+        except ValidationError as e:
+            raise ValueError(f"question {i + 1}: {_validation_message(e)}")
+        if not 0 <= item.correct_answer < len(item.options):
+            raise ValueError(f"question {i + 1}: correct_answer is not a valid option index")
+        validated.append(item.model_dump())
+    return validated
+
+
+def _quiz_records(file: BinaryIO, fmt: str) -> Iterator[Record]:
+    """JSONL: one quiz per line ({"title", "questions"}). CSV: one question per
+    row (title, question_text, options separated by "|", correct_answer and
+    an optional topic); consecutive rows with the same title form one quiz."""
+    records = read_records(file, fmt)
+    if fmt != "csv":
+        yield from records
+        return
+
+    current: Optional[Dict[str, Any]] = None
+    start_row = 0
+    for row_number, record, parse_error in records:
+        title = record.get("title", "")
+        if current is None or title != current["title"]:
+            if current is not None:
+                yield start_row, current, None
+            current, start_row = {"title": title, "questions": []}, row_number
+        current["questions"].append({
+            "question_text": record.get("question_text", ""),
+            "options": [option.strip() for option in record.get("options", "").split("|") if option.strip()],
+            "correct_answer": record.get("correct_answer", ""),
+            "topic": record.get("topic") or None,
+        })
+    if current is not None:
+        yield start_row, current, None
+
+
+def import_quizzes(db: Session, file: BinaryIO, fmt: str, teacher_id: int) -> ImportReport:
+    report = ImportReport(fmt)
+    for batch in _batches(_quiz_records(file, fmt)):
+        rows = []
+        for row_number, record, parse_error in batch:
+            report.total += 1
+            if parse_error:
+                report.error(row_number, parse_error)
+                continue
+            try:
+                quiz = schemas.QuizCreate.model_validate(record)
+                questions = _validate_questions(quiz.questions)
+            except ValidationError as e:
+                report.error(row_number, _validation_message(e))
+                continue
+            except ValueError as e:
+                report.error(row_number, str(e))
+                continue
+            rows.append({"teacher_id": teacher_id, "title": quiz.title, "questions": questions})
+        if rows:
+            # Executemany; SQLAlchemy batches these into multi-row INSERTs.
+            # Core inserts skip the ORM listeners, so the search index is fed here
+            ids = db.scalars(insert(Quiz).returning(Quiz.id, sort_by_parameter_order=True), rows).all()
+            documents = [
+                document for quiz_id, row in zip(ids, rows)
+                for document in search.quiz_documents(quiz_id, teacher_id, row["questions"])
+            ]
+            search.replace(db.connection(), "question", ids, documents)
+            db.commit()
+            report.inserted += len(rows)
+    return report
+
+
+# Essays
+def import_essays(db: Session, file: BinaryIO, fmt: str, teacher_id: int) -> ImportReport:
+    """Rows: prompt, rubric (an object; a JSON string in CSV)."""
+    report = ImportReport(fmt)
+    for batch in _batches(read_records(file, fmt)):
+        rows = []
+        for row_number, record, parse_error in batch:
+            report.total += 1
+            if parse_error:
+                report.error(row_number, parse_error)
+                continue
+            if isinstance(record.get("rubric"), str):
+                try:
+                    record["rubric"] = json.loads(record["rubric"] or "{}")
+                except ValueError:
+                    report.error(row_number, "rubric: not valid JSON")
+                    continue
+            try:
+                essay = schemas.EssayCreate.model_validate(record)
+            except ValidationError as e:
+                report.error(row_number, _validation_message(e))
+                continue
+            if not essay.prompt.strip():
+                report.error(row_number, "prompt: must not be empty")
+                continue
+            rows.append({
+                "teacher_id": teacher_id, "prompt": essay.prompt, "rubric": essay.rubric,
+                "quality_tier": essay.quality_tier
+            })
+        if rows:
+            ids = db.scalars(insert(Essay).returning(Essay.id, sort_by_parameter_order=True), rows).all()
+            documents = [
+                document for essay_id, row in zip(ids, rows)
+                for document in search.essay_documents(essay_id, teacher_id, row["prompt"])
+            ]
+            search.replace(db.connection(), "essay", ids, documents)
+            db.commit()
+            report.inserted += len(rows)
+    return report
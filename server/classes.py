@@ -0,0 +1,158 @@
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import Session
+
+from models import (
+    Class, Enrollment, Essay, EssayAssignment, EssaySubmission,
+    Quiz, QuizAssignment, QuizSubmission, User
+)
+
+
+def get_teacher_class(db: Session, class_id: int, teacher_id: int) -> Optional[Class]:
+    return db.query(Class).filter(Class.id == class_id, Class.teacher_id == teacher_id).first()
+
+
+def list_classes(db: Session, teacher_id: int) -> List[dict]:
+    """Teacher's classes with roster and assignment counts (one query each, not per class)."""
+    classes = db.query(Class).filter(Class.teacher_id == teacher_id).order_by(Class.created_at).all()
+    class_ids = [c.id for c in classes]
+    counts: Dict[str, Dict[int, int]] = {}
+    for name, model in (("student_count", Enrollment), ("quiz_count", QuizAssignment), ("essay_count", EssayAssignment)):
+        counts[name] = dict(
+            db.query(model.class_id, func.count()).filter(model.class_id.in_(class_ids)).group_by(model.class_id)
+        ) if class_ids else {}
+    return [
+        {
+            "id": c.id,
+            "teacher_id": c.teacher_id,
+            "name": c.name,
+            "created_at": c.created_at,
+            **{name: by_class.get(c.id, 0) for name, by_class in counts.items()},
+        }
+        for c in classes
+    ]
+
+
+def enroll(db: Session, class_id: int, student_ids: List[int], student_emails: List[str]) -> Tuple[int, List[str]]:
+    """Add students to a class; already enrolled and non-student users are skipped."""
+    skipped: List[str] = []
+    students = []
+    if student_ids:
+        students += db.query(User.id, User.email).filter(User.id.in_(student_ids), User.role == "student").all()
+    if student_emails:
+        students += db.query(User.id, User.email).filter(User.email.in_(student_emails), User.role == "student").all()
+    found_ids = {student_id for student_id, _ in students}
+    found_emails = {email for _, email in students}
+    skipped += [str(i) for i in student_ids if i not in found_ids]
+    skipped += [e for e in student_emails if e not in found_emails]
+
+    enrolled = {
+        student_id for (student_id,) in db.query(Enrollment.student_id).filter(
+            Enrollment.class_id == class_id, Enrollment.student_id.in_(found_ids)
+        )
+    }
+    added = found_ids - enrolled
+    db.add_all(Enrollment(class_id=class_id, student_id=student_id) for student_id in added)
+    db.commit()
+    return len(added), skipped
+
+
+def assign(db: Session, class_id: int, teacher_id: int, quiz_ids: List[int], essay_ids: List[int]) -> Tuple[int, List[str]]:
+    """Assign the teacher's own quizzes/essays to a class; repeats are skipped."""
+    added, skipped = 0, []
+    for label, ids, model, assignment, column in (
+        ("quiz", quiz_ids, Quiz, QuizAssignment, QuizAssignment.quiz_id),
+        ("essay", essay_ids, Essay, EssayAssignment, EssayAssignment.essay_id),
+    ):
+        if not ids:
+            continue
+        owned = {i for (i,) in db.query(model.id).filter(model.id.in_(ids), model.teacher_id == teacher_id)}
+        skipped += [f"{label} {i}" for i in ids if i not in owned]
+        existing = {i for (i,) in db.query(column).filter(assignment.class_id == class_id, column.in_(owned))}
+        for assignment_id in owned - existing:
+            db.add(assignment(class_id=class_id, **{column.key: assignment_id}))
+            added += 1
+    db.commit()
+    return added, skipped
+
+
+def unenroll(db: Session, class_id: int, student_id: int) -> bool:
+    deleted = db.query(Enrollment).filter(
+        Enrollment.class_id == class_id, Enrollment.student_id == student_id
+    ).delete(synchronize_session=False)
+    db.commit()
+    return bool(deleted)
+
+
+# Student visibility: assignments reached through the student's enrollments
+# (work from before classes existed is moved into a default class by
+# migrations.default_classes)
+def assigned_quiz_ids(student_id: int):
+    return select(QuizAssignment.quiz_id).join(
+        Enrollment, Enrollment.class_id == QuizAssignment.class_id
+    ).where(Enrollment.student_id == student_id)
+
+
+def assigned_essay_ids(student_id: int):
+    return select(EssayAssignment.essay_id).join(
+        Enrollment, Enrollment.class_id == EssayAssignment.class_id
+    ).where(Enrollment.student_id == student_id)
+
+
+def quiz_visible(db: Session, student_id: int, quiz_id: int) -> bool:
+    return db.query(assigned_quiz_ids(student_id).where(QuizAssignment.quiz_id == quiz_id).exists()).scalar()
+
+
+def essay_visible(db: Session, student_id: int, essay_id: int) -> bool:
+    return db.query(assigned_essay_ids(student_id).where(EssayAssignment.essay_id == essay_id).exists()).scalar()
+
+
+def pending_quizzes(db: Session, student_id: int, *options) -> List[Quiz]:
+    submitted = exists().where(QuizSubmission.quiz_id == Quiz.id, QuizSubmission.student_id == student_id)
+    return db.query(Quiz).options(*options).filter(
+        Quiz.id.in_(assigned_quiz_ids(student_id)), ~submitted
+    ).order_by(Quiz.created_at.desc()).all()
+
+
+def pending_essays(db: Session, student_id: int, *options) -> List[Essay]:
+    submitted = exists().where(EssaySubmission.essay_id == Essay.id, EssaySubmission.student_id == student_id)
+    return db.query(Essay).options(*options).filter(
+        Essay.id.in_(assigned_essay_ids(student_id)), ~submitted
+    ).order_by(Essay.created_at.desc()).all()
+
+
+# Teacher roster
+def roster_size(db: Session, teacher_id: int) -> int:
+    return db.query(func.count(func.distinct(Enrollment.student_id))).join(
+        Class, Class.id == Enrollment.class_id
+    ).filter(Class.teacher_id == teacher_id).scalar() or 0
+
+
+def completion(db: Session, teacher_id: int) -> Dict[str, int]:
+    """Expected vs. done over the real roster: every (enrolled student,
+    assignment of one of their classes) pair, counted once even if the student
+    is in two classes with the same assignment. Essays submitted but not yet
+    graded count as in progress."""
+    result = {"expected": 0, "completed": 0, "in_progress": 0}
+    for assignment, column, submission, submission_column in (
+        (QuizAssignment, QuizAssignment.quiz_id, QuizSubmission, QuizSubmission.quiz_id),
+        (EssayAssignment, EssayAssignment.essay_id, EssaySubmission, EssaySubmission.essay_id),
+    ):
+        pairs = db.query(Enrollment.student_id, column).join(
+            assignment, assignment.class_id == Enrollment.class_id
+        ).join(Class, Class.id == Enrollment.class_id).filter(Class.teacher_id == teacher_id).distinct()
+        submitted = exists().where(submission_column == column, submission.student_id == Enrollment.student_id)
+        result["expected"] += pairs.count()
+        if submission is EssaySubmission:
+            graded = exists().where(
+                submission_column == column,
+                submission.student_id == Enrollment.student_id,
+                submission.score.isnot(None)
+            )
+            done = pairs.filter(graded).count()
+            result["completed"] += done
+            result["in_progress"] += pairs.filter(submitted).count() - done
+        else:
+            result["completed"] += pairs.filter(submitted).count()
+    return result
@@ -12,4 +12,100 @@ class Settings:
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Profiling (see profiling.py)
+    ADMIN_UIDS: list = [uid for uid in os.getenv("ADMIN_UIDS", "").split(",") if uid]
+    PROFILING_SECRET: str = os.getenv("PROFILING_SECRET", "")
+    PROFILE_SAMPLE_INTERVAL_MS: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+    PROFILE_STORE_SIZE: int = int(os.getenv("PROFILE_STORE_SIZE", "50"))
+    PROFILE_SLOWEST_PER_ROUTE: int = int(os.getenv("PROFILE_SLOWEST_PER_ROUTE", "0"))
+
+    # LLM token budgets (see prompt_builder.py)
+    LLM_MAX_INPUT_TOKENS: int = int(os.getenv("LLM_MAX_INPUT_TOKENS", "6000"))
+    LLM_MAX_OUTPUT_TOKENS: int = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "1000"))
+    LLM_REQUEST_TOKEN_BUDGET: int = int(os.getenv("LLM_REQUEST_TOKEN_BUDGET", "30000"))
+    # "json_schema" (schema derived from the rubric), "json_object" or "text"
+    LLM_RESPONSE_FORMAT: str = os.getenv("LLM_RESPONSE_FORMAT", "json_schema")
+    LLM_PARSE_RETRIES: int = int(os.getenv("LLM_PARSE_RETRIES", "1"))
+    # Providers in priority order, "kind:model[?options]" (see llm_router.py), e.g.
+    # "groq:openai/gpt-oss-20b,openai:gpt-4o-mini" or "fake:local?latency_ms=200&error_rate=0.1"
+    LLM_PROVIDERS: str = os.getenv("LLM_PROVIDERS", "groq:openai/gpt-oss-20b")
+    # Model tiering (see model_policy.py): provider list per model class, the tier
+    # used when an essay sets none, and USD per million input/output tokens
+    LLM_CLASS_PROVIDERS: str = os.getenv(
+        "LLM_CLASS_PROVIDERS", "small=groq:openai/gpt-oss-20b;large=groq:openai/gpt-oss-120b,groq:openai/gpt-oss-20b"
+    )
+    LLM_DEFAULT_TIER: str = os.getenv("LLM_DEFAULT_TIER", "standard")
+    LLM_PRICES: str = os.getenv("LLM_PRICES", "openai/gpt-oss-20b=0.10/0.50;openai/gpt-oss-120b=0.15/0.75")
+    # Hedging: a request still unanswered at the provider's p95 is also sent to the next one
+    LLM_HEDGE: bool = os.getenv("LLM_HEDGE", "true").lower() in ("1", "true", "yes")
+    LLM_HEDGE_PERCENTILE: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    LLM_HEDGE_DEFAULT_MS: int = int(os.getenv("LLM_HEDGE_DEFAULT_MS", "10000"))
+    LLM_HEDGE_MIN_MS: int = int(os.getenv("LLM_HEDGE_MIN_MS", "1000"))
+    LLM_PROVIDER_TIMEOUT_SECONDS: float = float(os.getenv("LLM_PROVIDER_TIMEOUT_SECONDS", "90"))
+    LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_COOLDOWN_SECONDS: float = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+    # Incremental regrading (see section_cache.py): revisions (regrades, or a
+    # student's later submission to the same essay) over ESSAY_SECTION_TOKENS are
+    # graded in paragraph sections whose feedback is cached by prompt hash, so
+    # the next revision only sends the sections that changed. First submissions
+    # are graded whole.
+    ESSAY_INCREMENTAL_GRADING: bool = os.getenv("ESSAY_INCREMENTAL_GRADING", "true").lower() in ("1", "true", "yes")
+    ESSAY_SECTION_TOKENS: int = int(os.getenv("ESSAY_SECTION_TOKENS", "800"))
+    ESSAY_SECTION_CACHE_DAYS: int = int(os.getenv("ESSAY_SECTION_CACHE_DAYS", "30"))
+
+    # Near-duplicate essays (see similarity.py); set reuse above 1 to disable
+    DUPLICATE_REUSE_THRESHOLD: float = float(os.getenv("DUPLICATE_REUSE_THRESHOLD", "0.95"))
+    SIMILARITY_REPORT_THRESHOLD: float = float(os.getenv("SIMILARITY_REPORT_THRESHOLD", "0.7"))
+
+    # Live dashboard events (see events.py): "auto", "local" or "postgres"
+    EVENTS_BROKER: str = os.getenv("EVENTS_BROKER", "auto")
+    EVENTS_STREAM_MAX_SECONDS: float = float(os.getenv("EVENTS_STREAM_MAX_SECONDS", "300"))
+
+    # Admission control (see admission.py); limits are "per_minute:burst"
+    # per user and per worker, "0" disables a class
+    RATE_LIMIT_READ: str = os.getenv("RATE_LIMIT_READ", "300:60")
+    RATE_LIMIT_WRITE: str = os.getenv("RATE_LIMIT_WRITE", "60:20")
+    RATE_LIMIT_LLM: str = os.getenv("RATE_LIMIT_LLM", "6:3")
+    LLM_MAX_IN_FLIGHT: int = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+    LLM_RETRY_AFTER_SECONDS: int = int(os.getenv("LLM_RETRY_AFTER_SECONDS", "10"))
+
+    # Submissions
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    ONE_SUBMISSION_PER_ASSIGNMENT: bool = os.getenv("ONE_SUBMISSION_PER_ASSIGNMENT", "false").lower() in ("1", "true", "yes")
+
+    # Rendered student quiz payloads kept per worker
+    QUIZ_CACHE_SIZE: int = int(os.getenv("QUIZ_CACHE_SIZE", "512"))
+
+    # Submission partitioning (Postgres only): months per range partition, 0 = off.
+    # Partitions are created ahead of time at warm-up; a default partition catches the rest.
+    SUBMISSION_PARTITION_MONTHS: int = int(os.getenv("SUBMISSION_PARTITION_MONTHS", "0"))
+    SUBMISSION_PARTITIONS_AHEAD: int = int(os.getenv("SUBMISSION_PARTITIONS_AHEAD", "2"))
+    # Closed ranges archived to zstd Parquet here (see archive.py)
+    ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "archive")
+
+    # Item analysis (see psychometrics.py): per-worker cache, refreshed at most this often
+    PSYCHOMETRICS_MIN_INTERVAL_SECONDS: float = float(os.getenv("PSYCHOMETRICS_MIN_INTERVAL_SECONDS", "60"))
+    PSYCHOMETRICS_CACHE_TEACHERS: int = int(os.getenv("PSYCHOMETRICS_CACHE_TEACHERS", "256"))
+
+    # Columnar analytics store (see analytics_store.py). ANALYTICS_CHANGE_FEED records
+    # submission writes for the sidecar; ANALYTICS_READS serves analytics from its
+    # Parquet files when they are at most ANALYTICS_MAX_STALENESS_SECONDS behind.
+    ANALYTICS_CHANGE_FEED: bool = os.getenv("ANALYTICS_CHANGE_FEED", "false").lower() in ("1", "true", "yes")
+    ANALYTICS_READS: bool = os.getenv("ANALYTICS_READS", "false").lower() in ("1", "true", "yes")
+    ANALYTICS_STORE_DIR: str = os.getenv("ANALYTICS_STORE_DIR", "analytics_store")
+    ANALYTICS_SYNC_SECONDS: float = float(os.getenv("ANALYTICS_SYNC_SECONDS", "10"))
+    ANALYTICS_MAX_STALENESS_SECONDS: float = float(os.getenv("ANALYTICS_MAX_STALENESS_SECONDS", "60"))
+    ANALYTICS_SYNC_BATCH: int = int(os.getenv("ANALYTICS_SYNC_BATCH", "5000"))
+    ANALYTICS_COMPACT_SEGMENTS: int = int(os.getenv("ANALYTICS_COMPACT_SEGMENTS", "20"))
+    ANALYTICS_DIMENSION_REFRESH_SECONDS: float = float(os.getenv("ANALYTICS_DIMENSION_REFRESH_SECONDS", "300"))
+
+    # Full-text search (see search.py): Postgres text search configuration, fixed
+    # into the tsvector column when search_documents is created
+    SEARCH_LANGUAGE: str = os.getenv("SEARCH_LANGUAGE", "english")
+
+    # Serving (see gunicorn.conf.py)
+    DB_WARM_CONNECTIONS: int = int(os.getenv("DB_WARM_CONNECTIONS", "2"))
+    GRACEFUL_DRAIN_SECONDS: float = float(os.getenv("GRACEFUL_DRAIN_SECONDS", "90"))
+
 settings = Settings()
\ No newline at end of file
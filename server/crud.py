@@ -1,6 +1,11 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from models import User, Quiz, QuizSubmission, Essay, EssaySubmission
+from typing import Any, Dict, List, Optional
+import events
+from database import SessionLocal
+from models import User, Quiz, QuizSubmission, Essay, EssaySubmission, LLMDecision
+from feedback_themes import record_feedback
+from similarity import find_reusable_feedback, index_submission
+from text_metrics import compute_metrics
 
 # User CRUD
 def get_user_by_firebase_uid(db: Session, firebase_uid: str) -> Optional[User]:
@@ -25,23 +30,34 @@ def create_quiz(db: Session, quiz_data: dict, teacher_id: int) -> Quiz:
 def get_quiz(db: Session, quiz_id: int) -> Optional[Quiz]:
     return db.query(Quiz).filter(Quiz.id == quiz_id).first()
 
+def score_answers(questions: List[Dict[str, Any]], answers: Dict[str, Any]) -> int:
+    """Percentage of questions answered correctly; answers are keyed by question index."""
+    if not questions:
+        return 0
+    correct_answers = sum(
+        1 for i, question in enumerate(questions) if answers.get(str(i)) == question["correct_answer"]
+    )
+    return int((correct_answers / len(questions)) * 100)
+
 def create_quiz_submission(db: Session, submission_data: dict) -> QuizSubmission:
     # Calculate score
     quiz = get_quiz(db, submission_data["quiz_id"])
-    correct_answers = 0
-    total_questions = len(quiz.questions)
-    
-    for i, question in enumerate(quiz.questions):
-        if submission_data["answers"].get(str(i)) == question["correct_answer"]:
-            correct_answers += 1
-    
-    score = int((correct_answers / total_questions) * 100) if total_questions > 0 else 0
-    submission_data["score"] = score
+    submission_data["score"] = score_answers(quiz.questions, submission_data["answers"])
     
     submission = QuizSubmission(**submission_data)
     db.add(submission)
     db.commit()
     db.refresh(submission)
+
+    # Deltas only: the dashboard folds them into the averages it loaded, so
+    # the write path runs no aggregate
+    events.publish(quiz.teacher_id, {
+        "type": "quiz_submission",
+        "quiz_id": quiz.id,
+        "submission_id": submission.id,
+        "student_id": submission.student_id,
+        "score": submission.score
+    })
     return submission
 
 # Essay CRUD
@@ -56,18 +72,115 @@ def create_essay(db: Session, essay_data: dict, teacher_id: int) -> Essay:
 def get_essay(db: Session, essay_id: int) -> Optional[Essay]:
     return db.query(Essay).filter(Essay.id == essay_id).first()
 
-async def create_essay_submission(db: Session, submission_data: dict, ai_feedback_service) -> EssaySubmission:
+def create_essay_submission_record(db: Session, submission_data: dict) -> EssaySubmission:
+    """Store a submission with its local text metrics; AI feedback comes later."""
     essay = get_essay(db, submission_data["essay_id"])
-    
-    # Generate AI feedback
-    ai_feedback = await ai_feedback_service.generate_essay_feedback(
-        submission_data["text"], 
-        essay.rubric
+    submission_data["text_metrics"] = compute_metrics(
+        submission_data["text"], essay.prompt, essay.rubric
     )
-    
-    submission_data["ai_feedback"] = ai_feedback
+    submission_data["word_count"] = submission_data["text_metrics"]["word_count"]
     submission = EssaySubmission(**submission_data)
     db.add(submission)
+    db.flush()
+    index_submission(db, submission)
     db.commit()
     db.refresh(submission)
-    return submission
\ No newline at end of file
+    return submission
+
+def is_revision(db: Session, submission: EssaySubmission) -> bool:
+    """Graded before, or the student submitted to this essay before."""
+    if submission.ai_feedback:
+        return True
+    return db.query(EssaySubmission.id).filter(
+        EssaySubmission.essay_id == submission.essay_id,
+        EssaySubmission.student_id == submission.student_id,
+        EssaySubmission.id != submission.id
+    ).first() is not None
+
+async def grade_essay_submission(db: Session, submission: EssaySubmission, ai_feedback_service) -> EssaySubmission:
+    # A near-identical essay already graded under the same rubric costs no LLM call
+    previous_score = submission.score
+    ai_feedback = find_reusable_feedback(db, submission)
+    if ai_feedback is None:
+        ai_feedback = await ai_feedback_service.generate_essay_feedback(
+            submission.text,
+            submission.essay.rubric,
+            submission.text_metrics,
+            tier=submission.essay.quality_tier,
+            revision=is_revision(db, submission)
+        )
+    save_essay_feedback(db, submission, ai_feedback)
+    db.commit()
+    db.refresh(submission)
+    publish_essay_graded(submission, previous_score)
+    return submission
+
+def publish_essay_graded(submission: EssaySubmission, previous_score: Optional[float] = None):
+    """previous_score is set when a graded submission was graded again, so
+    the dashboard can replace that score in its average instead of adding one."""
+    events.publish(submission.essay.teacher_id, {
+        "type": "essay_graded",
+        "essay_id": submission.essay_id,
+        "submission_id": submission.id,
+        "student_id": submission.student_id,
+        "score": submission.score,
+        "previous_score": previous_score
+    })
+
+def essay_score(feedback: Optional[dict]) -> Optional[float]:
+    """overall_score if present, else the mean of the 0-100 sub-scores."""
+    if not feedback:
+        return None
+    if isinstance(feedback.get("overall_score"), (int, float)):
+        return feedback["overall_score"]
+    scores = [
+        feedback[field] for field in ("grammar_score", "clarity_score", "keyword_usage_score")
+        if isinstance(feedback.get(field), (int, float))
+    ]
+    return round(sum(scores) / len(scores)) if scores else None
+
+def save_essay_feedback(db: Session, submission: EssaySubmission, ai_feedback: dict):
+    """Attach feedback to a submission and update derived data; caller commits."""
+    routing = ai_feedback.pop("routing", None)
+    if routing:
+        db.add(LLMDecision(submission_id=submission.id, essay_id=submission.essay_id, **routing))
+    if "overall_score" not in ai_feedback and essay_score(ai_feedback) is not None:
+        ai_feedback["overall_score"] = essay_score(ai_feedback)
+    record_feedback(db, submission, ai_feedback)
+    submission.ai_feedback = ai_feedback
+    submission.rubric_scores = ai_feedback.get("rubric_scores")
+    submission.score = essay_score(ai_feedback)
+
+async def grade_essay_submission_by_id(submission_id: int, ai_feedback_service):
+    # Background task: runs after the response is sent, so it needs its own session
+    db = SessionLocal()
+    try:
+        submission = db.query(EssaySubmission).filter(EssaySubmission.id == submission_id).first()
+        if submission:
+            await grade_essay_submission(db, submission, ai_feedback_service)
+    finally:
+        db.close()
+
+async def create_essay_submission(db: Session, submission_data: dict, ai_feedback_service) -> EssaySubmission:
+    submission = create_essay_submission_record(db, submission_data)
+    return await grade_essay_submission(db, submission, ai_feedback_service)
+
+def backfill_essay_scores(batch_size: int = 500):
+    """Fill EssaySubmission.score for feedback saved before the column existed."""
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            batch = db.query(EssaySubmission).filter(
+                EssaySubmission.id > last_id,
+                EssaySubmission.score.is_(None),
+                EssaySubmission.ai_feedback.isnot(None)
+            ).order_by(EssaySubmission.id).limit(batch_size).all()
+            if not batch:
+                break
+            for submission in batch:
+                submission.score = essay_score(submission.ai_feedback)
+            last_id = batch[-1].id
+            db.commit()
+    finally:
+        db.close()
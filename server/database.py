@@ -3,10 +3,23 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
 
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+def reset_engine_after_fork():
+    # Drop pooled connections inherited from the parent without closing them,
+    # so the parent's sockets aren't torn down from under it
+    engine.dispose(close=False)
+
+def warm_pool():
+    # Open connections up front so the first requests don't pay for connects
+    pool_size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+    connections = [engine.connect() for _ in range(min(pool_size, settings.DB_WARM_CONNECTIONS))]
+    for connection in connections:
+        connection.exec_driver_sql("SELECT 1")
+        connection.close()
+
 def get_db():
     db = SessionLocal()
     try:
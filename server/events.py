@@ -0,0 +1,158 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import text
+
+from config import settings
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "teacher_events"
+QUEUE_SIZE = 100
+
+
+class EventHub:
+    """Per-worker fan-out from the broker to this worker's SSE subscribers."""
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.subscribers: Dict[int, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, teacher_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.subscribers.setdefault(teacher_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, teacher_id: int, queue: asyncio.Queue):
+        queues = self.subscribers.get(teacher_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[teacher_id]
+
+    def deliver(self, message: Dict[str, Any]):
+        """Thread-safe: hand a broker message to the event loop."""
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._deliver, message)
+
+    def _deliver(self, message: Dict[str, Any]):
+        for queue in self.subscribers.get(message.get("teacher_id"), ()):
+            if queue.full():
+                # A slow client loses its oldest update, not the newest
+                queue.get_nowait()
+            queue.put_nowait(message["event"])
+
+
+hub = EventHub()
+
+
+class LocalBroker:
+    """Single-process broker: publish goes straight to this worker's hub."""
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def publish(self, message: Dict[str, Any]):
+        hub.deliver(message)
+
+
+class PostgresBroker:
+    """Cross-worker fan-out over Postgres LISTEN/NOTIFY. Every worker listens
+    on one channel and keeps only events for teachers subscribed to it."""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen_forever, name="pg-listen", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def publish(self, message: Dict[str, Any]):
+        with engine.connect() as connection:
+            connection.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": CHANNEL, "payload": json.dumps(message, default=str)}
+            )
+            connection.commit()
+
+    def _listen_forever(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                self._listen()
+                backoff = 1
+            except Exception as e:
+                logger.warning("Event listener disconnected, reconnecting: %s", e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _listen(self):
+        # A dedicated connection outside the pool, held for the worker's lifetime
+        connection = engine.raw_connection()
+        connection.detach()
+        dbapi = getattr(connection, "dbapi_connection", None) or connection.connection
+        try:
+            dbapi.autocommit = True
+            with dbapi.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            while not self._stop.is_set():
+                if select.select([dbapi], [], [], 1.0)[0]:
+                    dbapi.poll()
+                    while dbapi.notifies:
+                        notify = dbapi.notifies.pop(0)
+                        try:
+                            hub.deliver(json.loads(notify.payload))
+                        except ValueError:
+                            continue
+        finally:
+            connection.close()
+
+
+def _make_broker():
+    backend = settings.EVENTS_BROKER
+    if backend == "auto":
+        backend = "postgres" if engine.dialect.name == "postgresql" else "local"
+    return PostgresBroker() if backend == "postgres" else LocalBroker()
+
+
+broker = _make_broker()
+
+
+def start():
+    """Bind the hub to the running loop and start the broker (per worker)."""
+    hub.loop = asyncio.get_running_loop()
+    broker.start()
+
+
+def stop():
+    broker.stop()
+
+
+def publish(teacher_id: int, event: Dict[str, Any]):
+    """Send a dashboard delta to a teacher's subscribers on every worker.
+    Best effort: a failed publish never fails the write that triggered it."""
+    event = {**event, "ts": time.time()}
+    try:
+        broker.publish({"teacher_id": teacher_id, "event": event})
+    except Exception:
+        logger.exception("Event publish failed")
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
@@ -0,0 +1,276 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import archive
+from crud import essay_score
+from database import SessionLocal
+from models import Essay, EssaySubmission, Quiz, QuizSubmission, User
+
+COLUMNS = [
+    "kind", "assignment_id", "assignment_title", "submission_id", "student_id",
+    "student_name", "student_email", "score", "grammar_score", "clarity_score",
+    "keyword_usage_score", "submitted_at",
+]
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Rows fetched per round trip from the server-side cursor
+FETCH_SIZE = 1000
+# Rows per CSV/JSONL chunk and per Parquet row group
+CHUNK_ROWS = 1000
+PARQUET_ROW_GROUP = 50000
+
+
+class ExportFilters:
+    def __init__(
+        self,
+        teacher_id: int,
+        kind: str = "all",
+        quiz_id: Optional[int] = None,
+        essay_id: Optional[int] = None,
+        student_id: Optional[int] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        include_archived: bool = False,
+    ):
+        self.teacher_id = teacher_id
+        # Asking for a specific quiz or essay implies the kind
+        if quiz_id is not None and essay_id is None:
+            kind = "quiz"
+        elif essay_id is not None and quiz_id is None:
+            kind = "essay"
+        self.kind = kind
+        self.quiz_id = quiz_id
+        self.essay_id = essay_id
+        self.student_id = student_id
+        self.start = start
+        self.end = end
+        self.include_archived = include_archived
+
+
+def _quiz_rows(db, filters: ExportFilters) -> Iterator[Dict[str, Any]]:
+    query = db.query(
+        QuizSubmission.id, QuizSubmission.quiz_id, Quiz.title, QuizSubmission.student_id,
+        User.name, User.email, QuizSubmission.score, QuizSubmission.submitted_at
+    ).join(Quiz, Quiz.id == QuizSubmission.quiz_id).join(
+        User, User.id == QuizSubmission.student_id
+    ).filter(Quiz.teacher_id == filters.teacher_id)
+
+    if filters.quiz_id is not None:
+        query = query.filter(QuizSubmission.quiz_id == filters.quiz_id)
+    if filters.student_id is not None:
+        query = query.filter(QuizSubmission.student_id == filters.student_id)
+    if filters.start is not None:
+        query = query.filter(QuizSubmission.submitted_at >= filters.start)
+    if filters.end is not None:
+        query = query.filter(QuizSubmission.submitted_at < filters.end)
+
+    # yield_per streams from a server-side cursor instead of buffering all rows
+    for sub_id, quiz_id, title, student_id, name, email, score, submitted_at in query.order_by(
+        QuizSubmission.id
+    ).yield_per(FETCH_SIZE):
+        yield {
+            "kind": "quiz", "assignment_id": quiz_id, "assignment_title": title,
+            "submission_id": sub_id, "student_id": student_id, "student_name": name,
+            "student_email": email, "score": score, "grammar_score": None,
+            "clarity_score": None, "keyword_usage_score": None, "submitted_at": submitted_at,
+        }
+
+
+def _essay_rows(db, filters: ExportFilters) -> Iterator[Dict[str, Any]]:
+    # Only the feedback JSON is read; essay text never leaves the database
+    query = db.query(
+        EssaySubmission.id, EssaySubmission.essay_id, Essay.prompt, EssaySubmission.student_id,
+        User.name, User.email, EssaySubmission.ai_feedback, EssaySubmission.submitted_at
+    ).join(Essay, Essay.id == EssaySubmission.essay_id).join(
+        User, User.id == EssaySubmission.student_id
+    ).filter(Essay.teacher_id == filters.teacher_id)
+
+    if filters.essay_id is not None:
+        query = query.filter(EssaySubmission.essay_id == filters.essay_id)
+    if filters.student_id is not None:
+        query = query.filter(EssaySubmission.student_id == filters.student_id)
+    if filters.start is not None:
+        query = query.filter(EssaySubmission.submitted_at >= filters.start)
+    if filters.end is not None:
+        query = query.filter(EssaySubmission.submitted_at < filters.end)
+
+    for sub_id, essay_id, prompt, student_id, name, email, feedback, submitted_at in query.order_by(
+        EssaySubmission.id
+    ).yield_per(FETCH_SIZE):
+        feedback = feedback or {}
+        yield {
+            "kind": "essay", "assignment_id": essay_id, "assignment_title": (prompt or "")[:100],
+            "submission_id": sub_id, "student_id": student_id, "student_name": name,
+            "student_email": email, "score": essay_score(feedback),
+            "grammar_score": feedback.get("grammar_score"),
+            "clarity_score": feedback.get("clarity_score"),
+            "keyword_usage_score": feedback.get("keyword_usage_score"),
+            "submitted_at": submitted_at,
+        }
+
+
+def _archived_rows(db, filters: ExportFilters, kind: str) -> Iterator[Dict[str, Any]]:
+    """Rows of archived terms, joined to titles and names still in the database."""
+    if kind == "quiz":
+        table, model, assignment_column, title_column = "quiz_submissions", Quiz, "quiz_id", Quiz.title
+        columns = ["id", "quiz_id", "student_id", "score", "submitted_at"]
+        only = filters.quiz_id
+    else:
+        table, model, assignment_column, title_column = "essay_submissions", Essay, "essay_id", Essay.prompt
+        columns = ["id", "essay_id", "student_id", "ai_feedback", "submitted_at"]
+        only = filters.essay_id
+    rows = archive.archived_rows(db, table, filters.student_id, filters.start, filters.end, columns)
+    # Names are looked up per batch, so memory stays flat however large the archive
+    for batch in _batched(rows, FETCH_SIZE):
+        if only is not None:
+            batch = [row for row in batch if row[assignment_column] == only]
+        if not batch:
+            continue
+        titles = dict(db.query(model.id, title_column).filter(
+            model.teacher_id == filters.teacher_id,
+            model.id.in_({row[assignment_column] for row in batch})
+        ))
+        students = {
+            student_id: (name, email) for student_id, name, email in db.query(User.id, User.name, User.email).filter(
+                User.id.in_({row["student_id"] for row in batch})
+            )
+        }
+        for row in batch:
+            if row[assignment_column] not in titles:
+                continue
+            name, email = students.get(row["student_id"], (None, None))
+            feedback = row.get("ai_feedback") or {}
+            yield {
+                "kind": kind, "assignment_id": row[assignment_column],
+                "assignment_title": (titles[row[assignment_column]] or "")[:100],
+                "submission_id": row["id"], "student_id": row["student_id"], "student_name": name,
+                "student_email": email,
+                "score": row["score"] if kind == "quiz" else essay_score(feedback),
+                "grammar_score": feedback.get("grammar_score"),
+                "clarity_score": feedback.get("clarity_score"),
+                "keyword_usage_score": feedback.get("keyword_usage_score"),
+                "submitted_at": row["submitted_at"],
+            }
+
+
+def iter_rows(filters: ExportFilters) -> Iterator[Dict[str, Any]]:
+    # Runs while the response streams, after request dependencies have
+    # been torn down, so it owns its session
+    db = SessionLocal()
+    try:
+        if filters.kind in ("all", "quiz"):
+            if filters.include_archived:
+                yield from _archived_rows(db, filters, "quiz")
+            yield from _quiz_rows(db, filters)
+        if filters.kind in ("all", "essay"):
+            if filters.include_archived:
+                yield from _archived_rows(db, filters, "essay")
+            yield from _essay_rows(db, filters)
+    finally:
+        db.close()
+
+
+def _batched(rows: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _format_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def stream_csv(rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    for batch in _batched(rows, CHUNK_ROWS):
+        writer.writerows({key: _format_value(value) for key, value in row.items()} for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def stream_jsonl(rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    for batch in _batched(rows, CHUNK_ROWS):
+        yield "".join(json.dumps(row, default=_format_value) + "\n" for row in batch).encode()
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_parquet(rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("kind", pa.string()), ("assignment_id", pa.int64()), ("assignment_title", pa.string()),
+        ("submission_id", pa.int64()), ("student_id", pa.int64()), ("student_name", pa.string()),
+        ("student_email", pa.string()), ("score", pa.float64()), ("grammar_score", pa.float64()),
+        ("clarity_score", pa.float64()), ("keyword_usage_score", pa.float64()),
+        ("submitted_at", pa.timestamp("us", tz="UTC")),
+    ])
+    sink = _ChunkSink()
+    # One row group per batch, flushed to the client as soon as it's written
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in _batched(rows, PARQUET_ROW_GROUP):
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+STREAMERS = {"csv": stream_csv, "jsonl": stream_jsonl, "parquet": stream_parquet}
+
+
+def export_stream(filters: ExportFilters, fmt: str) -> Iterator[bytes]:
+    return STREAMERS[fmt](iter_rows(filters))
@@ -0,0 +1,153 @@
+import ast
+import json
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+from pydantic import ValidationError
+
+from prompt_builder import rubric_criteria
+from schemas import EssayFeedback
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+# Curly quote -> the straight quote it stands in for when it delimits a string
+_SMART_QUOTES = {"“": '"', "”": '"', "‘": "'", "’": "'"}
+
+# How each LLM response was parsed: "direct", "repaired", "unusable", "retried"
+_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+
+
+def record(outcome: str):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def parse_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    parsed = stats.get("direct", 0) + stats.get("repaired", 0)
+    total = parsed + stats.get("unusable", 0)
+    stats["success_rate"] = round(parsed / total, 4) if total else None
+    return stats
+
+
+def _balanced_object(text: str) -> Optional[str]:
+    """The first {...} span with balanced braces (ignoring braces in strings),
+    or everything from the first "{" with missing closers appended if the
+    response was cut off."""
+    start = text.find("{")
+    if start < 0:
+        return None
+    stack, in_string, escaped = [], False, False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+            if not stack:
+                return text[start:i + 1]
+    tail = '"' if in_string else ""
+    return text[start:].rstrip().rstrip(",") + tail + "".join(reversed(stack))
+
+
+def _straighten_quotes(text: str) -> str:
+    """Curly quotes that open or close a string become straight quotes; curly
+    quotes inside a string (quotations in the essay) are left as they are."""
+    out, closers, escaped = [], None, False
+    for char in text:
+        if closers is None:
+            if char == '"':
+                closers = '"'
+            elif char in _SMART_QUOTES:
+                # Closed by either curly form of the same quote, or its straight form
+                straight = _SMART_QUOTES[char]
+                closers = straight + "".join(c for c, s in _SMART_QUOTES.items() if s == straight)
+                char = straight
+        elif escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in closers:
+            char = _SMART_QUOTES.get(char, char)
+            closers = None
+        out.append(char)
+    return "".join(out)
+
+
+def _loads(candidate: str) -> Optional[Any]:
+    try:
+        return json.loads(candidate)
+    except ValueError:
+        pass
+    try:
+        return json.loads(_TRAILING_COMMA_RE.sub(r"\1", candidate))
+    except ValueError:
+        pass
+    # Python-style dicts: single quotes, True/False/None
+    try:
+        return ast.literal_eval(candidate)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def extract_json(text: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Return (object, "direct" | "repaired"), or (None, "unusable")."""
+    if not text:
+        return None, "unusable"
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data, "direct"
+    except ValueError:
+        pass
+
+    candidates = [match.strip() for match in _FENCE_RE.findall(text)]
+    candidates.append(text)
+    for candidate in candidates:
+        attempts = [candidate]
+        if any(quote in candidate for quote in _SMART_QUOTES):
+            # Only when the text as written doesn't parse: quotes inside values are content
+            attempts.append(_straighten_quotes(candidate))
+        for attempt in attempts:
+            obj = _balanced_object(attempt)
+            data = _loads(obj) if obj else None
+            if isinstance(data, dict):
+                return data, "repaired"
+    return None, "unusable"
+
+
+def parse_feedback(text: str, rubric: Any = None) -> Tuple[Optional[EssayFeedback], str]:
+    """Extract, repair and validate an LLM feedback response. Returns
+    (feedback, outcome); feedback is None when the response is unusable."""
+    data, outcome = extract_json(text)
+    if data is None:
+        return None, outcome
+    try:
+        feedback = EssayFeedback.model_validate(data)
+    except ValidationError:
+        return None, "unusable"
+    if not feedback.is_usable():
+        return None, "unusable"
+
+    # Keep only known rubric criteria, clamped to their range
+    criteria = rubric_criteria(rubric)
+    if criteria:
+        feedback.rubric_scores = {
+            name: max(0.0, min(float(criteria[name]), score))
+            for name, score in feedback.rubric_scores.items()
+            if name in criteria
+        }
+    return feedback, outcome
@@ -0,0 +1,171 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from models import Essay, EssaySubmission, FeedbackTheme
+from text_metrics import stem
+
+# ai_feedback list field -> theme kind
+KINDS = {"strengths": "strength", "weaknesses": "weakness", "suggestions": "suggestion"}
+
+# Token-set (Jaccard) similarity at which two phrases count as the same theme
+SIMILARITY_THRESHOLD = 0.6
+
+# Themes kept per scope and kind; past this, one-off themes are pruned to make
+# room, so matching a phrase stays bounded however varied the feedback gets
+MAX_CLUSTERS = 500
+
+# Negations are kept: "not clear" and "clear" must not merge
+_PHRASE_STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or the their this to was
+were with essay student writer writing some more very good well your his her they uses use
+""".split())
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def phrase_tokens(phrase: Any) -> frozenset:
+    words = _WORD_RE.findall(str(phrase).lower())
+    return frozenset(stem(word) for word in words if word not in _PHRASE_STOPWORDS)
+
+
+def token_similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _scope(query, teacher_id: int, essay_id: Optional[int]):
+    query = query.filter(FeedbackTheme.teacher_id == teacher_id)
+    if essay_id is None:
+        return query.filter(FeedbackTheme.essay_id.is_(None))
+    return query.filter(FeedbackTheme.essay_id == essay_id)
+
+
+def _prune(db: Session, teacher_id: int, essay_id: Optional[int], kind: str, keep: set) -> List[int]:
+    """Delete the scope's themes seen at most once, except `keep`. Returns their ids."""
+    one_off = _scope(db.query(FeedbackTheme.id), teacher_id, essay_id).filter(
+        FeedbackTheme.kind == kind,
+        FeedbackTheme.count <= 1
+    ).all()
+    ids = [cluster_id for (cluster_id,) in one_off if cluster_id not in keep]
+    if ids:
+        # Re-checked in the delete in case another worker just counted one again
+        db.query(FeedbackTheme).filter(FeedbackTheme.id.in_(ids), FeedbackTheme.count <= 1).delete(
+            synchronize_session=False
+        )
+    return ids
+
+
+def _apply_phrases(
+    db: Session, teacher_id: int, essay_id: Optional[int], kind: str, phrases: Iterable[Any], delta: int
+):
+    # Only the token sets are needed to match; labels and counts stay in the database
+    clusters = _scope(db.query(FeedbackTheme.id, FeedbackTheme.tokens), teacher_id, essay_id).filter(
+        FeedbackTheme.kind == kind
+    )
+    cluster_tokens = {cluster_id: frozenset(tokens.split()) for cluster_id, tokens in clusters}
+    # Count each theme once per submission, however many phrasings hit it,
+    # including themes this submission just created
+    touched = set()
+
+    for phrase in phrases:
+        tokens = phrase_tokens(phrase)
+        if not tokens:
+            continue
+        best, best_score = None, 0.0
+        for cluster_id, candidate in cluster_tokens.items():
+            score = token_similarity(tokens, candidate)
+            if score > best_score:
+                best, best_score = cluster_id, score
+
+        if best is not None and best_score >= SIMILARITY_THRESHOLD:
+            touched.add(best)
+        elif delta > 0:
+            if len(cluster_tokens) >= MAX_CLUSTERS:
+                for cluster_id in _prune(db, teacher_id, essay_id, kind, touched):
+                    cluster_tokens.pop(cluster_id, None)
+                if len(cluster_tokens) >= MAX_CLUSTERS:
+                    # Every theme has recurred; a new one-off phrase isn't tracked
+                    continue
+            cluster = FeedbackTheme(
+                teacher_id=teacher_id,
+                essay_id=essay_id,
+                kind=kind,
+                label=str(phrase).strip(),
+                tokens=" ".join(sorted(tokens)),
+                count=0
+            )
+            db.add(cluster)
+            db.flush()
+            cluster_tokens[cluster.id] = tokens
+            touched.add(cluster.id)
+
+    # Atomic increments so concurrent workers don't lose updates
+    for cluster_id in touched:
+        db.query(FeedbackTheme).filter(FeedbackTheme.id == cluster_id).update(
+            {FeedbackTheme.count: FeedbackTheme.count + delta}, synchronize_session=False
+        )
+
+
+def _apply_feedback(db: Session, teacher_id: int, essay_id: int, feedback: Dict[str, Any], delta: int):
+    for field, kind in KINDS.items():
+        phrases = feedback.get(field)
+        if not isinstance(phrases, list) or not phrases:
+            continue
+        # Per-essay and teacher-wide (essay_id NULL) rollups
+        for scope_essay_id in (essay_id, None):
+            _apply_phrases(db, teacher_id, scope_essay_id, kind, phrases, delta)
+
+
+def _countable(feedback: Optional[Dict[str, Any]]) -> bool:
+    # Fallback feedback (after an LLM error) carries canned phrases; skip it
+    return bool(feedback) and "error" not in feedback
+
+
+def record_feedback(db: Session, submission: EssaySubmission, feedback: Dict[str, Any]):
+    """Fold a submission's new feedback into the theme counts, replacing its
+    previous feedback if that was already counted. Call before assigning
+    submission.ai_feedback; the caller commits."""
+    teacher_id = submission.essay.teacher_id
+    if submission.themes_applied and _countable(submission.ai_feedback):
+        _apply_feedback(db, teacher_id, submission.essay_id, submission.ai_feedback, -1)
+    submission.themes_applied = _countable(feedback)
+    if submission.themes_applied:
+        _apply_feedback(db, teacher_id, submission.essay_id, feedback, 1)
+
+
+def backfill(db: Session, essay_ids: List[int], batch_size: int = 200):
+    """Count feedback that landed before theme tracking existed, in batches so
+    only one batch of JSON blobs is loaded at a time (the session's identity
+    map holds instances weakly)."""
+    if not essay_ids:
+        return
+    teacher_ids = dict(db.query(Essay.id, Essay.teacher_id).filter(Essay.id.in_(essay_ids)))
+    pending = db.query(EssaySubmission.id).filter(
+        EssaySubmission.essay_id.in_(essay_ids),
+        EssaySubmission.ai_feedback.isnot(None),
+        EssaySubmission.themes_applied.is_(None)
+    ).all()
+    ids = [submission_id for (submission_id,) in pending]
+    for start in range(0, len(ids), batch_size):
+        batch = db.query(EssaySubmission).filter(EssaySubmission.id.in_(ids[start:start + batch_size])).all()
+        for submission in batch:
+            submission.themes_applied = _countable(submission.ai_feedback)
+            if submission.themes_applied:
+                _apply_feedback(db, teacher_ids[submission.essay_id], submission.essay_id, submission.ai_feedback, 1)
+        db.commit()
+
+
+def ranked_themes(
+    db: Session, teacher_id: int, essay_id: Optional[int] = None, limit: int = 10
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Most frequent themes per kind, e.g. {"strengths": [{"label", "count"}]}."""
+    result = {}
+    for field, kind in KINDS.items():
+        rows = _scope(db.query(FeedbackTheme), teacher_id, essay_id).filter(
+            FeedbackTheme.kind == kind,
+            FeedbackTheme.count > 0
+        ).order_by(FeedbackTheme.count.desc(), FeedbackTheme.id).limit(limit).all()
+        result[field] = [{"label": row.label, "count": row.count} for row in rows]
+    return result
@@ -0,0 +1,44 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy.orm import load_only
+
+# Card fields per model; heavy JSON/Text columns are only loaded when named in ?fields=
+SUMMARY_FIELDS = {
+    "quiz": ("id", "teacher_id", "title", "question_count", "created_at"),
+    "essay": ("id", "teacher_id", "prompt", "quality_tier", "created_at"),
+    "essay_submission": ("id", "essay_id", "student_id", "score", "word_count", "submitted_at"),
+}
+EXTRA_FIELDS = {
+    "quiz": ("questions",),
+    "essay": ("rubric",),
+    "essay_submission": ("text", "ai_feedback", "rubric_scores", "text_metrics"),
+}
+
+
+def parse_fields(kind: str, fields: Optional[str]) -> List[str]:
+    """`fields` is a comma-separated list; "all" selects every field.
+    Without it the summary fields are returned. The id is always included."""
+    if not fields:
+        return list(SUMMARY_FIELDS[kind])
+    allowed = SUMMARY_FIELDS[kind] + EXTRA_FIELDS[kind]
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    if "all" in requested:
+        return list(allowed)
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return list(dict.fromkeys(["id", *requested]))
+
+
+def load_fields(model, names: Sequence[str]):
+    """Loader option that fetches only the named columns."""
+    return load_only(*(getattr(model, name) for name in names))
+
+
+def project(rows: Iterable[Any], names: Sequence[str]) -> List[Dict[str, Any]]:
+    # Only touches loaded attributes, so no deferred column is lazy-loaded here
+    return [{name: getattr(row, name) for name in names} for row in rows]
@@ -0,0 +1,56 @@
+# Production server: gunicorn master + uvicorn workers.
+#
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# The app is imported once in the master (preload) and forked into workers, so
+# module-level setup (table creation, imports) happens once and pages are
+# shared copy-on-write. Anything holding sockets or threads is recreated per
+# worker in post_fork. Send SIGHUP for a graceful rolling restart of workers.
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+
+def _available_cpus() -> int:
+    # Respect CPU affinity and a cgroup v2 quota (docker --cpus), not just the host
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+# Workers are async, so one per core; the app blocks on sync DB/LLM calls
+# inside request handlers, which is what extra cores buy back.
+workers = int(os.getenv("WEB_CONCURRENCY", _available_cpus()))
+
+# Essay grading waits on the LLM; give in-flight requests time to finish on
+# restart instead of killing them at the default 30s.
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "120"))
+keepalive = 5
+
+# Recycle workers periodically; jitter avoids restarting them all at once
+max_requests = int(os.getenv("MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "500"))
+
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    from ai_feedback import ai_feedback_service
+    from auth import init_firebase
+    from database import reset_engine_after_fork
+
+    reset_engine_after_fork()
+    init_firebase()
+    ai_feedback_service.reset_client()
@@ -0,0 +1,130 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from models import IdempotencyKey
+
+MAX_KEY_LENGTH = 255
+
+
+def _hash_request(route: str, payload: Any) -> str:
+    body = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(f"{route}\n{body}".encode()).hexdigest()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _expired(record: IdempotencyKey) -> bool:
+    expires_at = record.expires_at
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at <= _now()
+
+
+class Claim:
+    def __init__(self, user_id: int, key: str):
+        self.user_id = user_id
+        self.key = key
+
+
+def claim(db: Session, user_id: int, key: Optional[str], route: str, payload: Any):
+    """Reserve `key` for this request. Returns a Claim to complete() after the
+    work, a JSONResponse replaying the original result, or None when the
+    client sent no key. A unique (user_id, key) row decides races: exactly
+    one concurrent request inserts it."""
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+
+    request_hash = _hash_request(route, payload)
+    record = IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        route=route,
+        request_hash=request_hash,
+        expires_at=_now() + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+    )
+    db.add(record)
+    try:
+        db.commit()
+        return Claim(user_id, key)
+    except IntegrityError:
+        db.rollback()
+
+    existing = db.query(IdempotencyKey).filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.key == key
+    ).first()
+    if existing is None or _expired(existing):
+        # Expired (or released in between): take it over
+        if existing is not None:
+            db.delete(existing)
+            db.commit()
+        return claim(db, user_id, key, route, payload)
+
+    if existing.request_hash != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    if existing.response_status is None:
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is still being processed",
+            headers={"Retry-After": "2"}
+        )
+    return JSONResponse(
+        status_code=existing.response_status,
+        content=existing.response_body,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+def complete(claimed: Optional[Claim], status_code: int, body: Any):
+    if claimed is None:
+        return
+    # Own session: the request's session may be mid-transaction or rolled back
+    db = SessionLocal()
+    try:
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == claimed.user_id,
+            IdempotencyKey.key == claimed.key
+        ).update({
+            IdempotencyKey.response_status: status_code,
+            IdempotencyKey.response_body: body
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def release(claimed: Optional[Claim]):
+    """Forget a claim whose request failed, so a retry can run for real."""
+    if claimed is None:
+        return
+    db = SessionLocal()
+    try:
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == claimed.user_id,
+            IdempotencyKey.key == claimed.key
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def purge_expired():
+    db = SessionLocal()
+    try:
+        db.query(IdempotencyKey).filter(IdempotencyKey.expires_at <= _now()).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from config import settings
+
+# Functions run once per worker before it starts accepting traffic
+_warmers: List[Callable[[], None]] = []
+
+# Long-running work (e.g. essay grading) that a shutdown must wait for
+_in_flight: Dict[str, int] = {}
+_lock = threading.Lock()
+
+state = {"ready": False, "draining": False}
+
+
+def on_warmup(fn: Callable[[], None]) -> Callable[[], None]:
+    """Register a cache warmer; runs in every worker during startup."""
+    _warmers.append(fn)
+    return fn
+
+
+def warm_up():
+    for fn in _warmers:
+        started = time.perf_counter()
+        try:
+            fn()
+            print(f"Warm-up {fn.__module__}.{fn.__name__} done in {(time.perf_counter() - started) * 1000:.0f} ms")
+        except Exception as e:
+            # A cold cache is slower, not broken; keep the worker up
+            print(f"Warm-up {fn.__module__}.{fn.__name__} failed:", e)
+    state["ready"] = True
+
+
+@contextmanager
+def in_flight(kind: str):
+    """Mark a block of work that graceful shutdown should drain."""
+    with _lock:
+        _in_flight[kind] = _in_flight.get(kind, 0) + 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _in_flight[kind] -= 1
+
+
+def in_flight_counts() -> Dict[str, int]:
+    with _lock:
+        return {kind: count for kind, count in _in_flight.items() if count}
+
+
+async def drain():
+    """Stop reporting ready and wait (bounded) for in-flight work to finish."""
+    state["ready"] = False
+    state["draining"] = True
+    deadline = time.monotonic() + settings.GRACEFUL_DRAIN_SECONDS
+    while in_flight_counts() and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    remaining = in_flight_counts()
+    if remaining:
+        print("Shutdown drain timed out with work still in flight:", remaining)
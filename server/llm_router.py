@@ -0,0 +1,287 @@
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from config import settings
+from profiling import span
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per provider for the hedge percentile
+LATENCY_WINDOW = 200
+# Below this many samples the hedge delay is LLM_HEDGE_DEFAULT_MS
+MIN_SAMPLES = 20
+
+
+class ProviderError(Exception):
+    pass
+
+
+class Provider:
+    """One backend + model. `complete` takes a provider-neutral request
+    (messages, temperature, max_completion_tokens, ...) and returns the text."""
+
+    kind = "base"
+
+    def __init__(self, model: str, options: Optional[Dict[str, str]] = None):
+        self.model = model
+        self.options = options or {}
+        self.name = self.options.get("name") or f"{self.kind}:{model}"
+
+    def complete(self, request: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+
+class GroqProvider(Provider):
+    kind = "groq"
+
+    def __init__(self, model: str, options: Optional[Dict[str, str]] = None):
+        super().__init__(model, options)
+        self.client = None
+
+    def reset(self):
+        # The client owns an httpx connection pool; never share it across a fork
+        self.client = None
+
+    def _client(self):
+        if self.client is None:
+            from groq import Groq
+            self.client = Groq()
+        return self.client
+
+    def complete(self, request: Dict[str, Any]) -> str:
+        request = {**request, "model": self.model, "stream": False}
+        if self.options.get("reasoning", "true") == "false":
+            request.pop("reasoning_effort", None)
+        response = self._client().chat.completions.create(**request)
+        return response.choices[0].message.content
+
+
+class OpenAIProvider(GroqProvider):
+    """OpenAI, or any OpenAI-compatible endpoint via ?base_url=."""
+
+    kind = "openai"
+
+    def _client(self):
+        if self.client is None:
+            from openai import OpenAI
+            self.client = OpenAI(base_url=self.options.get("base_url") or None)
+        return self.client
+
+    def complete(self, request: Dict[str, Any]) -> str:
+        request = {**request, "model": self.model}
+        request.pop("stream", None)
+        if self.options.get("reasoning", "false") != "true":
+            request.pop("reasoning_effort", None)
+        response = self._client().chat.completions.create(**request)
+        return response.choices[0].message.content
+
+
+class FakeProvider(Provider):
+    """Local stand-in with configurable latency and failure rate, e.g.
+    "fake:slow?latency_ms=800&jitter_ms=400&error_rate=0.2"."""
+
+    kind = "fake"
+
+    def __init__(self, model: str, options: Optional[Dict[str, str]] = None):
+        super().__init__(model, options)
+        self.latency = float(self.options.get("latency_ms", 50)) / 1000
+        self.jitter = float(self.options.get("jitter_ms", 0)) / 1000
+        self.error_rate = float(self.options.get("error_rate", 0))
+        self.score = int(self.options.get("score", 75))
+
+    def complete(self, request: Dict[str, Any]) -> str:
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.error_rate:
+            raise ProviderError(f"{self.name}: simulated failure")
+        return json.dumps({
+            "grammar_score": self.score,
+            "clarity_score": self.score,
+            "keyword_usage_score": self.score,
+            "overall_feedback": f"Feedback from {self.name}.",
+            "strengths": ["Clear position"],
+            "weaknesses": ["Needs more evidence"],
+            "suggestions": ["Add a supporting example"],
+        })
+
+
+PROVIDER_KINDS = {cls.kind: cls for cls in (GroqProvider, OpenAIProvider, FakeProvider)}
+
+
+def parse_providers(spec: str) -> List[Provider]:
+    """"kind:model[?option=value&...]" entries, comma separated, in priority order."""
+    providers = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, rest = entry.partition(":")
+        model, _, query = rest.partition("?")
+        if kind not in PROVIDER_KINDS:
+            raise ValueError(f"Unknown LLM provider kind {kind!r} in LLM_PROVIDERS")
+        providers.append(PROVIDER_KINDS[kind](model, dict(parse_qsl(query))))
+    return providers
+
+
+class ProviderHealth:
+    """Rolling latency percentiles plus a simple circuit breaker: after
+    LLM_BREAKER_FAILURES consecutive errors the provider is skipped for
+    LLM_BREAKER_COOLDOWN_SECONDS, then gets one trial request."""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        # Hedges that beat a request still in flight; failovers are requests
+        # taken over after the earlier provider(s) failed
+        self.backup_wins = 0
+        self.failovers = 0
+        self._lock = threading.Lock()
+
+    def record(self, ok: bool, seconds: float):
+        with self._lock:
+            if ok:
+                self.successes += 1
+                self.consecutive_failures = 0
+                self.latencies.append(seconds)
+            else:
+                self.failures += 1
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= settings.LLM_BREAKER_FAILURES:
+                    self.open_until = time.monotonic() + settings.LLM_BREAKER_COOLDOWN_SECONDS
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if len(self.latencies) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "available": self.available(),
+            "successes": self.successes,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "backup_wins": self.backup_wins,
+            "failovers": self.failovers,
+            "p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+        }
+
+
+class ProviderRouter:
+    """Sends a request to the first healthy provider. If it hasn't answered
+    by its latency percentile (LLM_HEDGE_PERCENTILE), the next provider gets
+    the same request and the first good answer wins; a failure moves on to
+    the next provider straight away."""
+
+    def __init__(self, providers: List[Provider]):
+        if not providers:
+            raise ValueError("No LLM providers configured")
+        self.providers = providers
+        self.health = {provider.name: ProviderHealth() for provider in providers}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """After a fork: fresh clients and a fresh thread pool."""
+        for provider in self.providers:
+            provider.reset()
+        self._executor = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(4, settings.LLM_MAX_IN_FLIGHT * 2), thread_name_prefix="llm"
+                )
+            return self._executor
+
+    def _ordered(self) -> List[Provider]:
+        healthy = [p for p in self.providers if self.health[p.name].available()]
+        # Every breaker open: try them all anyway rather than fail outright
+        return healthy or list(self.providers)
+
+    def hedge_delay(self, provider: Provider) -> float:
+        latency = self.health[provider.name].percentile(settings.LLM_HEDGE_PERCENTILE)
+        if latency is None:
+            latency = settings.LLM_HEDGE_DEFAULT_MS / 1000
+        return max(latency, settings.LLM_HEDGE_MIN_MS / 1000)
+
+    def _call(self, provider: Provider, request: Dict[str, Any]) -> str:
+        started = time.perf_counter()
+        try:
+            with span(f"llm:{provider.kind}"):
+                text = provider.complete(request)
+        except Exception:
+            self.health[provider.name].record(False, time.perf_counter() - started)
+            raise
+        self.health[provider.name].record(True, time.perf_counter() - started)
+        return text
+
+    def complete(self, request: Dict[str, Any]) -> Tuple[str, str]:
+        """Returns (text, provider name). Raises the last error if every provider failed."""
+        queue = self._ordered()
+        pending: Dict[Future, Provider] = {}
+        hedges: List[Provider] = []
+        last_error: Optional[BaseException] = None
+        deadline = time.monotonic() + settings.LLM_PROVIDER_TIMEOUT_SECONDS
+
+        def launch():
+            provider = queue.pop(0)
+            pending[self._pool().submit(contextvars.copy_context().run, self._call, provider, request)] = provider
+            return provider
+
+        primary = launch()
+        hedge_at = time.monotonic() + self.hedge_delay(primary) if settings.LLM_HEDGE else None
+
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if hedge_at is not None and queue:
+                timeout = min(timeout, max(0.0, hedge_at - now))
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    last_error = e
+                    logger.warning("LLM provider %s failed: %s", provider.name, e)
+                    continue
+                if provider in hedges and pending:
+                    # Started by the timer and answered before the slower request
+                    self.health[provider.name].backup_wins += 1
+                # Losers keep running in the pool; their outcome still feeds health
+                return text, provider.name
+
+            if not pending and queue:
+                # Failover: the in-flight request(s) failed
+                self.health[launch().name].failovers += 1
+            elif hedge_at is not None and queue and time.monotonic() >= hedge_at:
+                hedges.append(launch())
+                hedge_at = time.monotonic() + self.hedge_delay(hedges[-1])
+
+        if last_error is None:
+            last_error = ProviderError("LLM providers timed out")
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        return {provider.name: self.health[provider.name].snapshot() for provider in self.providers}
@@ -1,10 +1,22 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from database import engine, Base
-from routers import auth, quizzes, essays, analytics,teacher,student
-# Create tables
+import admission
+import events
+import lifecycle
+import migrations
+import profiling
+import section_cache
+from auth import is_admin_token
+from crud import backfill_essay_scores
+from database import engine, Base, warm_pool
+from idempotency import purge_expired as purge_expired_idempotency_keys
+from partitions import ensure_partitions
+from routers import auth, quizzes, essays, analytics,teacher,student,debug,admin
+# Create tables, then add columns that older databases are missing
 Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
 app = FastAPI(title="Atheno Backend", version="1.0.0")
 
@@ -15,15 +27,68 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Profile-Id"],
 )
 
+profiling.instrument_engine(engine)
+lifecycle.on_warmup(warm_pool)
+lifecycle.on_warmup(backfill_essay_scores)
+lifecycle.on_warmup(purge_expired_idempotency_keys)
+lifecycle.on_warmup(section_cache.purge_expired)
+lifecycle.on_warmup(ensure_partitions)
+
+@app.on_event("startup")
+async def warm_up_worker():
+    # Runs in each worker before uvicorn starts accepting connections
+    events.start()
+    lifecycle.warm_up()
+
+@app.on_event("shutdown")
+async def drain_worker():
+    await lifecycle.drain()
+    events.stop()
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    # Full stack sampling is opt-in per request ("X-Profile: 1") for admins or
+    # holders of a signed header; otherwise only the slow-request log runs.
+    wants_profile = "x-profile" in request.headers and (
+        profiling.verify_signature(request.method, request.url.path, request.headers.get("x-profile-signature"))
+        or is_admin_token(request.headers.get("authorization", "").removeprefix("Bearer "))
+    )
+    if not wants_profile and not profiling.slow_sampling_enabled():
+        return await call_next(request)
+
+    profile = profiling.start(request.method, request.url.path, sample=wants_profile)
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        route = request.scope.get("route")
+        profiling.finish(profile, status_code, getattr(route, "path", None))
+
+    if wants_profile:
+        response.headers["X-Profile-Id"] = profile.id
+    return response
+
 # Include routers
 app.include_router(auth, prefix="/auth", tags=["auth"])
-app.include_router(quizzes, prefix="/quizzes", tags=["quizzes"])
-app.include_router(essays, prefix="/essays", tags=["essays"])
-app.include_router(analytics, prefix="/analytics", tags=["analytics"])
-app.include_router(teacher, prefix="/teacher", tags=["teacher"])
-app.include_router(student, prefix="/student", tags=["student"])
+rate_limited = [Depends(admission.rate_limit_request)]
+app.include_router(quizzes, prefix="/quizzes", tags=["quizzes"], dependencies=rate_limited)
+app.include_router(essays, prefix="/essays", tags=["essays"], dependencies=rate_limited)
+app.include_router(analytics, prefix="/analytics", tags=["analytics"], dependencies=rate_limited)
+app.include_router(teacher, prefix="/teacher", tags=["teacher"], dependencies=rate_limited)
+app.include_router(student, prefix="/student", tags=["student"], dependencies=rate_limited)
+app.include_router(debug, prefix="/debug", tags=["debug"])
+app.include_router(admin, prefix="/admin", tags=["admin"])
 @app.get("/")
 async def root():
-    return {"message": "Atheno Backend API"}
\ No newline at end of file
+    return {"message": "Atheno Backend API"}
+
+@app.get("/health/ready")
+async def readiness():
+    # Load balancers stop routing here while a worker warms up or drains
+    if not lifecycle.state["ready"]:
+        return JSONResponse(status_code=503, content={"ready": False, **lifecycle.state})
+    return {"ready": True, "in_flight": lifecycle.in_flight_counts()}
\ No newline at end of file
@@ -0,0 +1,156 @@
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, exists, insert, inspect, literal, select, text, union
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from config import settings
+from models import (
+    Class, Enrollment, Essay, EssayAssignment, EssaySubmission, Quiz, QuizAssignment, QuizSubmission,
+    SchemaMigration
+)
+from text_metrics import compute_metrics
+
+BACKFILL_BATCH = 1000
+
+
+def _backfill(connection: Connection, table, source: Sequence[str], target: str, compute: Callable[..., Any]):
+    # Keyset batches, so large tables are never loaded at once
+    columns = [table.c[name] for name in source]
+    update = table.update().where(table.c.id == bindparam("row_id")).values({target: bindparam("value")})
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(table.c.id, *columns).where(table.c.id > last_id).order_by(table.c.id).limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            break
+        connection.execute(update, [{"row_id": row[0], "value": compute(*row[1:])} for row in rows])
+        last_id = rows[-1][0]
+
+
+def _question_counts(connection: Connection):
+    _backfill(connection, Quiz.__table__, ["questions"], "question_count", lambda questions: len(questions or []))
+
+
+def _word_counts(connection: Connection):
+    def word_count(text_value, metrics):
+        if metrics and "word_count" in metrics:
+            return metrics["word_count"]
+        return compute_metrics(text_value)["word_count"]
+    _backfill(connection, EssaySubmission.__table__, ["text", "text_metrics"], "word_count", word_count)
+
+
+# Columns added to tables that older databases already have, oldest first,
+# each with an optional backfill for the existing rows. create_all only
+# creates missing tables, so upgrade() adds these before anything queries.
+ADDED_COLUMNS: List[Tuple[type, str, Optional[Callable[[Connection], None]]]] = [
+    (EssaySubmission, "text_metrics", None),  # Computed on demand for old rows (see routers.generate_ai_feedback)
+    (EssaySubmission, "themes_applied", None),  # NULL rows are counted by feedback_themes' backfill
+    (EssaySubmission, "score", None),  # Filled by crud.backfill_essay_scores at warm-up
+    (Quiz, "version", None),  # Server default 1
+    (Quiz, "question_count", _question_counts),
+    (EssaySubmission, "word_count", _word_counts),
+    (Essay, "quality_tier", None),  # NULL = LLM_DEFAULT_TIER
+]
+# Indexes added to existing tables, by name
+ADDED_INDEXES: List[Tuple[type, str]] = [
+    (QuizSubmission, "ix_quiz_submissions_quiz_submitted"),
+    (QuizSubmission, "ix_quiz_submissions_student_submitted"),
+    (EssaySubmission, "ix_essay_submissions_essay_submitted"),
+    (EssaySubmission, "ix_essay_submissions_student_submitted"),
+]
+if settings.ONE_SUBMISSION_PER_ASSIGNMENT:
+    ADDED_INDEXES += [
+        (QuizSubmission, "uq_quiz_submissions_quiz_id_student"),
+        (EssaySubmission, "uq_essay_submissions_essay_id_student"),
+    ]
+
+
+DEFAULT_CLASS_NAME = "All students"
+
+
+def default_classes(connection: Connection):
+    """Quizzes and essays from before classes existed have no assignment and
+    would vanish for students. Each teacher with such work gets one class
+    holding it, enrolling every student who ever submitted to the teacher."""
+    unassigned = (
+        (Quiz, QuizAssignment, QuizAssignment.quiz_id),
+        (Essay, EssayAssignment, EssayAssignment.essay_id),
+    )
+    teacher_ids = set()
+    for model, _, column in unassigned:
+        teacher_ids.update(connection.execute(
+            select(model.teacher_id).where(~exists().where(column == model.id)).distinct()
+        ).scalars())
+    for teacher_id in sorted(t for t in teacher_ids if t is not None):
+        class_id = connection.execute(
+            insert(Class).values(teacher_id=teacher_id, name=DEFAULT_CLASS_NAME)
+        ).inserted_primary_key[0]
+        for model, assignment, column in unassigned:
+            connection.execute(insert(assignment).from_select(
+                ["class_id", column.key],
+                select(literal(class_id), model.id).where(model.teacher_id == teacher_id, ~exists().where(column == model.id))
+            ))
+        submitters = union(
+            select(QuizSubmission.student_id).join(Quiz, Quiz.id == QuizSubmission.quiz_id).where(Quiz.teacher_id == teacher_id),
+            select(EssaySubmission.student_id).join(Essay, Essay.id == EssaySubmission.essay_id).where(Essay.teacher_id == teacher_id),
+        ).subquery()
+        connection.execute(insert(Enrollment).from_select(
+            ["class_id", "student_id"], select(literal(class_id), submitters.c.student_id)
+        ))
+        print(f"Schema upgrade: created class {DEFAULT_CLASS_NAME!r} for teacher {teacher_id}'s unassigned work")
+
+
+# One-shot data migrations, oldest first; each runs once per database
+DATA_MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("default_classes", default_classes),
+]
+
+
+def _add_column(connection: Connection, table, column):
+    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=connection.dialect)}"
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    connection.execute(text(ddl))
+
+
+def upgrade(engine: Engine):
+    """Bring tables created by an older version up to the current models.
+    Idempotent; runs once per start, right after create_all."""
+    inspector = inspect(engine)
+    existing = {}
+    with engine.begin() as connection:
+        for model, name, backfill in ADDED_COLUMNS:
+            table = model.__table__
+            if table.name not in existing:
+                existing[table.name] = {column["name"] for column in inspector.get_columns(table.name)}
+            if name in existing[table.name]:
+                continue
+            _add_column(connection, table, table.c[name])
+            existing[table.name].add(name)
+            if backfill is not None:
+                backfill(connection)
+            print(f"Schema upgrade: added {table.name}.{name}")
+
+        for model, name in ADDED_INDEXES:
+            table = model.__table__
+            if name in {index["name"] for index in inspector.get_indexes(table.name)}:
+                continue
+            index = next(index for index in table.indexes if index.name == name)
+            try:
+                index.create(connection)
+            except IntegrityError:
+                raise RuntimeError(
+                    f"Can't create unique index {name}: {table.name} already holds duplicate rows. "
+                    "Remove them or turn ONE_SUBMISSION_PER_ASSIGNMENT off."
+                )
+            print(f"Schema upgrade: created index {name}")
+
+        applied = set(connection.execute(select(SchemaMigration.name)).scalars())
+        for name, migrate in DATA_MIGRATIONS:
+            if name not in applied:
+                migrate(connection)
+                connection.execute(insert(SchemaMigration).values(name=name))
@@ -0,0 +1,170 @@
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import LLMDecision
+from prompt_builder import count_tokens, rubric_criteria
+
+TIERS = ("economy", "standard", "premium")
+MODEL_CLASSES = ("small", "medium", "large")
+
+# Essay size bands, in estimated tokens
+SHORT_ESSAY_TOKENS = 150
+LONG_ESSAY_TOKENS = 1500
+# Rubrics with more criteria than this count as complex
+COMPLEX_RUBRIC_CRITERIA = 4
+
+# (tier, size) -> (model class, reasoning effort)
+RULES = {
+    ("economy", "short"): ("small", "low"),
+    ("economy", "medium"): ("small", "low"),
+    ("economy", "long"): ("medium", "low"),
+    ("standard", "short"): ("small", "low"),
+    ("standard", "medium"): ("medium", "medium"),
+    ("standard", "long"): ("medium", "medium"),
+    ("premium", "short"): ("medium", "medium"),
+    ("premium", "medium"): ("large", "medium"),
+    ("premium", "long"): ("large", "high"),
+}
+_EFFORT_UP = {"low": "medium", "medium": "high", "high": "high"}
+# Reasoning tokens count against max_completion_tokens
+_EFFORT_ALLOWANCE = {"low": 100, "medium": 300, "high": 700}
+
+
+class Decision:
+    """What the policy picked for one essay, and (after grading) what it cost."""
+
+    def __init__(self, tier: str, size: str, complex_rubric: bool, model_class: str,
+                 reasoning_effort: str, max_output_tokens: int, essay_tokens: int, criteria: int):
+        self.tier = tier
+        self.size = size
+        self.complex_rubric = complex_rubric
+        self.model_class = model_class
+        self.reasoning_effort = reasoning_effort
+        self.max_output_tokens = max_output_tokens
+        self.essay_tokens = essay_tokens
+        self.criteria = criteria
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.providers = set()
+        self._lock = threading.Lock()
+
+    def add_usage(self, provider: str, messages, text: str):
+        # Estimated with the same tokenizer as the prompt budget
+        input_tokens = sum(count_tokens(message["content"]) for message in messages)
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.output_tokens += count_tokens(text or "")
+            self.providers.add(provider)
+
+    def record(self, latency_ms: float, outcome: str) -> Dict[str, Any]:
+        """Row for the llm_decisions table (see crud.save_essay_feedback)."""
+        return {
+            "tier": self.tier,
+            "size_class": self.size,
+            "complex_rubric": self.complex_rubric,
+            "model_class": self.model_class,
+            "provider": ",".join(sorted(self.providers)) or None,
+            "reasoning_effort": self.reasoning_effort,
+            "max_output_tokens": self.max_output_tokens,
+            "essay_tokens": self.essay_tokens,
+            "rubric_criteria": self.criteria,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "latency_ms": round(latency_ms),
+            "cost_usd": estimate_cost(self.providers, self.input_tokens, self.output_tokens),
+            "outcome": outcome,
+        }
+
+
+def _parse_pairs(spec: str) -> Dict[str, str]:
+    """"key=value;key=value" (values may contain "=", "?", "&" and ",")."""
+    pairs = {}
+    for part in filter(None, (part.strip() for part in spec.split(";"))):
+        key, _, value = part.partition("=")
+        pairs[key.strip()] = value.strip()
+    return pairs
+
+
+def class_providers() -> Dict[str, str]:
+    """LLM_PROVIDERS spec per model class; unset classes fall back to LLM_PROVIDERS."""
+    configured = _parse_pairs(settings.LLM_CLASS_PROVIDERS)
+    return {model_class: configured.get(model_class) or settings.LLM_PROVIDERS for model_class in MODEL_CLASSES}
+
+
+def _prices() -> Dict[str, tuple]:
+    prices = {}
+    for name, value in _parse_pairs(settings.LLM_PRICES).items():
+        input_price, _, output_price = value.partition("/")
+        prices[name] = (float(input_price), float(output_price or input_price))
+    return prices
+
+
+def estimate_cost(providers, input_tokens: int, output_tokens: int) -> Optional[float]:
+    """USD from LLM_PRICES (per million tokens); None when a provider has no price.
+    Hedged duplicates aren't counted, so this is a lower bound under hedging."""
+    prices = _prices()
+    known = [prices[p.partition(":")[2]] for p in providers if p.partition(":")[2] in prices]
+    if not known or len(known) != len(providers):
+        return None
+    input_price = sum(price[0] for price in known) / len(known)
+    output_price = sum(price[1] for price in known) / len(known)
+    return round((input_tokens * input_price + output_tokens * output_price) / 1_000_000, 6)
+
+
+def decide(essay_text: str, rubric: Any, tier: Optional[str] = None) -> Decision:
+    """Pick model class, reasoning effort and output budget from the essay's
+    size, the rubric's size and the assignment's quality tier."""
+    tier = tier if tier in TIERS else settings.LLM_DEFAULT_TIER
+    essay_tokens = count_tokens(essay_text or "")
+    criteria = len(rubric_criteria(rubric)) or (len(rubric) if isinstance(rubric, dict) else 0)
+
+    if essay_tokens < SHORT_ESSAY_TOKENS:
+        size = "short"
+    elif essay_tokens < LONG_ESSAY_TOKENS:
+        size = "medium"
+    else:
+        size = "long"
+    model_class, effort = RULES[(tier, size)]
+
+    complex_rubric = criteria > COMPLEX_RUBRIC_CRITERIA
+    if complex_rubric and tier != "economy":
+        # Many criteria need more reasoning, not a bigger model
+        effort = _EFFORT_UP[effort]
+
+    # Output: a base for the overall feedback plus room per rubric criterion
+    budget = (200 if size == "short" else 400) + 60 * criteria + _EFFORT_ALLOWANCE[effort]
+    max_output_tokens = max(256, min(budget, settings.LLM_MAX_OUTPUT_TOKENS))
+    return Decision(tier, size, complex_rubric, model_class, effort, max_output_tokens, essay_tokens, criteria)
+
+
+def summarize(db: Session, since: datetime) -> List[Dict[str, Any]]:
+    """Recorded decisions grouped by policy cell, for tuning RULES and budgets."""
+    keys = (LLMDecision.tier, LLMDecision.size_class, LLMDecision.model_class, LLMDecision.reasoning_effort)
+    rows = db.query(
+        *keys,
+        func.count(),
+        func.avg(LLMDecision.latency_ms),
+        func.max(LLMDecision.latency_ms),
+        func.avg(LLMDecision.input_tokens),
+        func.avg(LLMDecision.output_tokens),
+        func.sum(LLMDecision.cost_usd),
+        func.avg(case((LLMDecision.outcome == "ok", 1.0), else_=0.0)),
+    ).filter(LLMDecision.created_at >= since).group_by(*keys).order_by(*keys).all()
+    return [
+        {
+            "tier": tier, "size": size, "model_class": model_class, "reasoning_effort": effort,
+            "count": count,
+            "avg_latency_ms": round(float(avg_latency or 0)),
+            "max_latency_ms": max_latency,
+            "avg_input_tokens": round(float(avg_input or 0)),
+            "avg_output_tokens": round(float(avg_output or 0)),
+            "total_cost_usd": round(float(cost), 4) if cost is not None else None,
+            "ok_rate": round(float(ok_rate or 0), 3),
+        }
+        for tier, size, model_class, effort, count, avg_latency, max_latency, avg_input, avg_output, cost, ok_rate in rows
+    ]
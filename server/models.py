@@ -1,8 +1,35 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, JSON, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, Float, ForeignKey, JSON, Text, LargeBinary
+from sqlalchemy import DDL, Index, event
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+from config import settings
 from database import Base
 
+# Submission tables range-partitioned by submitted_at (see partitions.py)
+PARTITIONED = settings.SUBMISSION_PARTITION_MONTHS > 0
+
+def _one_per_assignment(table: str, assignment_column: str):
+    # The database enforces one submission per student, so concurrent
+    # submits can't both pass a read-then-write check
+    if not settings.ONE_SUBMISSION_PER_ASSIGNMENT:
+        return ()
+    if PARTITIONED:
+        # Unique indexes on a partitioned table must include submitted_at
+        raise RuntimeError("ONE_SUBMISSION_PER_ASSIGNMENT can't be combined with SUBMISSION_PARTITION_MONTHS")
+    return (Index(f"uq_{table}_{assignment_column}_student", assignment_column, "student_id", unique=True),)
+
+def _partitioned():
+    # Ignored by other dialects; Postgres creates the parent table only
+    return ({"postgresql_partition_by": "RANGE (submitted_at)"},) if PARTITIONED else ()
+
+def _submission_fk(column: str):
+    # A partitioned table has no unique key on id alone to reference
+    return () if PARTITIONED else (ForeignKey(column),)
+
+def _question_count(context):
+    # Also runs for executemany inserts (bulk import), not just ORM adds
+    return len(context.get_current_parameters().get("questions") or [])
+
 class User(Base):
     __tablename__ = "users"
     
@@ -25,24 +52,38 @@ class Quiz(Base):
     teacher_id = Column(Integer, ForeignKey("users.id"))
     title = Column(String)
     questions = Column(JSON)  # List of questions with options, correct answers
+    question_count = Column(Integer, default=_question_count)  # Lets summaries skip the JSON
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Bumped on every update; keys the rendered student payload cache
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     teacher = relationship("User", back_populates="quizzes")
     submissions = relationship("QuizSubmission", back_populates="quiz")
 
+    __mapper_args__ = {"version_id_col": version}
+
 class QuizSubmission(Base):
     __tablename__ = "quiz_submissions"
+    __table_args__ = (
+        Index("ix_quiz_submissions_quiz_submitted", "quiz_id", "submitted_at"),
+        Index("ix_quiz_submissions_student_submitted", "student_id", "submitted_at"),
+        *_one_per_assignment("quiz_submissions", "quiz_id"),
+        *_partitioned(),
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     quiz_id = Column(Integer, ForeignKey("quizzes.id"))
     student_id = Column(Integer, ForeignKey("users.id"))
     answers = Column(JSON)  # Student's answers
     score = Column(Integer)  # Percentage score
-    submitted_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Part of the table's primary key when partitioned; the mapper still keys on id
+    submitted_at = Column(DateTime(timezone=True), server_default=func.now(), primary_key=PARTITIONED)
     
     quiz = relationship("Quiz", back_populates="submissions")
     student = relationship("User", back_populates="quiz_submissions")
 
+    __mapper_args__ = {"primary_key": [id]}
+
 class Essay(Base):
     __tablename__ = "essays"
     
@@ -50,6 +91,7 @@ class Essay(Base):
     teacher_id = Column(Integer, ForeignKey("users.id"))
     prompt = Column(Text)
     rubric = Column(JSON)  # Grading criteria
+    quality_tier = Column(String)  # "economy", "standard" or "premium"; NULL = LLM_DEFAULT_TIER
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     teacher = relationship("User", back_populates="essays")
@@ -57,14 +99,197 @@ class Essay(Base):
 
 class EssaySubmission(Base):
     __tablename__ = "essay_submissions"
+    __table_args__ = (
+        Index("ix_essay_submissions_essay_submitted", "essay_id", "submitted_at"),
+        Index("ix_essay_submissions_student_submitted", "student_id", "submitted_at"),
+        *_one_per_assignment("essay_submissions", "essay_id"),
+        *_partitioned(),
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     essay_id = Column(Integer, ForeignKey("essays.id"))
     student_id = Column(Integer, ForeignKey("users.id"))
     text = Column(Text)
     ai_feedback = Column(JSON)  # AI-generated feedback
     rubric_scores = Column(JSON)  # Scores based on rubric
-    submitted_at = Column(DateTime(timezone=True), server_default=func.now())
+    score = Column(Integer)  # Overall 0-100 score from ai_feedback, for SQL aggregates
+    text_metrics = Column(JSON)  # Local text statistics, computed on submit
+    word_count = Column(Integer)  # Copied from text_metrics so summaries skip the text
+    themes_applied = Column(Boolean)  # ai_feedback counted in feedback_themes; NULL = not yet looked at
+    submitted_at = Column(DateTime(timezone=True), server_default=func.now(), primary_key=PARTITIONED)
     
     essay = relationship("Essay", back_populates="submissions")
-    student = relationship("User", back_populates="essay_submissions")
\ No newline at end of file
+    student = relationship("User", back_populates="essay_submissions")
+
+    __mapper_args__ = {"primary_key": [id]}
+
+class Class(Base):
+    __tablename__ = "classes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    teacher_id = Column(Integer, ForeignKey("users.id"), index=True)
+    name = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    enrollments = relationship("Enrollment", back_populates="class_")
+
+class Enrollment(Base):
+    __tablename__ = "enrollments"
+
+    # (class_id, student_id) serves the roster; the student_id index serves "my classes"
+    class_id = Column(Integer, ForeignKey("classes.id"), primary_key=True)
+    student_id = Column(Integer, ForeignKey("users.id"), primary_key=True, index=True)
+    enrolled_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    class_ = relationship("Class", back_populates="enrollments")
+
+class QuizAssignment(Base):
+    __tablename__ = "quiz_assignments"
+
+    class_id = Column(Integer, ForeignKey("classes.id"), primary_key=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), primary_key=True, index=True)
+    assigned_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class EssayAssignment(Base):
+    __tablename__ = "essay_assignments"
+
+    class_id = Column(Integer, ForeignKey("classes.id"), primary_key=True)
+    essay_id = Column(Integer, ForeignKey("essays.id"), primary_key=True, index=True)
+    assigned_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class EssaySignature(Base):
+    __tablename__ = "essay_signatures"
+
+    submission_id = Column(Integer, *_submission_fk("essay_submissions.id"), primary_key=True)
+    essay_id = Column(Integer, ForeignKey("essays.id"), index=True)
+    signature = Column(LargeBinary)  # Packed uint32 MinHash values (see similarity.py)
+
+class EssayLSHBucket(Base):
+    __tablename__ = "essay_lsh_buckets"
+
+    # Primary key order makes (bucket) lookups an index range scan
+    bucket = Column(BigInteger, primary_key=True)
+    submission_id = Column(Integer, *_submission_fk("essay_submissions.id"), primary_key=True, index=True)
+
+class FeedbackTheme(Base):
+    __tablename__ = "feedback_themes"
+    __table_args__ = (Index("ix_feedback_themes_scope", "teacher_id", "essay_id", "kind"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    teacher_id = Column(Integer, ForeignKey("users.id"))
+    essay_id = Column(Integer, ForeignKey("essays.id"), nullable=True)  # NULL = teacher-wide
+    kind = Column(String)  # "strength", "weakness" or "suggestion"
+    label = Column(String)  # First phrasing seen
+    tokens = Column(String)  # Normalized token set, space separated
+    count = Column(Integer, default=0)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    route = Column(String)
+    request_hash = Column(String(64))
+    response_status = Column(Integer)  # NULL while the original request is running
+    response_body = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), index=True)
+
+class LLMDecision(Base):
+    __tablename__ = "llm_decisions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    submission_id = Column(Integer, index=True)  # No FK: submissions may be partitioned or archived
+    essay_id = Column(Integer, ForeignKey("essays.id"))
+    tier = Column(String)
+    size_class = Column(String)  # "short", "medium" or "long"
+    complex_rubric = Column(Boolean)
+    model_class = Column(String)  # "small", "medium" or "large"
+    provider = Column(String)  # Provider(s) that answered
+    reasoning_effort = Column(String)
+    max_output_tokens = Column(Integer)
+    essay_tokens = Column(Integer)
+    rubric_criteria = Column(Integer)
+    input_tokens = Column(Integer)  # Estimated, summed over chunks and retries
+    output_tokens = Column(Integer)
+    latency_ms = Column(Integer)
+    cost_usd = Column(Float)  # NULL when a provider has no LLM_PRICES entry
+    outcome = Column(String)  # "ok", "unparsed" or "failed"
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+class SubmissionArchive(Base):
+    __tablename__ = "submission_archives"
+    __table_args__ = (Index("ix_submission_archives_table_range", "table_name", "range_start"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String)
+    range_start = Column(DateTime(timezone=True))
+    range_end = Column(DateTime(timezone=True))
+    path = Column(String)  # zstd Parquet file under ARCHIVE_DIR
+    row_count = Column(Integer)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class SubmissionChange(Base):
+    """Outbox of submission writes, drained by the analytics sidecar (analytics_store.py)."""
+    __tablename__ = "submission_changes"
+
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String, nullable=False)  # "quiz_submissions" or "essay_submissions"
+    row_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class EssaySectionFeedback(Base):
+    """LLM feedback for one essay section, reused while the section's prompt is unchanged (see section_cache.py)."""
+    __tablename__ = "essay_section_feedback"
+
+    key = Column(String(64), primary_key=True)  # sha256 of model class + prompt messages
+    feedback = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+class SearchDocument(Base):
+    """One searchable text of a teacher's material, kept in step on write (see search.py)."""
+    __tablename__ = "search_documents"
+    __table_args__ = (
+        Index("ix_search_documents_kind_ref", "kind", "ref_id"),
+        Index("ix_search_documents_teacher_kind", "teacher_id", "kind"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # "essay", "submission" or "question"
+    ref_id = Column(Integer, nullable=False)  # Essay, submission or quiz id
+    position = Column(Integer, nullable=False, default=0)  # Question index within the quiz
+    teacher_id = Column(Integer, nullable=False)
+    parent_id = Column(Integer)  # Essay id of a submission
+    student_id = Column(Integer)
+    body = Column(Text)
+
+# The inverted index itself is dialect-specific: a generated tsvector column
+# with a GIN index on Postgres, an external-content FTS5 table on SQLite
+_SEARCH_DDL = {
+    "postgresql": [
+        f"ALTER TABLE search_documents ADD COLUMN document tsvector GENERATED ALWAYS AS "
+        f"(to_tsvector('{settings.SEARCH_LANGUAGE}', coalesce(body, ''))) STORED",
+        "CREATE INDEX ix_search_documents_document ON search_documents USING GIN (document)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE search_fts USING fts5("
+        "body, content='search_documents', content_rowid='id', tokenize='porter unicode61')",
+        "CREATE TRIGGER search_documents_ai AFTER INSERT ON search_documents BEGIN "
+        "INSERT INTO search_fts(rowid, body) VALUES (new.id, new.body); END",
+        "CREATE TRIGGER search_documents_ad AFTER DELETE ON search_documents BEGIN "
+        "INSERT INTO search_fts(search_fts, rowid, body) VALUES ('delete', old.id, old.body); END",
+        "CREATE TRIGGER search_documents_au AFTER UPDATE ON search_documents BEGIN "
+        "INSERT INTO search_fts(search_fts, rowid, body) VALUES ('delete', old.id, old.body); "
+        "INSERT INTO search_fts(rowid, body) VALUES (new.id, new.body); END",
+    ],
+}
+for _dialect, _statements in _SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(SearchDocument.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    # One row per data migration applied (see migrations.DATA_MIGRATIONS)
+    name = Column(String, primary_key=True)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,79 @@
+from datetime import date, datetime, timezone
+from typing import List, Tuple
+
+from sqlalchemy import text
+
+from config import settings
+from database import engine
+
+TABLES = ("quiz_submissions", "essay_submissions")
+
+
+def enabled() -> bool:
+    return settings.SUBMISSION_PARTITION_MONTHS > 0 and engine.dialect.name == "postgresql"
+
+
+def span_start(value: date) -> date:
+    """First day of the partition span containing `value`. Spans of N months
+    are aligned to January, so 6 gives Jan-Jun / Jul-Dec terms."""
+    months = max(settings.SUBMISSION_PARTITION_MONTHS, 1)
+    index = (value.year * 12 + value.month - 1) // months * months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def span_end(start: date) -> date:
+    index = start.year * 12 + start.month - 1 + max(settings.SUBMISSION_PARTITION_MONTHS, 1)
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def spans(start: date, end: date) -> List[Tuple[date, date]]:
+    """Partition spans covering [start, end)."""
+    result = []
+    current = span_start(start)
+    while current < end:
+        result.append((current, span_end(current)))
+        current = span_end(current)
+    return result
+
+
+def partition_name(table: str, start: date) -> str:
+    return f"{table}_p{start:%Y_%m}"
+
+
+def current_span_start() -> date:
+    return span_start(datetime.now(timezone.utc).date())
+
+
+def ensure_partitions():
+    """Create the current and next SUBMISSION_PARTITIONS_AHEAD partitions plus
+    a default partition. Idempotent; runs at warm-up in every worker."""
+    if not enabled():
+        return
+    start = current_span_start()
+    end = start
+    for _ in range(settings.SUBMISSION_PARTITIONS_AHEAD + 1):
+        end = span_end(end)
+    with engine.connect() as connection:
+        for table in TABLES:
+            _create(connection, f"{table}_default", f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+            for span_from, span_to in spans(start, end):
+                name = partition_name(table, span_from)
+                _create(connection, name, (
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{span_from.isoformat()}') TO ('{span_to.isoformat()}')"
+                ))
+        connection.commit()
+
+
+def _create(connection, name: str, ddl: str):
+    try:
+        with connection.begin_nested():
+            connection.execute(text(ddl))
+    except Exception as e:
+        # Another worker won the race, or the default partition already
+        # holds rows in this range
+        print(f"Could not create partition {name}:", e)
+
+
+def partition_exists(connection, name: str) -> bool:
+    return connection.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
@@ -0,0 +1,245 @@
+import hashlib
+import heapq
+import hmac
+import itertools
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+from config import settings
+
+# Profile of the request being served in the current context (None when off)
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+# Span labels ("db", "llm:groq", ...) active on each thread, read by the sampler
+_thread_labels: Dict[int, List[str]] = defaultdict(list)
+# Threads doing work on behalf of a profiled request (e.g. threadpool deps)
+_thread_owner: Dict[int, "RequestProfile"] = {}
+
+_lock = threading.Lock()
+_profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+_slowest: Dict[str, list] = {}
+_seq = itertools.count()
+# Requests that matched no route (404s, scanners) share one slow-log key, and
+# the number of keys is capped, so request paths can't grow the log
+UNMATCHED_ROUTE = "<unmatched>"
+MAX_SLOWEST_ROUTES = 256
+
+
+class RequestProfile:
+    """Timing and (optionally) sampled stacks for a single request."""
+
+    def __init__(self, method: str, path: str, sample: bool = False):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.route = path
+        self.status_code = None
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+        self.span_ms: Dict[str, float] = defaultdict(float)
+        self.span_count: Dict[str, int] = defaultdict(int)
+        self.stacks: Counter = Counter()
+        self.sampled = sample
+        self._thread_id = threading.get_ident()
+        self._start = time.perf_counter()
+        self._stop = threading.Event()
+        self._sampler = None
+
+        if sample:
+            self._sampler = threading.Thread(
+                target=self._sample_loop,
+                args=(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000.0,),
+                daemon=True,
+            )
+            self._sampler.start()
+
+    def _sample_loop(self, interval: float):
+        # Samples the thread that started the request plus any thread that
+        # entered a span for it. The event loop thread is shared, so stacks
+        # of concurrent requests can show up too; profile on a quiet worker.
+        while not self._stop.wait(interval):
+            for tid, frame in sys._current_frames().items():
+                if tid != self._thread_id and _thread_owner.get(tid) is not self:
+                    continue
+                self.stacks[_fold(frame, _thread_labels.get(tid))] += 1
+
+    def finish(self, status_code: int, route: Optional[str] = None):
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        self.status_code = status_code
+        if route:
+            self.route = route
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 2),
+            "spans": {
+                label: {"count": self.span_count[label], "total_ms": round(ms, 2)}
+                for label, ms in self.span_ms.items()
+            },
+            "sampled": self.sampled,
+            "samples": sum(self.stacks.values()),
+        }
+
+    def folded(self) -> str:
+        """Collapsed stacks ("frame;frame;frame count"), the input format of
+        flamegraph.pl, speedscope and inferno."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+def _fold(frame, labels: Optional[List[str]]) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+        frame = frame.f_back
+    names.reverse()
+    if labels:
+        names.extend(f"[{label}]" for label in labels)
+    return ";".join(names)
+
+
+# Spans
+def _push(label: str) -> float:
+    tid = threading.get_ident()
+    _thread_labels[tid].append(label)
+    profile = _current.get()
+    if profile is not None and tid != profile._thread_id:
+        _thread_owner[tid] = profile
+    return time.perf_counter()
+
+
+def _pop(label: str, started: float):
+    tid = threading.get_ident()
+    labels = _thread_labels.get(tid)
+    if labels:
+        labels.pop()
+        if not labels:
+            _thread_labels.pop(tid, None)
+            _thread_owner.pop(tid, None)
+    profile = _current.get()
+    if profile is not None:
+        profile.span_ms[label] += (time.perf_counter() - started) * 1000
+        profile.span_count[label] += 1
+
+
+@contextmanager
+def span(label: str):
+    """Label a block of work (e.g. an LLM call) in the current request's profile."""
+    if _current.get() is None:
+        yield
+        return
+    started = _push(label)
+    try:
+        yield
+    finally:
+        _pop(label, started)
+
+
+def instrument_engine(engine):
+    """Record every cursor execution on `engine` as a "db" span."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("profile_spans", []).append(_push("db"))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("profile_spans")
+        if spans:
+            _pop("db", spans.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("profile_spans") if conn is not None else None
+        if spans:
+            _pop("db", spans.pop())
+
+
+# Request lifecycle
+def slow_sampling_enabled() -> bool:
+    return settings.PROFILE_SLOWEST_PER_ROUTE > 0
+
+
+def start(method: str, path: str, sample: bool = False) -> RequestProfile:
+    profile = RequestProfile(method, path, sample=sample)
+    _current.set(profile)
+    return profile
+
+
+def finish(profile: RequestProfile, status_code: int, route: Optional[str] = None):
+    profile.finish(status_code, route)
+    _current.set(None)
+
+    with _lock:
+        if profile.sampled:
+            _profiles[profile.id] = profile
+            while len(_profiles) > settings.PROFILE_STORE_SIZE:
+                _profiles.popitem(last=False)
+
+        limit = settings.PROFILE_SLOWEST_PER_ROUTE
+        if limit > 0:
+            # Min-heap per route keeps the slowest `limit` requests seen
+            key = f"{profile.method} {route}" if route else UNMATCHED_ROUTE
+            heap = _slowest.get(key)
+            if heap is None:
+                if len(_slowest) >= MAX_SLOWEST_ROUTES:
+                    return
+                heap = _slowest[key] = []
+            entry = (profile.duration_ms, next(_seq), profile.summary())
+            if len(heap) < limit:
+                heapq.heappush(heap, entry)
+            elif entry[0] > heap[0][0]:
+                heapq.heapreplace(heap, entry)
+
+
+def get_profile(profile_id: str) -> Optional[RequestProfile]:
+    with _lock:
+        return _profiles.get(profile_id)
+
+
+def list_profiles() -> List[dict]:
+    with _lock:
+        return [profile.summary() for profile in reversed(_profiles.values())]
+
+
+def slowest_requests() -> Dict[str, List[dict]]:
+    with _lock:
+        return {
+            route: [summary for _, _, summary in sorted(heap, reverse=True)]
+            for route, heap in _slowest.items()
+        }
+
+
+# Signed profiling header: "X-Profile-Signature: <expires>:<hmac>"
+def sign(method: str, path: str, expires: int) -> str:
+    message = f"{expires}:{method.upper()}:{path}".encode()
+    digest = hmac.new(settings.PROFILING_SECRET.encode(), message, hashlib.sha256).hexdigest()
+    return f"{expires}:{digest}"
+
+
+def verify_signature(method: str, path: str, signature: Optional[str]) -> bool:
+    if not settings.PROFILING_SECRET or not signature or ":" not in signature:
+        return False
+    expires, _ = signature.split(":", 1)
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(sign(method, path, int(expires)), signature)
@@ -0,0 +1,278 @@
+import hashlib
+import json
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from config import settings
+
+SYSTEM_PROMPT = "You are an experienced English teacher providing detailed essay feedback."
+
+FEEDBACK_INSTRUCTIONS = """Provide feedback in JSON format with:
+- grammar_score (0-100)
+- clarity_score (0-100)
+- keyword_usage_score (0-100)
+- overall_feedback (string)
+- strengths (list of strings)
+- weaknesses (list of strings)
+- suggestions (list of strings)
+- rubric_scores (object with a score for each rubric criterion, within its range)"""
+
+CHUNK_NOTE = "The essay is long and is graded in parts. Grade only the part you are given, as a part of a longer essay."
+
+SCORE_FIELDS = ("grammar_score", "clarity_score", "keyword_usage_score")
+LIST_FIELDS = ("strengths", "weaknesses", "suggestions")
+MAX_LIST_ITEMS = 5
+DEFAULT_CRITERION_MAX = 100
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_CONTROL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_tokens(text: str) -> int:
+    """Estimate BPE tokens: words and punctuation, plus a margin for long words."""
+    pieces = _TOKEN_RE.findall(text)
+    return sum(1 + len(piece) // 8 for piece in pieces)
+
+
+def normalize_essay(text: str) -> str:
+    """Canonical essay text: NFC, no control chars, single spaces, at most one
+    blank line between paragraphs."""
+    text = unicodedata.normalize("NFC", text or "")
+    text = _CONTROL_RE.sub("", text).replace("\r\n", "\n").replace("\r", "\n")
+    paragraphs = [" ".join(p.split()) for p in re.split(r"\n\s*\n", text)]
+    return "\n\n".join(p for p in paragraphs if p)
+
+
+@lru_cache(maxsize=1024)
+def _render_rubric(rubric_json: str) -> str:
+    rubric = json.loads(rubric_json)
+    if not isinstance(rubric, dict):
+        return str(rubric)
+    lines = []
+    for criterion, detail in rubric.items():
+        if isinstance(detail, dict):
+            parts = [f"{key}: {value}" for key, value in detail.items()]
+            lines.append(f"- {criterion} ({'; '.join(parts)})")
+        else:
+            lines.append(f"- {criterion}: {detail}")
+    return "\n".join(lines)
+
+
+def render_rubric(rubric: Any) -> str:
+    """Compact, deterministic rubric text (sorted keys) so the prompt prefix is
+    byte-identical for every submission to the same essay."""
+    return _render_rubric(json.dumps(rubric or {}, sort_keys=True, default=str))
+
+
+def rubric_criteria(rubric: Any) -> Dict[str, int]:
+    """Max score per rubric criterion. Accepts {"clarity": "0-5"},
+    {"clarity": 5} and {"clarity": {"max_score": 5, ...}}."""
+    if not isinstance(rubric, dict):
+        return {}
+    criteria = {}
+    for criterion, detail in rubric.items():
+        if isinstance(detail, dict):
+            detail = detail.get("max_score", detail.get("max", DEFAULT_CRITERION_MAX))
+        numbers = re.findall(r"\d+", str(detail))
+        criteria[str(criterion)] = int(numbers[-1]) if numbers else DEFAULT_CRITERION_MAX
+    return criteria
+
+
+def feedback_json_schema(rubric: Any) -> Dict[str, Any]:
+    """JSON schema for the feedback object, with one bounded property per
+    rubric criterion under rubric_scores."""
+    score = {"type": "integer", "minimum": 0, "maximum": 100}
+    string_list = {"type": "array", "items": {"type": "string"}}
+    criteria = rubric_criteria(rubric)
+    return {
+        "type": "object",
+        "properties": {
+            **{field: score for field in SCORE_FIELDS},
+            "overall_feedback": {"type": "string"},
+            **{field: string_list for field in LIST_FIELDS},
+            "rubric_scores": {
+                "type": "object",
+                "properties": {
+                    name: {"type": "integer", "minimum": 0, "maximum": max_score}
+                    for name, max_score in criteria.items()
+                },
+                "required": list(criteria),
+                "additionalProperties": False,
+            },
+        },
+        "required": [*SCORE_FIELDS, "overall_feedback", *LIST_FIELDS, "rubric_scores"],
+        "additionalProperties": False,
+    }
+
+
+def build_system_prompt(rubric: Any) -> str:
+    # Everything stable goes first so providers can reuse the cached prefix;
+    # the essay text is always the last (user) message.
+    return f"{SYSTEM_PROMPT}\n\nRubric:\n{render_rubric(rubric)}\n\n{FEEDBACK_INSTRUCTIONS}"
+
+
+def _split_long_paragraph(paragraph: str, max_tokens: int) -> List[str]:
+    pieces, current, current_tokens = [], [], 0
+    for sentence in _SENTENCE_RE.split(paragraph):
+        tokens = count_tokens(sentence)
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_essay(text: str, max_tokens: int) -> List[str]:
+    """Pack paragraphs into chunks of at most ~max_tokens; paragraphs that are
+    too long on their own are split at sentence boundaries."""
+    chunks, current, current_tokens = [], [], 0
+    for paragraph in text.split("\n\n"):
+        tokens = count_tokens(paragraph)
+        pieces = [paragraph] if tokens <= max_tokens else _split_long_paragraph(paragraph, max_tokens)
+        for piece in pieces:
+            piece_tokens = count_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks or [""]
+
+
+def _section_boundary(paragraph: str) -> bool:
+    # Stable across processes, unlike hash()
+    return hashlib.blake2b(paragraph.encode(), digest_size=1).digest()[0] % 2 == 0
+
+
+def section_essay(text: str, target_tokens: int) -> List[str]:
+    """Split into sections of whole paragraphs for incremental grading. A
+    section may end after any paragraph once it holds half the target (the
+    paragraph's hash decides) and ends once it reaches the target. Each
+    boundary depends only on the text since the previous one, so after an
+    edit the boundaries fall back into step and later sections are unchanged."""
+    sections, current, current_tokens = [], [], 0
+    for paragraph in text.split("\n\n"):
+        tokens = count_tokens(paragraph)
+        pieces = [paragraph] if tokens <= target_tokens else _split_long_paragraph(paragraph, target_tokens)
+        for piece in pieces:
+            current.append(piece)
+            current_tokens += count_tokens(piece)
+            if current_tokens >= target_tokens or (current_tokens >= target_tokens // 2 and _section_boundary(piece)):
+                sections.append("\n\n".join(current))
+                current, current_tokens = [], 0
+    if current:
+        sections.append("\n\n".join(current))
+    return sections or [""]
+
+
+class EssayPrompt:
+    """Messages for grading one essay, split into chunks if it doesn't fit, or
+    into sections (see section_essay) when section_tokens is given and the
+    essay is longer than that."""
+
+    def __init__(self, essay_text: str, rubric: Any, notes: str = "", max_output_tokens: Optional[int] = None,
+                 section_tokens: Optional[int] = None):
+        self.rubric = rubric
+        self.notes = notes
+        self.system = build_system_prompt(rubric)
+        self.schema = feedback_json_schema(rubric)
+        self.text = normalize_essay(essay_text)
+        self.prefix_tokens = count_tokens(self.system) + count_tokens(notes)
+        self.essay_tokens = count_tokens(self.text)
+        self.max_output_tokens = max_output_tokens or settings.LLM_MAX_OUTPUT_TOKENS
+
+        chunk_tokens = max(256, settings.LLM_MAX_INPUT_TOKENS - self.prefix_tokens)
+        sectioned = bool(section_tokens) and self.essay_tokens > section_tokens
+        if sectioned:
+            # Sections reach at most twice the target, so they never need chunking again
+            chunks = section_essay(self.text, min(section_tokens, chunk_tokens // 2))
+        elif self.essay_tokens > chunk_tokens:
+            chunks = chunk_essay(self.text, chunk_tokens)
+        else:
+            chunks = [self.text]
+        self.sectioned = sectioned and len(chunks) > 1
+
+        # Enforce the per-request budget: every chunk pays prefix + output again
+        per_call = self.prefix_tokens + self.max_output_tokens
+        self.truncated = False
+        spent = 0
+        for i, chunk in enumerate(chunks):
+            spent += per_call + count_tokens(chunk)
+            if spent > settings.LLM_REQUEST_TOKEN_BUDGET and i > 0:
+                chunks = chunks[:i]
+                self.truncated = True
+                break
+        self.chunks = chunks
+
+    @property
+    def chunked(self) -> bool:
+        return len(self.chunks) > 1
+
+    def messages(self, index: int = 0) -> List[Dict[str, str]]:
+        chunk = self.chunks[index]
+        if self.sectioned:
+            # No part number or whole-essay notes: a section's prompt depends
+            # only on its text, so unchanged sections are found in the cache
+            return [
+                {"role": "system", "content": self.system},
+                {"role": "user", "content": f"{CHUNK_NOTE}\n\n{chunk}"},
+            ]
+        if self.chunked:
+            content = f"{CHUNK_NOTE}\nPart {index + 1} of {len(self.chunks)}:\n\n{chunk}"
+        else:
+            content = f"Essay:\n\n{chunk}"
+        if self.notes:
+            content = f"{self.notes}\n\n{content}"
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": content},
+        ]
+
+
+def merge_chunk_feedback(results: List[Dict[str, Any]], weights: List[int]) -> Dict[str, Any]:
+    """Reduce per-chunk feedback into one result: scores are averaged by chunk
+    size, list fields are de-duplicated in order and capped."""
+    usable = [(r, w) for r, w in zip(results, weights) if "error" not in r]
+    if not usable:
+        return results[0] if results else {}
+
+    merged: Dict[str, Any] = {}
+    for field in SCORE_FIELDS:
+        scored = [(r[field], w) for r, w in usable if isinstance(r.get(field), (int, float))]
+        if scored:
+            total_weight = sum(w for _, w in scored) or 1
+            merged[field] = round(sum(score * w for score, w in scored) / total_weight)
+
+    for field in LIST_FIELDS:
+        seen, items = set(), []
+        for r, _ in usable:
+            for item in r.get(field) or []:
+                key = str(item).strip().lower()
+                if key and key not in seen:
+                    seen.add(key)
+                    items.append(item)
+        merged[field] = items[:MAX_LIST_ITEMS]
+
+    rubric_scores: Dict[str, List] = {}
+    for r, w in usable:
+        for name, value in (r.get("rubric_scores") or {}).items():
+            if isinstance(value, (int, float)):
+                rubric_scores.setdefault(name, []).append((value, w))
+    if rubric_scores:
+        merged["rubric_scores"] = {
+            name: round(sum(v * w for v, w in scored) / (sum(w for _, w in scored) or 1))
+            for name, scored in rubric_scores.items()
+        }
+
+    merged["overall_feedback"] = " ".join(
+        str(r["overall_feedback"]) for r, _ in usable if r.get("overall_feedback")
+    )
+    return merged
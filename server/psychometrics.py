@@ -0,0 +1,328 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Quiz, QuizSubmission
+
+# Items outside this p-value band are flagged as too hard / too easy
+HARD_ITEM_P = 0.2
+EASY_ITEM_P = 0.95
+# Corrected point-biserial below this: the item barely separates strong and weak students
+LOW_DISCRIMINATION = 0.2
+# Statistics from fewer responses are reported but never flagged
+MIN_RESPONSES = 10
+# Topics answered correctly less often than this are problem areas
+WEAK_TOPIC_P = 0.6
+# A student struggles with a topic below this share of correct answers
+STRUGGLING_P = 0.5
+# Topic trend compares responses from the last TREND_DAYS with older ones
+TREND_DAYS = 28
+TREND_MARGIN = 0.02
+
+
+class ItemBank:
+    """One teacher's quiz items and the latest response per (student, quiz).
+    Kept per worker and extended with new submissions; rebuilt when a quiz
+    changes or submissions disappear."""
+
+    def __init__(self, quizzes: List[Tuple[int, str, int, List[Dict[str, Any]]]]):
+        self.signature = tuple((quiz_id, version) for quiz_id, _, version, _ in quizzes)
+        self.quizzes: Dict[int, Dict[str, Any]] = {}
+        self.items: List[Dict[str, Any]] = []
+        keys = []
+        for quiz_id, title, _, questions in quizzes:
+            self.quizzes[quiz_id] = {"title": title, "start": len(self.items), "count": len(questions or [])}
+            for index, question in enumerate(questions or []):
+                self.items.append({
+                    "quiz_id": quiz_id,
+                    "question_index": index,
+                    "question_text": question.get("question_text", ""),
+                    # Questions without a topic are grouped under their quiz
+                    "topic": question.get("topic") or title,
+                })
+                keys.append(question.get("correct_answer"))
+        self.keys = keys
+        # (student_id, quiz_id) -> (submission id, submitted_at, correct per question)
+        self.responses: Dict[Tuple[int, int], Tuple[int, Optional[datetime], np.ndarray]] = {}
+        self.max_id = 0
+        self.count = 0
+        self.result: Optional[Dict[str, Any]] = None
+        self.computed_at = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, rows):
+        for submission_id, student_id, quiz_id, answers, submitted_at in rows:
+            self.count += 1
+            self.max_id = max(self.max_id, submission_id)
+            quiz = self.quizzes.get(quiz_id)
+            if quiz is None:
+                continue
+            current = self.responses.get((student_id, quiz_id))
+            if current is not None and current[0] > submission_id:
+                continue
+            # Same rule as crud.score_answers: unanswered questions are wrong
+            answers = answers or {}
+            keys = self.keys[quiz["start"]:quiz["start"] + quiz["count"]]
+            correct = np.fromiter((answers.get(str(i)) == key for i, key in enumerate(keys)), dtype=bool, count=len(keys))
+            self.responses[(student_id, quiz_id)] = (submission_id, submitted_at, correct)
+
+    def matrices(self):
+        """Sparse student x item matrices: `answered` has a 1 for every item of
+        every submitted quiz, `correct` for every correct answer."""
+        students = sorted({student_id for student_id, _ in self.responses})
+        row_of = {student_id: row for row, student_id in enumerate(students)}
+        cutoff = datetime.now(timezone.utc) - timedelta(days=TREND_DAYS)
+        shape = (len(students), len(self.items))
+        keys = list(self.responses)
+        if not keys:
+            empty = sparse.csr_matrix(shape)
+            return students, empty, empty, np.array([], int), np.array([], bool), np.array([], bool)
+
+        # One entry per response here; expanded to one per answered item below
+        response_rows = np.fromiter((row_of[student_id] for student_id, _ in keys), dtype=int, count=len(keys))
+        starts = np.fromiter((self.quizzes[quiz_id]["start"] for _, quiz_id in keys), dtype=int, count=len(keys))
+        counts = np.fromiter((self.quizzes[quiz_id]["count"] for _, quiz_id in keys), dtype=int, count=len(keys))
+        response_recent = np.fromiter(
+            (submitted_at is not None and _utc(submitted_at) >= cutoff for _, submitted_at, _ in self.responses.values()),
+            dtype=bool, count=len(keys)
+        )
+        hits = np.concatenate([correct for _, _, correct in self.responses.values()])
+        offsets = np.cumsum(counts) - counts
+        rows = np.repeat(response_rows, counts)
+        cols = np.repeat(starts - offsets, counts) + np.arange(len(hits))
+        recent = np.repeat(response_recent, counts)
+        answered = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=shape)
+        correct = sparse.csr_matrix((hits.astype(float), (rows, cols)), shape=shape)
+        correct.eliminate_zeros()
+        return students, answered, correct, cols, hits, recent
+
+
+def _utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _round(value: float, digits: int = 3) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def _quiz_statistics(x: np.ndarray) -> Tuple[np.ndarray, Optional[float]]:
+    """Corrected point-biserial per item (item vs. rest-of-quiz score) and
+    Cronbach's alpha for one quiz; `x` is submissions x items, 1 = correct."""
+    n, count = x.shape
+    discrimination = np.full(count, np.nan)
+    if n < 2 or count == 0:
+        return discrimination, None
+
+    total = x.sum(axis=1)
+    rest = total[:, None] - x
+    xc = x - x.mean(axis=0)
+    rc = rest - rest.mean(axis=0)
+    denominator = np.sqrt((xc ** 2).sum(axis=0) * (rc ** 2).sum(axis=0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        discrimination = np.where(denominator > 0, (xc * rc).sum(axis=0) / denominator, np.nan)
+
+    alpha = None
+    total_variance = total.var(ddof=1)
+    if count > 1 and total_variance > 0:
+        alpha = count / (count - 1) * (1 - x.var(axis=0, ddof=1).sum() / total_variance)
+    return discrimination, alpha
+
+
+def _flags(responses: int, p_value: float, discrimination: float) -> List[str]:
+    if responses < MIN_RESPONSES:
+        return []
+    flags = []
+    if p_value < HARD_ITEM_P:
+        flags.append("too_hard")
+    elif p_value > EASY_ITEM_P:
+        flags.append("too_easy")
+    if not np.isnan(discrimination):
+        if discrimination < 0:
+            # Strong students get it wrong more often: usually a wrong answer key
+            flags.append("negative_discrimination")
+        elif discrimination < LOW_DISCRIMINATION:
+            flags.append("low_discrimination")
+    return flags
+
+
+def compute(bank: ItemBank) -> Dict[str, Any]:
+    """Item, quiz and topic statistics for everything in the bank."""
+    students, answered, correct, cols, hits, recent = bank.matrices()
+    responses = np.asarray(answered.sum(axis=0)).ravel()
+    correct_counts = np.asarray(correct.sum(axis=0)).ravel()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p_values = correct_counts / responses
+
+    # Every submission answers its whole quiz, so per-quiz blocks are dense
+    blocks: Dict[int, List[np.ndarray]] = {quiz_id: [] for quiz_id in bank.quizzes}
+    for (_, quiz_id), (_, _, hits_row) in bank.responses.items():
+        blocks[quiz_id].append(hits_row)
+
+    discrimination = np.full(len(bank.items), np.nan)
+    quizzes = []
+    for quiz_id, quiz in bank.quizzes.items():
+        start, count = quiz["start"], quiz["count"]
+        x = np.vstack(blocks[quiz_id]).astype(float) if blocks[quiz_id] else np.zeros((0, count))
+        item_discrimination, alpha = _quiz_statistics(x)
+        discrimination[start:start + count] = item_discrimination
+        quizzes.append({
+            "quiz_id": quiz_id,
+            "title": quiz["title"],
+            "items": count,
+            "responses": len(blocks[quiz_id]),
+            "alpha": _round(alpha),
+        })
+
+    items = []
+    for i, item in enumerate(bank.items):
+        items.append({
+            **item,
+            "responses": int(responses[i]),
+            "p_value": _round(p_values[i]),
+            "discrimination": _round(discrimination[i]),
+            "flags": _flags(int(responses[i]), p_values[i], discrimination[i]),
+        })
+
+    # Topics: an item x topic indicator turns item counts into per-student topic counts
+    topics = sorted({item["topic"] for item in bank.items})
+    topic_of = np.array([topics.index(item["topic"]) for item in bank.items], dtype=int)
+    indicator = sparse.csr_matrix(
+        (np.ones(len(bank.items)), (np.arange(len(bank.items)), topic_of)), shape=(len(bank.items), len(topics))
+    )
+    student_answered = (answered @ indicator).toarray()
+    student_correct = (correct @ indicator).toarray()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        student_share = student_correct / student_answered
+    struggling = ((student_answered > 0) & (student_share < STRUGGLING_P)).sum(axis=0)
+
+    # Trend: share correct in recent vs. older responses, per topic
+    entry_topic = topic_of[cols] if len(cols) else cols
+    recent_total = np.bincount(entry_topic[recent], minlength=len(topics))
+    recent_correct = np.bincount(entry_topic[recent & hits], minlength=len(topics))
+    older_total = np.bincount(entry_topic[~recent], minlength=len(topics))
+    older_correct = np.bincount(entry_topic[~recent & hits], minlength=len(topics))
+
+    topic_rows = []
+    for t, topic in enumerate(topics):
+        topic_responses = int(student_answered[:, t].sum()) if len(students) else 0
+        p_value = student_correct[:, t].sum() / topic_responses if topic_responses else np.nan
+        trend = "flat"
+        if recent_total[t] and older_total[t]:
+            change = recent_correct[t] / recent_total[t] - older_correct[t] / older_total[t]
+            trend = "up" if change > TREND_MARGIN else "down" if change < -TREND_MARGIN else "flat"
+        topic_rows.append({
+            "topic": topic,
+            "responses": topic_responses,
+            "p_value": _round(p_value),
+            "students_struggling": int(struggling[t]) if len(students) else 0,
+            "trend": trend,
+            "weak": bool(topic_responses >= MIN_RESPONSES and p_value < WEAK_TOPIC_P),
+        })
+
+    return {
+        "computed_at": datetime.now(timezone.utc),
+        "students": len(students),
+        "submissions": len(bank.responses),
+        "quizzes": quizzes,
+        "items": items,
+        "topics": topic_rows,
+    }
+
+
+_lock = threading.Lock()
+_banks: "OrderedDict[int, ItemBank]" = OrderedDict()
+
+
+def _submission_rows(db: Session, teacher_id: int, after_id: int = 0):
+    return db.query(
+        QuizSubmission.id, QuizSubmission.student_id, QuizSubmission.quiz_id,
+        QuizSubmission.answers, QuizSubmission.submitted_at
+    ).join(Quiz, Quiz.id == QuizSubmission.quiz_id).filter(
+        Quiz.teacher_id == teacher_id, QuizSubmission.id > after_id
+    ).order_by(QuizSubmission.id).yield_per(1000)
+
+
+def _build(db: Session, teacher_id: int, rows) -> ItemBank:
+    quizzes = db.query(Quiz.id, Quiz.title, Quiz.version, Quiz.questions).filter(
+        Quiz.teacher_id == teacher_id
+    ).order_by(Quiz.id).all()
+    bank = ItemBank(quizzes)
+    bank.add(rows(0))
+    return bank
+
+
+def analyze(db: Session, teacher_id: int, store=None) -> Dict[str, Any]:
+    """Cached item analysis for one teacher. Each call reads only the quiz
+    versions and the submission count/max id; new submissions are folded
+    into the cached bank, at most once per PSYCHOMETRICS_MIN_INTERVAL_SECONDS.
+    With an analytics_store snapshot, submissions are read from it instead."""
+    signature = tuple(
+        (quiz_id, version)
+        for quiz_id, version in db.query(Quiz.id, Quiz.version).filter(Quiz.teacher_id == teacher_id).order_by(Quiz.id)
+    )
+    if store is not None:
+        count, max_id = store.submission_stats(teacher_id)
+        rows = lambda after_id: store.quiz_answers(teacher_id, after_id)
+    else:
+        count, max_id = db.query(func.count(QuizSubmission.id), func.max(QuizSubmission.id)).join(
+            Quiz, Quiz.id == QuizSubmission.quiz_id
+        ).filter(Quiz.teacher_id == teacher_id).one()
+        max_id = max_id or 0
+        rows = lambda after_id: _submission_rows(db, teacher_id, after_id)
+
+    with _lock:
+        bank = _banks.get(teacher_id)
+        if bank is not None:
+            _banks.move_to_end(teacher_id)
+
+    if bank is not None and bank.signature == signature and bank.result is not None:
+        if (bank.count, bank.max_id) == (count, max_id):
+            return bank.result
+        if time.monotonic() - bank.computed_at < settings.PSYCHOMETRICS_MIN_INTERVAL_SECONDS:
+            # Slightly stale is fine for analytics; keeps bursts of submissions cheap
+            return bank.result
+
+    if bank is None or bank.signature != signature or count < bank.count:
+        # New or edited quizzes, or deleted/archived submissions: start over
+        bank = _build(db, teacher_id, rows)
+    else:
+        with bank.lock:
+            bank.add(rows(bank.max_id))
+            if bank.count != count:
+                bank = _build(db, teacher_id, rows)
+
+    with bank.lock:
+        bank.result = compute(bank)
+        bank.computed_at = time.monotonic()
+    with _lock:
+        _banks[teacher_id] = bank
+        _banks.move_to_end(teacher_id)
+        while len(_banks) > settings.PSYCHOMETRICS_CACHE_TEACHERS:
+            _banks.popitem(last=False)
+    return bank.result
+
+
+def subject_performance(analysis: Dict[str, Any], limit: int = 8) -> List[Dict[str, Any]]:
+    """Most-answered topics with their average share correct, for the overview."""
+    topics = sorted((t for t in analysis["topics"] if t["responses"]), key=lambda t: -t["responses"])[:limit]
+    return [
+        {"subject": t["topic"], "average": round(t["p_value"] * 100), "trend": t["trend"]}
+        for t in topics
+    ]
+
+
+def problem_areas(analysis: Dict[str, Any], limit: int = 5) -> List[Dict[str, Any]]:
+    """Weak topics, worst first."""
+    weak = sorted((t for t in analysis["topics"] if t["weak"]), key=lambda t: t["p_value"])[:limit]
+    return [
+        {"topic": t["topic"], "failRate": round((1 - t["p_value"]) * 100), "students": t["students_struggling"]}
+        for t in weak
+    ]
@@ -0,0 +1,97 @@
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Quiz
+
+# Keys that give the answer away; never sent to students
+ANSWER_KEYS = ("correct_answer", "explanation")
+# Below this a gzip body isn't worth the header
+MIN_COMPRESS_BYTES = 1024
+
+
+class RenderedQuiz:
+    """One quiz version's student payload, serialized once."""
+
+    def __init__(self, version: int, body: bytes):
+        self.version = version
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6) if len(body) >= MIN_COMPRESS_BYTES else None
+        self.etag = f'W/"quiz-{version}-{len(body)}"'
+
+
+_lock = threading.Lock()
+_rendered: "OrderedDict[int, RenderedQuiz]" = OrderedDict()
+
+
+def strip_answers(questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {key: value for key, value in question.items() if key not in ANSWER_KEYS}
+        for question in questions or []
+    ]
+
+
+def student_view(quiz: Quiz) -> Dict[str, Any]:
+    return {
+        "id": quiz.id,
+        "teacher_id": quiz.teacher_id,
+        "title": quiz.title,
+        "questions": strip_answers(quiz.questions),
+        "created_at": quiz.created_at,
+    }
+
+
+def _render(quiz: Quiz) -> RenderedQuiz:
+    body = json.dumps(jsonable_encoder(student_view(quiz)), separators=(",", ":")).encode()
+    return RenderedQuiz(quiz.version, body)
+
+
+def get_rendered(db: Session, quiz_id: int) -> Tuple[Optional[int], Optional[RenderedQuiz]]:
+    """(teacher_id, payload) for a quiz, or (None, None) if it doesn't exist.
+    Only the (teacher_id, version) pair is read per request; the questions
+    are loaded and rendered once per version."""
+    row = db.query(Quiz.teacher_id, Quiz.version).filter(Quiz.id == quiz_id).first()
+    if row is None:
+        invalidate(quiz_id)
+        return None, None
+    teacher_id, version = row
+
+    with _lock:
+        rendered = _rendered.get(quiz_id)
+        if rendered is not None and rendered.version == version:
+            _rendered.move_to_end(quiz_id)
+            return teacher_id, rendered
+
+    quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+    if quiz is None:
+        return None, None
+    rendered = _render(quiz)
+    with _lock:
+        _rendered[quiz_id] = rendered
+        _rendered.move_to_end(quiz_id)
+        while len(_rendered) > settings.QUIZ_CACHE_SIZE:
+            _rendered.popitem(last=False)
+    return teacher_id, rendered
+
+
+def invalidate(quiz_id: int):
+    with _lock:
+        _rendered.pop(quiz_id, None)
+
+
+def response(request: Request, rendered: RenderedQuiz) -> Response:
+    headers = {"ETag": rendered.etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == rendered.etag:
+        return Response(status_code=304, headers=headers)
+    if rendered.gzipped is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=rendered.gzipped, media_type="application/json", headers=headers)
+    return Response(content=rendered.body, media_type="application/json", headers=headers)
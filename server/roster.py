@@ -0,0 +1,112 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, literal, union_all
+from sqlalchemy.orm import Session
+
+from models import Essay, EssaySubmission, Quiz, QuizSubmission, User
+
+AT_RISK_THRESHOLD = 70
+STRENGTH_THRESHOLD = 80
+WEAKNESS_THRESHOLD = 60
+# Essays still waiting for AI feedback count at this score
+UNSCORED_ESSAY_SCORE = 70
+
+SORT_FIELDS = ("overall_score", "student_name", "quiz_count", "essay_count")
+
+
+def _labels(quiz_average: Optional[float], essay_average: Optional[float]) -> Tuple[List[str], List[str]]:
+    strengths, weaknesses = [], []
+    for average, label in ((quiz_average, "Quiz Performance"), (essay_average, "Writing Skills")):
+        if average is None:
+            continue
+        if average > STRENGTH_THRESHOLD:
+            strengths.append(label)
+        elif average < WEAKNESS_THRESHOLD:
+            weaknesses.append(label)
+    return strengths, weaknesses
+
+
+def student_row(student_id: int, name: str, overall_score: float, quiz_avg: Optional[float],
+                essay_avg: Optional[float], quizzes: int, essays: int) -> Dict[str, Any]:
+    strengths, weaknesses = _labels(quiz_avg, essay_avg)
+    return {
+        "student_id": student_id,
+        "student_name": name,
+        "overall_score": round(float(overall_score), 1),
+        "quiz_count": quizzes,
+        "essay_count": essays,
+        "strengths": strengths,
+        "weaknesses": weaknesses,
+    }
+
+
+def student_analytics(
+    db: Session,
+    teacher_id: int,
+    sort: str = "overall_score",
+    descending: bool = True,
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    at_risk: Optional[int] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """Per-student scores for one teacher's assignments, aggregated, filtered,
+    sorted and paged in the database. `at_risk=k` returns the k lowest
+    students under AT_RISK_THRESHOLD. Returns (rows, total before paging)."""
+    quiz_scores = db.query(
+        QuizSubmission.student_id.label("student_id"),
+        QuizSubmission.score.label("score"),
+        literal(1).label("is_quiz")
+    ).join(Quiz, Quiz.id == QuizSubmission.quiz_id).filter(Quiz.teacher_id == teacher_id)
+    essay_scores = db.query(
+        EssaySubmission.student_id.label("student_id"),
+        func.coalesce(EssaySubmission.score, UNSCORED_ESSAY_SCORE).label("score"),
+        literal(0).label("is_quiz")
+    ).join(Essay, Essay.id == EssaySubmission.essay_id).filter(Essay.teacher_id == teacher_id)
+    scores = union_all(quiz_scores.statement, essay_scores.statement).subquery()
+
+    is_quiz = scores.c.is_quiz == 1
+    quiz_average = func.avg(case((is_quiz, scores.c.score)))
+    essay_average = func.avg(case((~is_quiz, scores.c.score)))
+    quiz_count = func.count(case((is_quiz, 1)))
+    essay_count = func.count(case((~is_quiz, 1)))
+    overall = func.coalesce(func.avg(scores.c.score), 0)
+
+    # count() OVER () gives the pre-paging total in the same round trip
+    query = db.query(
+        User.id, User.name, overall.label("overall_score"), quiz_average, essay_average,
+        quiz_count.label("quiz_count"), essay_count.label("essay_count"), func.count().over()
+    ).join(scores, scores.c.student_id == User.id).group_by(User.id, User.name)
+
+    if min_score is not None:
+        query = query.having(overall >= min_score)
+    if max_score is not None:
+        query = query.having(overall <= max_score)
+
+    if at_risk is not None:
+        query = query.having(overall < AT_RISK_THRESHOLD).order_by(overall.asc(), User.id)
+        limit, offset = at_risk, 0
+    else:
+        order_column = {
+            "overall_score": overall,
+            "student_name": User.name,
+            "quiz_count": quiz_count,
+            "essay_count": essay_count,
+        }[sort]
+        query = query.order_by(order_column.desc() if descending else order_column.asc(), User.id)
+
+    paged = query
+    if offset:
+        paged = paged.offset(offset)
+    if limit is not None:
+        paged = paged.limit(limit)
+
+    result, total = [], 0
+    for *row, total in paged:
+        result.append(student_row(*row))
+    if not result and offset:
+        # Paged past the end; the window total isn't available
+        total = query.order_by(None).count()
+    return result, total
+
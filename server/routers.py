@@ -1,10 +1,14 @@
-from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date, datetime, timedelta, timezone
+import asyncio
+import time
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Header, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import requests
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session, joinedload, load_only
+from sqlalchemy.exc import IntegrityError
 from config import settings
 from database import get_db
 
@@ -12,12 +16,35 @@ from database import get_db
 import models
 import schemas
 
-from auth import get_current_user, get_teacher_user, get_student_user
+import lifecycle
+import model_policy
+import profiling
+from feedback_parser import parse_stats
+from admission import admit_llm
+from auth import get_current_user, get_teacher_user, get_student_user, get_admin_user
 from crud import (
     get_user_by_firebase_uid, create_user, create_quiz, get_quiz, 
-    create_quiz_submission, create_essay, get_essay, create_essay_submission
+    create_quiz_submission, create_essay, get_essay,
+    create_essay_submission_record, grade_essay_submission, grade_essay_submission_by_id,
+    save_essay_feedback, essay_score, publish_essay_graded, is_revision
 )
+import bulk_import
+import events
+import exports
+import feedback_themes
+import analytics_store
+import archive
+import classes
+import idempotency
+from fieldsets import SUMMARY_FIELDS, load_fields, parse_fields, project
+import psychometrics
+import quiz_cache
+import roster
+import search
+import timeseries
 from ai_feedback import ai_feedback_service
+from similarity import similarity_report
+from text_metrics import compute_metrics
 
 # Create routers
 auth = APIRouter()
@@ -26,6 +53,8 @@ essays = APIRouter()
 analytics = APIRouter()
 teacher = APIRouter()
 student = APIRouter()  # New student router
+debug = APIRouter()
+admin = APIRouter()
 
 # Auth routes (unchanged)
 @auth.post("/register", response_model=schemas.User)
@@ -82,14 +111,32 @@ async def create_new_quiz(
 ):
     return create_quiz(db, quiz_data.model_dump(), current_user.id)
 
-@quizzes.get("/{quiz_id}", response_model=schemas.Quiz)
+@quizzes.get("/{quiz_id}", response_model=schemas.StudentQuiz)
 async def get_quiz_by_id(
     quiz_id: int,
+    request: Request,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """Answer-stripped quiz from pre-rendered bytes; the owner gets the full quiz"""
+    teacher_id, rendered = quiz_cache.get_rendered(db, quiz_id)
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    if teacher_id == current_user.id:
+        return JSONResponse(content=jsonable_encoder(schemas.Quiz.model_validate(get_quiz(db, quiz_id))))
+    if not classes.quiz_visible(db, current_user.id, quiz_id):
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    return quiz_cache.response(request, rendered)
+
+@quizzes.get("/{quiz_id}/full", response_model=schemas.Quiz)
+async def get_full_quiz(
+    quiz_id: int,
+    current_user: models.User = Depends(get_teacher_user),
+    db: Session = Depends(get_db)
+):
+    """Quiz with answer keys, for the owning teacher only"""
     quiz = get_quiz(db, quiz_id)
-    if not quiz:
+    if not quiz or quiz.teacher_id != current_user.id:
         raise HTTPException(status_code=404, detail="Quiz not found")
     return quiz
 
@@ -97,12 +144,32 @@ async def get_quiz_by_id(
 async def submit_quiz_answers(
     quiz_id: int,
     submission_data: schemas.QuizSubmissionCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: models.User = Depends(get_student_user),
     db: Session = Depends(get_db)
 ):
+    if not get_quiz(db, quiz_id) or not classes.quiz_visible(db, current_user.id, quiz_id):
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
     submission_dict = submission_data.model_dump()
+    claimed = idempotency.claim(db, current_user.id, idempotency_key, f"quiz:{quiz_id}", submission_dict)
+    if isinstance(claimed, JSONResponse):
+        return claimed
+
     submission_dict.update({"quiz_id": quiz_id, "student_id": current_user.id})
-    return create_quiz_submission(db, submission_dict)
+    try:
+        submission = create_quiz_submission(db, submission_dict)
+    except IntegrityError:
+        db.rollback()
+        idempotency.release(claimed)
+        raise HTTPException(status_code=409, detail="Quiz already submitted")
+    except Exception:
+        idempotency.release(claimed)
+        raise
+
+    result = schemas.QuizSubmission.model_validate(submission)
+    idempotency.complete(claimed, 200, jsonable_encoder(result))
+    return result
 
 # Essay routes (unchanged)
 @essays.post("/", response_model=schemas.Essay)
@@ -113,18 +180,47 @@ async def create_essay_prompt(
 ):
     return create_essay(db, essay_data.model_dump(), current_user.id)
 
-@essays.post("/{essay_id}/submit", response_model=schemas.EssaySubmission)
+@essays.post("/{essay_id}/submit", response_model=schemas.EssaySubmission, dependencies=[Depends(admit_llm)])
 async def submit_essay(
     essay_id: int,
     submission_data: schemas.EssaySubmissionCreate,
+    background_tasks: BackgroundTasks,
+    wait_for_feedback: bool = True,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: models.User = Depends(get_student_user),
     db: Session = Depends(get_db)
 ):
+    """Submit an essay. With wait_for_feedback=false the response returns right
+    away with text_metrics and ai_feedback is filled in in the background."""
+    if not get_essay(db, essay_id) or not classes.essay_visible(db, current_user.id, essay_id):
+        raise HTTPException(status_code=404, detail="Essay not found")
+
     submission_dict = submission_data.model_dump()
+    # A retried submit replays the stored result instead of grading again
+    claimed = idempotency.claim(db, current_user.id, idempotency_key, f"essay:{essay_id}", submission_dict)
+    if isinstance(claimed, JSONResponse):
+        return claimed
+
     submission_dict.update({"essay_id": essay_id, "student_id": current_user.id})
-    return await create_essay_submission(db, submission_dict, ai_feedback_service)
+    try:
+        submission = create_essay_submission_record(db, submission_dict)
+        if wait_for_feedback:
+            submission = await grade_essay_submission(db, submission, ai_feedback_service)
+        else:
+            background_tasks.add_task(grade_essay_submission_by_id, submission.id, ai_feedback_service)
+    except IntegrityError:
+        db.rollback()
+        idempotency.release(claimed)
+        raise HTTPException(status_code=409, detail="Essay already submitted")
+    except Exception:
+        idempotency.release(claimed)
+        raise
 
-@essays.post("/{essay_id}/feedback")
+    result = schemas.EssaySubmission.model_validate(submission)
+    idempotency.complete(claimed, 200, jsonable_encoder(result))
+    return result
+
+@essays.post("/{essay_id}/feedback", dependencies=[Depends(admit_llm)])
 async def generate_ai_feedback(
     essay_id: int,
     submission_id: int,
@@ -140,13 +236,18 @@ async def generate_ai_feedback(
         raise HTTPException(status_code=404, detail="Submission not found")
     
     essay = get_essay(db, essay_id)
+    if submission.text_metrics is None:
+        submission.text_metrics = compute_metrics(submission.text, essay.prompt, essay.rubric)
+    previous_score = submission.score
     new_feedback = await ai_feedback_service.generate_essay_feedback(
-        submission.text, essay.rubric
+        submission.text, essay.rubric, submission.text_metrics, tier=essay.quality_tier,
+        revision=is_revision(db, submission)
     )
     
-    submission.ai_feedback = new_feedback
+    save_essay_feedback(db, submission, new_feedback)
     db.commit()
-    return {"feedback": new_feedback}
+    publish_essay_graded(submission, previous_score)
+    return {"feedback": schemas.public_feedback(new_feedback)}
 
 # Analytics routes (unchanged)
 @analytics.get("/quiz/{quiz_id}", response_model=schemas.QuizAnalytics)
@@ -209,17 +310,26 @@ async def get_essay_analytics(
     student_performance = [
         {
             "student_id": sub.student_id,
-            "score": sub.ai_feedback.get('overall_score', 70) if sub.ai_feedback else 70
+            "score": essay_score(sub.ai_feedback)
         }
         for sub in submissions
     ]
-    
+    scores = [entry["score"] for entry in student_performance if entry["score"] is not None]
+
+    # Theme counts are maintained as feedback lands; backfill only catches
+    # feedback saved before that existed
+    feedback_themes.backfill(db, [essay_id])
+    themes = feedback_themes.ranked_themes(db, current_user.id, essay_id)
+
     return schemas.EssayAnalytics(
         essay_id=essay_id,
-        average_score=75,
-        common_strengths=["Good structure", "Clear arguments"],
-        common_weaknesses=["Grammar issues", "Need more examples"],
-        student_performance=student_performance
+        average_score=round(sum(scores) / len(scores), 1) if scores else 0,
+        common_strengths=[theme["label"] for theme in themes["strengths"]],
+        common_weaknesses=[theme["label"] for theme in themes["weaknesses"]],
+        student_performance=student_performance,
+        strength_counts=themes["strengths"],
+        weakness_counts=themes["weaknesses"],
+        suggestion_counts=themes["suggestions"]
     )
 
 @analytics.get("/student/{student_id}", response_model=schemas.StudentAnalytics)
@@ -247,61 +357,255 @@ async def get_student_analytics(
     )
 
 # Teacher routes (unchanged)
-@teacher.get("/quizzes", response_model=List[schemas.Quiz])
+@teacher.get("/quizzes", response_model=List[schemas.QuizSummary], response_model_exclude_unset=True)
 async def get_teacher_quizzes(
+    fields: Optional[str] = None,
     current_user: models.User = Depends(get_teacher_user),
     db: Session = Depends(get_db)
 ):
-    """Get all quizzes created by the current teacher"""
-    quizzes = db.query(models.Quiz).filter(models.Quiz.teacher_id == current_user.id).all()
-    return quizzes
+    """Get all quizzes created by the current teacher (summaries unless ?fields= asks for more)"""
+    names = parse_fields("quiz", fields)
+    quizzes = db.query(models.Quiz).options(load_fields(models.Quiz, names)).filter(
+        models.Quiz.teacher_id == current_user.id
+    ).all()
+    return project(quizzes, names)
 
-@teacher.get("/essays", response_model=List[schemas.Essay])
+@teacher.get("/essays", response_model=List[schemas.EssaySummary], response_model_exclude_unset=True)
 async def get_teacher_essays(
+    fields: Optional[str] = None,
     current_user: models.User = Depends(get_teacher_user),
     db: Session = Depends(get_db)
 ):
-    """Get all essays created by the current teacher"""
-    essays = db.query(models.Essay).filter(models.Essay.teacher_id == current_user.id).all()
-    return essays
+    """Get all essays created by the current teacher (summaries unless ?fields= asks for more)"""
+    names = parse_fields("essay", fields)
+    essays = db.query(models.Essay).options(load_fields(models.Essay, names)).filter(
+        models.Essay.teacher_id == current_user.id
+    ).all()
+    return project(essays, names)
+
+@teacher.get("/essays/{essay_id}/similarity", response_model=schemas.EssaySimilarityReport)
+async def get_essay_similarity_report(
+    essay_id: int,
+    threshold: Optional[float] = None,
+    current_user: models.User = Depends(get_teacher_user),
+    db: Session = Depends(get_db)
+):
+    """Get near-duplicate submission pairs for one of the teacher's essays"""
+    essay = get_essay(db, essay_id)
+    if not essay or essay.teacher_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Essay not found")
+
+    threshold = threshold if threshold is not None else settings.SIMILARITY_REPORT_THRESHOLD
+    return schemas.EssaySimilarityReport(
+        essay_id=essay_id,
+        threshold=threshold,
+        pairs=similarity_report(db, essay_id, threshold)
+    )
+
+@teacher.get("/search", response_model=List[schemas.SearchHit], response_model_exclude_unset=True)
+async def search_teacher_material(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: models.User = Depends(get_teacher_user),
+    db: Session = Depends(get_db)
+):
+    """Full-text search over the teacher's essay prompts, submissions to them and
+    quiz questions (kind= narrows to a comma-separated subset). Ranked, highlighted
+    and paged; the unpaged total is returned in the X-Total-Count header."""
+    kinds = [name.strip() for name in kind.split(",") if name.strip()] if kind else list(search.KINDS)
+    unknown = [name for name in kinds if name not in search.KINDS]
+    if unknown or not kinds:
+        raise HTTPException(status_code=400, detail=f"kind must be a subset of: {', '.join(search.KINDS)}")
+
+    hits, total = search.search(db, current_user.id, q, kinds, limit, offset)
+    response.headers["X-Total-Count"] = str(total)
+    return hits
+
+@teacher.get("/export/gradebook")
+async def export_gradebook(
+    format: str = "csv",
+    kind: str = "all",
+    quiz_id: Optional[int] = None,
+    essay_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_archived: bool = False,
+    current_user: models.User = Depends(get_teacher_user)
+):
+    """Stream quiz and essay results as CSV, JSONL or Parquet"""
+    if format not in exports.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, use one of: {', '.join(exports.FORMATS)}")
+    if kind not in ("all", "quiz", "essay"):
+        raise HTTPException(status_code=400, detail="kind must be 'all', 'quiz' or 'essay'")
+    if format == "parquet" and not exports.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+
+    filters = exports.ExportFilters(
+        teacher_id=current_user.id, kind=kind, quiz_id=quiz_id, essay_id=essay_id,
+        student_id=student_id, start=start, end=end, include_archived=include_archived
+    )
+    media_type, extension = exports.FORMATS[format]
+    return StreamingResponse(
+        exports.export_stream(filters, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="gradebook.{extension}"'}
+    )
+
+def _import_format(file: UploadFile, format: Optional[str]) -> str:
+    fmt = bulk_import.detect_format(file.filename, format)
+    if not fmt:
+        raise HTTPException(status_code=400, detail="Upload a .csv or .jsonl file (or pass format=csv|jsonl)")
+    return fmt
+
+@teacher.post("/import/quizzes")
+def import_teacher_quizzes(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    current_user: models.User = Depends(get_teacher_user),
+    db: Session = Depends(get_db)
+):
+    """Bulk-create quizzes (with questions) from a CSV or JSONL upload"""
+    report = bulk_import.import_quizzes(db, file.file, _import_format(file, format), current_user.id)
+    return report.as_dict()
+
+@teacher.post("/import/essays")
+def import_teacher_essays(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    current_user: models.User = Depends(get_teacher_user),
+    db: Session = Depends(get_db)
+):
+    """Bulk-create essay prompts from a CSV or JSONL upload"""
+    report = bulk_import.import_essays(db, file.file, _import_format(file, format), current_user.id)
+    return report.as_dict()
+
+@teacher.get("/events")
+async def stream_teacher_events(
+    current_user: models.User = Depends(get_teacher_user)
+):
+    """Server-sent events with dashboard deltas (new quiz scores, graded essays).
+    Events carry the submission's score, not recomputed averages"""
+    teacher_id = current_user.id
+    queue = events.hub.subscribe(teacher_id)
+
+    async def stream():
+        # Streams end after EVENTS_STREAM_MAX_SECONDS so workers can restart
+        # cleanly; EventSource reconnects on its own after `retry`
+        deadline = time.monotonic() + settings.EVENTS_STREAM_MAX_SECONDS
+        try:
+            yield "retry: 3000\n\n"
+            while time.monotonic() < deadline and not lifecycle.state["draining"]:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield events.format_sse(event)
+        finally:
+            events.hub.unsubscribe(teacher_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Classes
+@teacher.post("/classes", response_model=schemas.Class)
+async def create_class(
+    class_data: schemas.ClassCreate,
+    current_user: models.User = Depends(get_teacher_user),
+    db: Session = Depends(get_db)
+):
+    new_class = models.Class(teacher_id=current_user.id, name=class_data.name)
+    db.add(new_class)
+    db.commit()
+    db.refresh(new_class)
+    return schemas.Class(id=new_class.id, teacher_id=new_class.teacher_id, name=new_class.name, created_at=new_class.created_at)
+
+@teacher.get("/classes", response_model=List[schemas.Class])
+async def get_teacher_classes(
+    current_user: models.User = Depends(get_teacher_user),
+    db: Session = Depends(get_db)
+):
+    return classes.list_classes(db, current_user.id)
+
+def _teacher_class(db: Session, class_id: int, teacher_id: int) -> models.Class:
+    found = classes.get_teacher_class(db, class_id, teacher_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="Class not found")
+    return found
+
+@teacher.post("/classes/{class_id}/students", response_model=schemas.ClassChangeResult)
+async def enroll_students(
+    class_id: int,
+    enrollment: schemas.EnrollmentRequest,
+    current_user: models.User = Depends(get_teacher_user),
+    db: Session = Depends(get_db)
+):
+    """Enroll students by id or email; unknown or non-student users are reported as skipped"""
+    _teacher_class(db, class_id, current_user.id)
+    added, skipped = classes.enroll(db, class_id, enrollment.student_ids, enrollment.student_emails)
+    return schemas.ClassChangeResult(added=added, skipped=skipped)
+
+@teacher.delete("/classes/{class_id}/students/{student_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def unenroll_student(
+    class_id: int,
+    student_id: int,
+    current_user: models.User = Depends(get_teacher_user),
+    db: Session = Depends(get_db)
+):
+    _teacher_class(db, class_id, current_user.id)
+    if not classes.unenroll(db, class_id, student_id):
+        raise HTTPException(status_code=404, detail="Student is not enrolled in this class")
+
+@teacher.post("/classes/{class_id}/assignments", response_model=schemas.ClassChangeResult)
+async def assign_to_class(
+    class_id: int,
+    assignment: schemas.AssignmentRequest,
+    current_user: models.User = Depends(get_teacher_user),
+    db: Session = Depends(get_db)
+):
+    """Assign the teacher's quizzes and essays to a class"""
+    _teacher_class(db, class_id, current_user.id)
+    added, skipped = classes.assign(db, class_id, current_user.id, assignment.quiz_ids, assignment.essay_ids)
+    return schemas.ClassChangeResult(added=added, skipped=skipped)
 
 # Student routes - NEW
-class DashboardResponse(BaseModel):
-    pending_quizzes: int
-    pending_essays: int
-    completed_assignments: int
-    pending_quizzes_list: List[schemas.Quiz]
-    pending_essays_list: List[schemas.Essay]
-    recent_activity: List[dict]
-
-@student.get("/dashboard", response_model=DashboardResponse)
+@student.get("/dashboard", response_model=schemas.DashboardResponse, response_model_exclude_unset=True)
 async def get_student_dashboard(
     current_user: models.User = Depends(get_student_user),
     db: Session = Depends(get_db)
 ):
     """Get student dashboard data"""
     
-    # Get all quizzes and essays
-    all_quizzes = db.query(models.Quiz).all()
-    all_essays = db.query(models.Essay).all()
-    
-    # Get student's submissions
-    quiz_submissions = db.query(models.QuizSubmission).filter(
+    # Pending assignments from the student's classes (card columns only; essay
+    # cards show the rubric criteria count, and rubrics are small)
+    quiz_fields, essay_fields = SUMMARY_FIELDS["quiz"], SUMMARY_FIELDS["essay"] + ("rubric",)
+    pending_quizzes = classes.pending_quizzes(db, current_user.id, load_fields(models.Quiz, quiz_fields))
+    pending_essays = classes.pending_essays(db, current_user.id, load_fields(models.Essay, essay_fields))
+    
+    # Get student's submissions, with the assignment title in the same query
+    quiz_submissions = db.query(models.QuizSubmission).options(
+        load_only(models.QuizSubmission.id, models.QuizSubmission.quiz_id,
+                  models.QuizSubmission.score, models.QuizSubmission.submitted_at),
+        joinedload(models.QuizSubmission.quiz).load_only(models.Quiz.title)
+    ).filter(
         models.QuizSubmission.student_id == current_user.id
     ).all()
     
-    essay_submissions = db.query(models.EssaySubmission).filter(
+    essay_submissions = db.query(models.EssaySubmission).options(
+        load_only(models.EssaySubmission.id, models.EssaySubmission.essay_id,
+                  models.EssaySubmission.score, models.EssaySubmission.submitted_at),
+        joinedload(models.EssaySubmission.essay).load_only(models.Essay.prompt)
+    ).filter(
         models.EssaySubmission.student_id == current_user.id
     ).all()
     
-    # Find pending quizzes (quizzes not submitted by student)
-    submitted_quiz_ids = [sub.quiz_id for sub in quiz_submissions]
-    pending_quizzes = [quiz for quiz in all_quizzes if quiz.id not in submitted_quiz_ids]
-    
-    # Find pending essays (essays not submitted by student)
-    submitted_essay_ids = [sub.essay_id for sub in essay_submissions]
-    pending_essays = [essay for essay in all_essays if essay.id not in submitted_essay_ids]
-    
     # Calculate completed assignments
     completed_assignments = len(quiz_submissions) + len(essay_submissions)
     
@@ -325,7 +629,7 @@ async def get_student_dashboard(
             "type": "essay",
             "id": sub.id,
             "title": f"Essay: {sub.essay.prompt[:50]}...",
-            "score": sub.ai_feedback.get('overall_score', 'Pending') if sub.ai_feedback else 'Pending',
+            "score": sub.score if sub.score is not None else 'Pending',
             "submitted_at": sub.submitted_at,
             "status": "completed"
         })
@@ -334,162 +638,144 @@ async def get_student_dashboard(
     recent_activity.sort(key=lambda x: x["submitted_at"], reverse=True)
     recent_activity = recent_activity[:10]  # Limit to 10 most recent
     
-    return DashboardResponse(
+    return schemas.DashboardResponse(
         pending_quizzes=len(pending_quizzes),
         pending_essays=len(pending_essays),
         completed_assignments=completed_assignments,
-        pending_quizzes_list=pending_quizzes,
-        pending_essays_list=pending_essays,
+        pending_quizzes_list=project(pending_quizzes, quiz_fields),
+        pending_essays_list=project(pending_essays, essay_fields),
         recent_activity=recent_activity
     )
 
-@student.get("/quizzes/available", response_model=List[schemas.Quiz])
+@student.get("/quizzes/available", response_model=List[schemas.StudentQuiz])
 async def get_available_quizzes(
     current_user: models.User = Depends(get_student_user),
     db: Session = Depends(get_db)
 ):
-    """Get all quizzes available for the student (not submitted yet)"""
-    
-    # Get all quizzes
-    all_quizzes = db.query(models.Quiz).all()
-    
-    # Get student's submitted quiz IDs
-    submitted_quiz_ids = db.query(models.QuizSubmission.quiz_id).filter(
-        models.QuizSubmission.student_id == current_user.id
-    ).all()
-    submitted_quiz_ids = [qid for (qid,) in submitted_quiz_ids]
-    
-    # Filter out quizzes that student has already submitted
-    available_quizzes = [quiz for quiz in all_quizzes if quiz.id not in submitted_quiz_ids]
-    
-    return available_quizzes
+    """Get quizzes assigned to the student's classes and not submitted yet"""
+    available_quizzes = classes.pending_quizzes(db, current_user.id)
+    return [quiz_cache.student_view(quiz) for quiz in available_quizzes]
 
 @student.get("/essays/available", response_model=List[schemas.Essay])
 async def get_available_essays(
     current_user: models.User = Depends(get_student_user),
     db: Session = Depends(get_db)
 ):
-    """Get all essays available for the student (not submitted yet)"""
-    
-    # Get all essays
-    all_essays = db.query(models.Essay).all()
-    
-    # Get student's submitted essay IDs
-    submitted_essay_ids = db.query(models.EssaySubmission.essay_id).filter(
-        models.EssaySubmission.student_id == current_user.id
-    ).all()
-    submitted_essay_ids = [eid for (eid,) in submitted_essay_ids]
-    
-    # Filter out essays that student has already submitted
-    available_essays = [essay for essay in all_essays if essay.id not in submitted_essay_ids]
-    
-    return available_essays
+    """Get essays assigned to the student's classes and not submitted yet"""
+    return classes.pending_essays(db, current_user.id)
 
 @student.get("/submissions/quizzes", response_model=List[schemas.QuizSubmission])
 async def get_student_quiz_submissions(
+    include_archived: bool = False,
     current_user: models.User = Depends(get_student_user),
     db: Session = Depends(get_db)
 ):
-    """Get all quiz submissions by the student"""
+    """Get all quiz submissions by the student (past terms with include_archived)"""
     submissions = db.query(models.QuizSubmission).filter(
         models.QuizSubmission.student_id == current_user.id
     ).all()
+    if include_archived:
+        return list(archive.archived_rows(db, "quiz_submissions", current_user.id)) + submissions
     return submissions
 
-@student.get("/submissions/essays", response_model=List[schemas.EssaySubmission])
+@student.get("/submissions/essays", response_model=List[schemas.EssaySubmissionSummary], response_model_exclude_unset=True)
 async def get_student_essay_submissions(
+    fields: Optional[str] = None,
+    include_archived: bool = False,
     current_user: models.User = Depends(get_student_user),
     db: Session = Depends(get_db)
 ):
-    """Get all essay submissions by the student"""
-    submissions = db.query(models.EssaySubmission).filter(
+    """Get all essay submissions by the student (summaries unless ?fields= asks for more)"""
+    names = parse_fields("essay_submission", fields)
+    submissions = db.query(models.EssaySubmission).options(
+        load_fields(models.EssaySubmission, names)
+    ).filter(
         models.EssaySubmission.student_id == current_user.id
     ).all()
-    return submissions
+    archived = list(archive.archived_rows(db, "essay_submissions", current_user.id, columns=names)) if include_archived else []
+    return archived + project(submissions, names)
 
 
 @teacher.get("/analytics/overview", response_model=schemas.TeacherOverviewResponse)
 async def get_teacher_overview(
+    response: Response,
     current_user: models.User = Depends(get_teacher_user),
     db: Session = Depends(get_db)
 ):
     """Get comprehensive overview for teacher dashboard"""
+    # Submission scans go to the columnar store when it's fresh enough
+    store = analytics_store.snapshot()
+    analytics_store.tag(response, store)
     
-    # Get teacher's quizzes and essays
+    # Get teacher's quizzes
     teacher_quizzes = db.query(models.Quiz).filter(models.Quiz.teacher_id == current_user.id).all()
-    teacher_essays = db.query(models.Essay).filter(models.Essay.teacher_id == current_user.id).all()
-    
-    quiz_ids = [quiz.id for quiz in teacher_quizzes]
-    essay_ids = [essay.id for essay in teacher_essays]
-    
-    # Get all submissions for teacher's assignments
-    quiz_submissions = db.query(models.QuizSubmission).filter(
-        models.QuizSubmission.quiz_id.in_(quiz_ids)
-    ).all() if quiz_ids else []
     
-    essay_submissions = db.query(models.EssaySubmission).filter(
-        models.EssaySubmission.essay_id.in_(essay_ids)
-    ).all() if essay_ids else []
-    
-    # Calculate total students (unique students who submitted)
-    student_ids = set()
-    for sub in quiz_submissions:
-        student_ids.add(sub.student_id)
-    for sub in essay_submissions:
-        student_ids.add(sub.student_id)
-    
-    total_students = len(student_ids)
-    
-    # Calculate average score
-    total_score = 0
-    total_submissions_with_score = 0
-    
-    for sub in quiz_submissions:
-        total_score += sub.score
-        total_submissions_with_score += 1
-    
-    for sub in essay_submissions:
-        if sub.ai_feedback and 'overall_score' in sub.ai_feedback:
-            total_score += sub.ai_feedback['overall_score']
-            total_submissions_with_score += 1
-        else:
-            # Default score for essays without feedback
-            total_score += 70
+    if store is not None:
+        average_score, at_risk_students, quiz_averages = store.overview_scores(current_user.id)
+    else:
+        teacher_essays = db.query(models.Essay).filter(models.Essay.teacher_id == current_user.id).all()
+        
+        quiz_ids = [quiz.id for quiz in teacher_quizzes]
+        essay_ids = [essay.id for essay in teacher_essays]
+        
+        # Get all submissions for teacher's assignments
+        quiz_submissions = db.query(models.QuizSubmission).filter(
+            models.QuizSubmission.quiz_id.in_(quiz_ids)
+        ).all() if quiz_ids else []
+        
+        essay_submissions = db.query(models.EssaySubmission).filter(
+            models.EssaySubmission.essay_id.in_(essay_ids)
+        ).all() if essay_ids else []
+        
+        # Calculate average score
+        total_score = 0
+        total_submissions_with_score = 0
+        
+        for sub in quiz_submissions:
+            total_score += sub.score
             total_submissions_with_score += 1
-    
-    average_score = total_score / total_submissions_with_score if total_submissions_with_score > 0 else 0
-    
-    # Calculate completion rate
-    total_assignments = len(teacher_quizzes) + len(teacher_essays)
-    total_expected_submissions = total_assignments * total_students if total_students > 0 else 0
-    actual_submissions = len(quiz_submissions) + len(essay_submissions)
-    completion_rate = (actual_submissions / total_expected_submissions * 100) if total_expected_submissions > 0 else 0
-    
-    # Calculate at-risk students (score < 70)
-    student_scores = {}
-    for sub in quiz_submissions:
-        if sub.student_id not in student_scores:
-            student_scores[sub.student_id] = []
-        student_scores[sub.student_id].append(sub.score)
-    
-    for sub in essay_submissions:
-        if sub.student_id not in student_scores:
-            student_scores[sub.student_id] = []
-        essay_score = sub.ai_feedback.get('overall_score', 70) if sub.ai_feedback else 70
-        student_scores[sub.student_id].append(essay_score)
-    
-    at_risk_students = 0
-    for student_id, scores in student_scores.items():
-        avg_score = sum(scores) / len(scores)
-        if avg_score < 70:
-            at_risk_students += 1
+        
+        for sub in essay_submissions:
+            if sub.ai_feedback and 'overall_score' in sub.ai_feedback:
+                total_score += sub.ai_feedback['overall_score']
+                total_submissions_with_score += 1
+            else:
+                # Default score for essays without feedback
+                total_score += 70
+                total_submissions_with_score += 1
+        
+        average_score = total_score / total_submissions_with_score if total_submissions_with_score > 0 else 0
+        
+        # Calculate at-risk students (score < 70)
+        student_scores = {}
+        for sub in quiz_submissions:
+            if sub.student_id not in student_scores:
+                student_scores[sub.student_id] = []
+            student_scores[sub.student_id].append(sub.score)
+        
+        for sub in essay_submissions:
+            if sub.student_id not in student_scores:
+                student_scores[sub.student_id] = []
+            essay_score = sub.ai_feedback.get('overall_score', 70) if sub.ai_feedback else 70
+            student_scores[sub.student_id].append(essay_score)
+        
+        at_risk_students = 0
+        for student_id, scores in student_scores.items():
+            avg_score = sum(scores) / len(scores)
+            if avg_score < 70:
+                at_risk_students += 1
+        
+        quiz_averages = {}
+        for quiz in teacher_quizzes:
+            quiz_subs = [sub for sub in quiz_submissions if sub.quiz_id == quiz.id]
+            if quiz_subs:
+                quiz_averages[quiz.id] = sum(sub.score for sub in quiz_subs) / len(quiz_subs)
     
     # Quiz performance data
     quiz_performance = []
     for quiz in teacher_quizzes:
-        quiz_subs = [sub for sub in quiz_submissions if sub.quiz_id == quiz.id]
-        if quiz_subs:
-            avg_score = sum(sub.score for sub in quiz_subs) / len(quiz_subs)
+        if quiz.id in quiz_averages:
+            avg_score = quiz_averages[quiz.id]
             quiz_performance.append({
                 "question": quiz.title[:20] + "...",
                 "correct": avg_score,
@@ -497,40 +783,41 @@ async def get_teacher_overview(
                 "difficulty": "Easy" if avg_score > 80 else "Medium" if avg_score > 60 else "Hard"
             })
     
+    # Total students: the enrolled roster across the teacher's classes
+    total_students = classes.roster_size(db, current_user.id)
+    
+    # Completion rate against enrolled students x assignments of their classes
+    progress = classes.completion(db, current_user.id)
+    submitted = progress["completed"] + progress["in_progress"]
+    completion_rate = (submitted / progress["expected"] * 100) if progress["expected"] > 0 else 0
+    
     # Class progress over time (last 6 weeks)
-    class_progress = []
-    for i in range(6, 0, -1):
-        week_ago = datetime.now() - timedelta(weeks=i)
-        week_subs = [sub for sub in quiz_submissions if sub.submitted_at >= week_ago]
-        if week_subs:
-            week_avg = sum(sub.score for sub in week_subs) / len(week_subs)
-            class_progress.append({
-                "name": f"Week {i}",
-                "average": week_avg
-            })
+    # Disjoint calendar weeks, oldest first; "Week 1" is the current week
+    this_week = timeseries.bucket_start(datetime.now(timezone.utc).date(), "week")
+    six_weeks_ago = datetime.combine(this_week - timedelta(weeks=5), datetime.min.time(), tzinfo=timezone.utc)
+    if store is not None:
+        weeks = store.score_series(current_user.id, "week", start=six_weeks_ago, kind="quiz", fill=False)
+    else:
+        weeks = timeseries.score_series(db, current_user.id, "week", start=six_weeks_ago, kind="quiz", fill=False)
+    class_progress = [
+        {
+            "name": f"Week {(this_week - week['bucket']).days // 7 + 1}",
+            "average": week["average"]
+        }
+        for week in weeks if week["average"] is not None
+    ]
     
     # Assignment status
     assignment_status = [
-        {"name": "Completed", "value": len(quiz_submissions) + len(essay_submissions), "color": "#8b5cf6"},
-        {"name": "In Progress", "value": total_expected_submissions - (len(quiz_submissions) + len(essay_submissions)), "color": "#06b6d4"},
-        {"name": "Not Started", "value": max(0, total_assignments - total_expected_submissions), "color": "#6b7280"}
-    ]
-    
-    # Subject performance (mock data - you can categorize quizzes by title)
-    subject_performance = [
-        {"subject": "Math", "average": 78, "trend": "up"},
-        {"subject": "Science", "average": 82, "trend": "up"},
-        {"subject": "History", "average": 65, "trend": "down"},
-        {"subject": "English", "average": 74, "trend": "up"}
+        {"name": "Completed", "value": progress["completed"], "color": "#8b5cf6"},
+        {"name": "In Progress", "value": progress["in_progress"], "color": "#06b6d4"},
+        {"name": "Not Started", "value": max(0, progress["expected"] - submitted), "color": "#6b7280"}
     ]
     
-    # Problem areas
-    problem_areas = [
-        {"topic": "Fractions", "failRate": 65, "students": 16},
-        {"topic": "Essay Structure", "failRate": 45, "students": 11},
-        {"topic": "Historical Dates", "failRate": 58, "students": 14},
-        {"topic": "Grammar", "failRate": 38, "students": 9}
-    ]
+    # Subject performance and problem areas from item analysis of quiz answers
+    analysis = psychometrics.analyze(db, current_user.id, store)
+    subject_performance = psychometrics.subject_performance(analysis)
+    problem_areas = psychometrics.problem_areas(analysis)
     
     return schemas.TeacherOverviewResponse(
         total_students=total_students,
@@ -544,83 +831,103 @@ async def get_teacher_overview(
         problem_areas=problem_areas
     )
 
+@teacher.get("/analytics/progress", response_model=schemas.ProgressSeriesResponse)
+async def get_progress_series(
+    response: Response,
+    granularity: str = "week",
+    kind: str = "all",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    quiz_id: Optional[int] = None,
+    essay_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+    fill: bool = True,
+    current_user: models.User = Depends(get_teacher_user),
+    db: Session = Depends(get_db)
+):
+    """Get average scores over time in day, week or month buckets"""
+    if granularity not in timeseries.GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity must be 'day', 'week' or 'month'")
+    if kind not in ("all", "quiz", "essay"):
+        raise HTTPException(status_code=400, detail="kind must be 'all', 'quiz' or 'essay'")
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    store = analytics_store.snapshot()
+    analytics_store.tag(response, store)
+    filters = dict(start=start, end=end, kind=kind, quiz_id=quiz_id, essay_id=essay_id, student_id=student_id, fill=fill)
+    if store is not None:
+        series = store.score_series(current_user.id, granularity, **filters)
+    else:
+        series = timeseries.score_series(db, current_user.id, granularity, **filters)
+    return schemas.ProgressSeriesResponse(granularity=granularity, kind=kind, series=series)
+
+@teacher.get("/analytics/feedback-themes", response_model=schemas.FeedbackThemesResponse)
+async def get_teacher_feedback_themes(
+    limit: int = 10,
+    current_user: models.User = Depends(get_teacher_user),
+    db: Session = Depends(get_db)
+):
+    """Get the most common strengths, weaknesses and suggestions across all of the teacher's essays"""
+    essay_ids = [eid for (eid,) in db.query(models.Essay.id).filter(models.Essay.teacher_id == current_user.id)]
+    feedback_themes.backfill(db, essay_ids)
+    return feedback_themes.ranked_themes(db, current_user.id, None, limit)
+
 @teacher.get("/analytics/students", response_model=List[schemas.StudentAnalyticsResponse])
 async def get_student_analytics_list(
+    response: Response,
+    sort: str = "overall_score",
+    order: str = "desc",
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    at_risk: Optional[int] = Query(None, ge=1, le=1000),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
     current_user: models.User = Depends(get_teacher_user),
     db: Session = Depends(get_db)
 ):
-    """Get detailed analytics for all students"""
-    
-    # Get teacher's assignments
-    teacher_quizzes = db.query(models.Quiz).filter(models.Quiz.teacher_id == current_user.id).all()
-    teacher_essays = db.query(models.Essay).filter(models.Essay.teacher_id == current_user.id).all()
-    
-    quiz_ids = [quiz.id for quiz in teacher_quizzes]
-    essay_ids = [essay.id for essay in teacher_essays]
-    
-    # Get all submissions
-    quiz_submissions = db.query(models.QuizSubmission).filter(
-        models.QuizSubmission.quiz_id.in_(quiz_ids)
-    ).all() if quiz_ids else []
-    
-    essay_submissions = db.query(models.EssaySubmission).filter(
-        models.EssaySubmission.essay_id.in_(essay_ids)
-    ).all() if essay_ids else []
-    
-    # Group submissions by student
-    student_data = {}
-    for sub in quiz_submissions:
-        if sub.student_id not in student_data:
-            student_data[sub.student_id] = {"quiz_scores": [], "essay_scores": []}
-        student_data[sub.student_id]["quiz_scores"].append(sub.score)
-    
-    for sub in essay_submissions:
-        if sub.student_id not in student_data:
-            student_data[sub.student_id] = {"quiz_scores": [], "essay_scores": []}
-        essay_score = sub.ai_feedback.get('overall_score', 70) if sub.ai_feedback else 70
-        student_data[sub.student_id]["essay_scores"].append(essay_score)
-    
-    # Get student details and calculate analytics
-    result = []
-    for student_id, data in student_data.items():
-        student = db.query(models.User).filter(models.User.id == student_id).first()
-        if not student:
-            continue
-            
-        quiz_scores = data["quiz_scores"]
-        essay_scores = data["essay_scores"]
-        all_scores = quiz_scores + essay_scores
-        
-        if all_scores:
-            overall_score = sum(all_scores) / len(all_scores)
-        else:
-            overall_score = 0
-        
-        # Determine strengths and weaknesses based on performance
-        strengths = []
-        weaknesses = []
-        
-        if quiz_scores and sum(quiz_scores) / len(quiz_scores) > 80:
-            strengths.append("Quiz Performance")
-        elif quiz_scores and sum(quiz_scores) / len(quiz_scores) < 60:
-            weaknesses.append("Quiz Performance")
-            
-        if essay_scores and sum(essay_scores) / len(essay_scores) > 80:
-            strengths.append("Writing Skills")
-        elif essay_scores and sum(essay_scores) / len(essay_scores) < 60:
-            weaknesses.append("Writing Skills")
-        
-        result.append(schemas.StudentAnalyticsResponse(
-            student_id=student_id,
-            student_name=student.name,
-            overall_score=round(overall_score, 1),
-            quiz_count=len(quiz_scores),
-            essay_count=len(essay_scores),
-            strengths=strengths,
-            weaknesses=weaknesses
-        ))
-    
-    return result
+    """Get detailed analytics for all students (sortable, filterable, paged;
+    at_risk=k returns the k lowest-scoring students under the at-risk line).
+    The unpaged total is returned in the X-Total-Count header."""
+    if sort not in roster.SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(roster.SORT_FIELDS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+
+    store = analytics_store.snapshot()
+    analytics_store.tag(response, store)
+    filters = dict(
+        sort=sort, descending=order == "desc", min_score=min_score, max_score=max_score,
+        at_risk=at_risk, limit=limit, offset=offset
+    )
+    if store is not None:
+        rows, total = store.student_analytics(current_user.id, **filters)
+    else:
+        rows, total = roster.student_analytics(db, current_user.id, **filters)
+    response.headers["X-Total-Count"] = str(total)
+    return rows
+
+@teacher.get("/analytics/items", response_model=schemas.ItemAnalysisResponse)
+async def get_item_analysis(
+    response: Response,
+    quiz_id: Optional[int] = None,
+    flagged_only: bool = False,
+    current_user: models.User = Depends(get_teacher_user),
+    db: Session = Depends(get_db)
+):
+    """Item difficulty and discrimination, quiz reliability and weak topics across the teacher's quizzes"""
+    store = analytics_store.snapshot()
+    analytics_store.tag(response, store)
+    analysis = psychometrics.analyze(db, current_user.id, store)
+    quizzes, items = analysis["quizzes"], analysis["items"]
+    if quiz_id is not None:
+        if not any(quiz["quiz_id"] == quiz_id for quiz in quizzes):
+            raise HTTPException(status_code=404, detail="Quiz not found")
+        quizzes = [quiz for quiz in quizzes if quiz["quiz_id"] == quiz_id]
+        items = [item for item in items if item["quiz_id"] == quiz_id]
+    if flagged_only:
+        items = [item for item in items if item["flags"]]
+    return {**analysis, "quizzes": quizzes, "items": items}
 
 @teacher.get("/analytics/quiz/{quiz_id}", response_model=schemas.QuizAnalyticsResponse)
 async def get_quiz_detailed_analytics(
@@ -669,4 +976,97 @@ async def get_quiz_detailed_analytics(
         total_submissions=total_submissions,
         average_score=round(average_score, 1),
         question_analytics=question_analytics
-    )    
\ No newline at end of file
+    )
+
+
+# Debug routes (admin only)
+@debug.get("/profiles")
+async def list_request_profiles(current_user: models.User = Depends(get_admin_user)):
+    """List stored per-request profiles, newest first"""
+    return profiling.list_profiles()
+
+@debug.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def download_request_profile(
+    profile_id: str,
+    current_user: models.User = Depends(get_admin_user)
+):
+    """Download a profile as collapsed stacks for flamegraph tools"""
+    profile = profiling.get_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        profile.folded(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+    )
+
+@debug.get("/slow-requests")
+async def get_slow_requests(current_user: models.User = Depends(get_admin_user)):
+    """Get the slowest recorded requests per route"""
+    return profiling.slowest_requests()
+
+@debug.get("/llm-providers")
+async def get_llm_provider_health(current_user: models.User = Depends(get_admin_user)):
+    """Per-provider latency percentiles, failures, breaker state, hedge wins and failovers (this worker)"""
+    return ai_feedback_service.provider_stats()
+
+@debug.get("/llm-decisions")
+async def get_llm_decision_summary(
+    days: int = Query(7, ge=1, le=365),
+    current_user: models.User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Model tiering outcomes per (tier, size, model class, effort): volume, latency, tokens, cost"""
+    return model_policy.summarize(db, datetime.now(timezone.utc) - timedelta(days=days))
+
+@debug.get("/feedback-stats")
+async def get_feedback_parse_stats(current_user: models.User = Depends(get_admin_user)):
+    """Get how LLM feedback responses were parsed since this worker started"""
+    return parse_stats()
+
+# Admin routes
+@admin.post("/import/users")
+def import_users(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    current_user: models.User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Bulk-create or update users (keyed on firebase_uid) from a CSV or JSONL upload"""
+    report = bulk_import.import_users(db, file.file, _import_format(file, format))
+    return report.as_dict()
+
+@admin.post("/archive")
+def archive_submissions(
+    before: date,
+    current_user: models.User = Depends(get_admin_user)
+):
+    """Move closed submission ranges before `before` to compressed Parquet and drop them from the database"""
+    if not exports.parquet_available():
+        raise HTTPException(status_code=501, detail="Archiving requires pyarrow")
+    return {"archived": archive.archive_before(before)}
+
+@admin.post("/search/rebuild")
+def rebuild_search_index(current_user: models.User = Depends(get_admin_user)):
+    """Re-index all essays, submissions and quizzes for full-text search"""
+    return {"indexed": search.rebuild()}
+
+@admin.get("/analytics-store")
+def get_analytics_store_status(
+    current_user: models.User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Freshness of the columnar analytics store and the sidecar's backlog"""
+    return analytics_store.status(db)
+
+@admin.get("/archives")
+def list_submission_archives(
+    current_user: models.User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    return [
+        {
+            "table": entry.table_name, "range_start": entry.range_start, "range_end": entry.range_end,
+            "rows": entry.row_count, "archived_at": entry.archived_at
+        }
+        for entry in archive.list_archives(db)
+    ]
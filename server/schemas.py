@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+import math
+from pydantic import BaseModel, field_serializer, field_validator
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import date, datetime
 
 # User Schemas
 class UserBase(BaseModel):
@@ -23,6 +24,7 @@ class Question(BaseModel):
     question_text: str
     options: List[str]
     correct_answer: int
+    topic: Optional[str] = None  # Groups questions for item analysis; defaults to the quiz title
 
 class QuizBase(BaseModel):
     title: str
@@ -39,6 +41,23 @@ class Quiz(QuizBase):
     class Config:
         from_attributes = True
 
+class QuizSummary(BaseModel):
+    """Card view; heavy fields are only present when asked for via ?fields="""
+    id: int
+    teacher_id: Optional[int] = None
+    title: Optional[str] = None
+    question_count: Optional[int] = None
+    created_at: Optional[datetime] = None
+    questions: Optional[List[Dict[str, Any]]] = None
+
+class StudentQuiz(BaseModel):
+    """Quiz as delivered to students: answer keys stripped."""
+    id: int
+    teacher_id: int
+    title: str
+    questions: List[Dict[str, Any]]
+    created_at: datetime
+
 class QuizSubmissionBase(BaseModel):
     answers: Dict[str, int]  # question_id -> answer_index
 
@@ -63,6 +82,14 @@ class RubricItem(BaseModel):
 class EssayBase(BaseModel):
     prompt: str
     rubric: Dict[str, Any]  # Changed from Dict[str, RubricItem] to handle JSON
+    quality_tier: Optional[str] = None  # "economy", "standard" or "premium" (AI grading cost/quality)
+
+    @field_validator("quality_tier")
+    @classmethod
+    def check_quality_tier(cls, value):
+        if value is not None and value not in ("economy", "standard", "premium"):
+            raise ValueError("quality_tier must be 'economy', 'standard' or 'premium'")
+        return value
 
 class EssayCreate(EssayBase):
     pass
@@ -75,6 +102,85 @@ class Essay(EssayBase):
     class Config:
         from_attributes = True
 
+class EssaySummary(BaseModel):
+    id: int
+    teacher_id: Optional[int] = None
+    prompt: Optional[str] = None
+    quality_tier: Optional[str] = None
+    created_at: Optional[datetime] = None
+    rubric: Optional[Dict[str, Any]] = None
+
+class EssayFeedback(BaseModel):
+    """AI feedback after validation. Fields that don't validate are dropped
+    (None/empty) rather than failing the whole response."""
+    grammar_score: Optional[int] = None
+    clarity_score: Optional[int] = None
+    keyword_usage_score: Optional[int] = None
+    overall_feedback: str = ""
+    strengths: List[str] = []
+    weaknesses: List[str] = []
+    suggestions: List[str] = []
+    rubric_scores: Dict[str, float] = {}
+
+    @field_validator("grammar_score", "clarity_score", "keyword_usage_score", mode="before")
+    @classmethod
+    def coerce_score(cls, value):
+        # Accept 85, 85.0, "85", "85/100", "85%"
+        if isinstance(value, str):
+            value = value.strip().rstrip("%").split("/")[0].strip()
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        # inf/nan (e.g. "1e999") are invalid, not clamped
+        return max(0, min(100, round(value))) if math.isfinite(value) else None
+
+    @field_validator("overall_feedback", mode="before")
+    @classmethod
+    def coerce_text(cls, value):
+        if isinstance(value, list):
+            return " ".join(str(item) for item in value)
+        return "" if value is None else str(value)
+
+    @field_validator("strengths", "weaknesses", "suggestions", mode="before")
+    @classmethod
+    def coerce_list(cls, value):
+        if isinstance(value, str):
+            value = [line.strip(" -*•\t") for line in value.splitlines()]
+        if not isinstance(value, list):
+            return []
+        return [str(item).strip() for item in value if item is not None and str(item).strip()]
+
+    @field_validator("rubric_scores", mode="before")
+    @classmethod
+    def coerce_rubric_scores(cls, value):
+        if not isinstance(value, dict):
+            return {}
+        scores = {}
+        for name, score in value.items():
+            try:
+                score = float(score)
+            except (TypeError, ValueError):
+                continue
+            if math.isfinite(score):
+                scores[str(name)] = score
+        return scores
+
+    def is_usable(self) -> bool:
+        return any(
+            score is not None
+            for score in (self.grammar_score, self.clarity_score, self.keyword_usage_score)
+        ) or bool(self.overall_feedback)
+
+# Feedback keys kept server-side: the id of the (other student's) submission
+# whose feedback was reused (see similarity.find_reusable_feedback)
+PRIVATE_FEEDBACK_KEYS = ("reused_from_submission",)
+
+def public_feedback(feedback: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not feedback:
+        return feedback
+    return {key: value for key, value in feedback.items() if key not in PRIVATE_FEEDBACK_KEYS}
+
 class EssaySubmissionBase(BaseModel):
     text: str
 
@@ -87,11 +193,56 @@ class EssaySubmission(EssaySubmissionBase):
     student_id: int
     ai_feedback: Optional[Dict[str, Any]] = None
     rubric_scores: Optional[Dict[str, Any]] = None
+    text_metrics: Optional[Dict[str, Any]] = None
     submitted_at: datetime
+
+    @field_serializer("ai_feedback")
+    def hide_private_feedback(self, value):
+        return public_feedback(value)
     
     class Config:
         from_attributes = True
 
+class EssaySubmissionSummary(BaseModel):
+    id: int
+    essay_id: Optional[int] = None
+    student_id: Optional[int] = None
+    score: Optional[int] = None
+    word_count: Optional[int] = None
+    submitted_at: Optional[datetime] = None
+    text: Optional[str] = None
+    ai_feedback: Optional[Dict[str, Any]] = None
+    rubric_scores: Optional[Dict[str, Any]] = None
+    text_metrics: Optional[Dict[str, Any]] = None
+
+    @field_serializer("ai_feedback")
+    def hide_private_feedback(self, value):
+        return public_feedback(value)
+
+# Class Schemas
+class ClassCreate(BaseModel):
+    name: str
+
+class Class(ClassCreate):
+    id: int
+    teacher_id: int
+    created_at: datetime
+    student_count: int = 0
+    quiz_count: int = 0
+    essay_count: int = 0
+
+class EnrollmentRequest(BaseModel):
+    student_ids: List[int] = []
+    student_emails: List[str] = []
+
+class AssignmentRequest(BaseModel):
+    quiz_ids: List[int] = []
+    essay_ids: List[int] = []
+
+class ClassChangeResult(BaseModel):
+    added: int
+    skipped: List[str] = []
+
 # Analytics Schemas
 class QuizAnalytics(BaseModel):
     quiz_id: int
@@ -99,12 +250,58 @@ class QuizAnalytics(BaseModel):
     question_analytics: List[Dict[str, Any]]
     student_performance: List[Dict[str, Any]]
 
+class ThemeCount(BaseModel):
+    label: str
+    count: int
+
 class EssayAnalytics(BaseModel):
     essay_id: int
     average_score: float
     common_strengths: List[str]
     common_weaknesses: List[str]
     student_performance: List[Dict[str, Any]]
+    strength_counts: List[ThemeCount] = []
+    weakness_counts: List[ThemeCount] = []
+    suggestion_counts: List[ThemeCount] = []
+
+class FeedbackThemesResponse(BaseModel):
+    strengths: List[ThemeCount]
+    weaknesses: List[ThemeCount]
+    suggestions: List[ThemeCount]
+
+class SimilarityPair(BaseModel):
+    submission_id: int
+    student_id: int
+    matched_submission_id: int
+    matched_student_id: int
+    similarity: float
+    same_student: bool
+
+class EssaySimilarityReport(BaseModel):
+    essay_id: int
+    threshold: float
+    pairs: List[SimilarityPair]
+
+class ProgressPoint(BaseModel):
+    bucket: date
+    average: Optional[float] = None
+    submissions: int
+    students: int
+
+class ProgressSeriesResponse(BaseModel):
+    granularity: str
+    kind: str
+    series: List[ProgressPoint]
+
+class SearchHit(BaseModel):
+    kind: str  # "essay", "submission" or "question"
+    essay_id: Optional[int] = None
+    submission_id: Optional[int] = None
+    student_id: Optional[int] = None
+    quiz_id: Optional[int] = None
+    question_index: Optional[int] = None
+    rank: float  # Higher is better; only comparable within one result set
+    highlight: str  # Matched words wrapped in <mark></mark>
 
 class StudentAnalytics(BaseModel):
     student_id: int
@@ -136,8 +333,8 @@ class DashboardResponse(BaseModel):
     pending_quizzes: int
     pending_essays: int
     completed_assignments: int
-    pending_quizzes_list: List[Quiz]
-    pending_essays_list: List[Essay]
+    pending_quizzes_list: List[QuizSummary]
+    pending_essays_list: List[EssaySummary]
     recent_activity: List[Dict[str, Any]]
 
 
@@ -156,6 +353,39 @@ class StudentAnalyticsResponse(BaseModel):
     strengths: List[str]
     weaknesses: List[str]
 
+class ItemStatistics(BaseModel):
+    quiz_id: int
+    question_index: int
+    question_text: str
+    topic: str
+    responses: int
+    p_value: Optional[float]  # Share of students answering correctly
+    discrimination: Optional[float]  # Point-biserial against the rest of the quiz
+    flags: List[str]
+
+class QuizReliability(BaseModel):
+    quiz_id: int
+    title: str
+    items: int
+    responses: int
+    alpha: Optional[float]  # Cronbach's alpha
+
+class TopicStatistics(BaseModel):
+    topic: str
+    responses: int
+    p_value: Optional[float]
+    students_struggling: int
+    trend: str  # "up", "down" or "flat"
+    weak: bool
+
+class ItemAnalysisResponse(BaseModel):
+    computed_at: datetime
+    students: int
+    submissions: int
+    quizzes: List[QuizReliability]
+    items: List[ItemStatistics]
+    topics: List[TopicStatistics]
+
 class TeacherOverviewResponse(BaseModel):
     total_students: int
     average_score: float
@@ -0,0 +1,250 @@
+# Full-text search over a teacher's material: essay prompts, the submissions
+# to those essays and quiz questions. search_documents holds one row per
+# searchable text and follows every ORM write through the listeners below;
+# bulk imports index their rows explicitly. The inverted index is a generated
+# tsvector column with a GIN index on Postgres and an FTS5 table on SQLite
+# (see models.SearchDocument); other databases fall back to LIKE scans.
+import argparse
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, event, inspect, select, text
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from models import Essay, EssaySubmission, Quiz, SearchDocument
+
+KINDS = ("essay", "submission", "question")
+MARK_START, MARK_END = "<mark>", "</mark>"
+# Words shown around the matches in a highlight
+HIGHLIGHT_WORDS = 24
+REBUILD_BATCH = 1000
+
+_TABLE = SearchDocument.__table__
+
+
+# Documents
+
+def essay_documents(essay_id: int, teacher_id: int, prompt: Optional[str]) -> List[Dict[str, Any]]:
+    if not prompt:
+        return []
+    return [{"kind": "essay", "ref_id": essay_id, "position": 0, "teacher_id": teacher_id,
+             "parent_id": None, "student_id": None, "body": prompt}]
+
+
+def submission_documents(submission_id: int, essay_id: int, student_id: int, teacher_id: Optional[int],
+                         body: Optional[str]) -> List[Dict[str, Any]]:
+    if not body or teacher_id is None:
+        return []
+    return [{"kind": "submission", "ref_id": submission_id, "position": 0, "teacher_id": teacher_id,
+             "parent_id": essay_id, "student_id": student_id, "body": body}]
+
+
+def quiz_documents(quiz_id: int, teacher_id: int, questions: Any) -> List[Dict[str, Any]]:
+    """One document per question: its text followed by its options."""
+    rows = []
+    for position, question in enumerate(questions or []):
+        if not isinstance(question, dict):
+            continue
+        parts = [question.get("question_text") or ""]
+        parts.extend(str(option) for option in question.get("options") or [])
+        body = "\n".join(part for part in parts if part)
+        if body:
+            rows.append({"kind": "question", "ref_id": quiz_id, "position": position, "teacher_id": teacher_id,
+                         "parent_id": None, "student_id": None, "body": body})
+    return rows
+
+
+def replace(connection, kind: str, ref_ids: Sequence[int], rows: List[Dict[str, Any]]):
+    """Swap the documents of `ref_ids` for `rows` on the caller's connection,
+    so the index commits (or rolls back) with the write it follows."""
+    connection.execute(_TABLE.delete().where(_TABLE.c.kind == kind, _TABLE.c.ref_id.in_(ref_ids)))
+    if rows:
+        connection.execute(_TABLE.insert(), rows)
+
+
+# Write path
+
+def _changed(target, *names: str) -> bool:
+    state = inspect(target)
+    return any(state.attrs[name].history.has_changes() for name in names)
+
+
+def _index_essay(mapper, connection, target):
+    if _changed(target, "prompt"):
+        replace(connection, "essay", [target.id], essay_documents(target.id, target.teacher_id, target.prompt))
+
+
+def _index_submission(mapper, connection, target):
+    # Grading updates the same row many times; only a new text is re-indexed
+    if _changed(target, "text"):
+        teacher_id = connection.execute(select(Essay.teacher_id).where(Essay.id == target.essay_id)).scalar()
+        replace(connection, "submission", [target.id], submission_documents(
+            target.id, target.essay_id, target.student_id, teacher_id, target.text
+        ))
+
+
+def _index_quiz(mapper, connection, target):
+    if _changed(target, "questions"):
+        replace(connection, "question", [target.id], quiz_documents(target.id, target.teacher_id, target.questions))
+
+
+def _unindex(kind: str):
+    def listener(mapper, connection, target):
+        replace(connection, kind, [target.id], [])
+    return listener
+
+
+for _model, _kind, _listener in (
+    (Essay, "essay", _index_essay),
+    (EssaySubmission, "submission", _index_submission),
+    (Quiz, "question", _index_quiz),
+):
+    event.listen(_model, "after_insert", _listener)
+    event.listen(_model, "after_update", _listener)
+    event.listen(_model, "after_delete", _unindex(_kind))
+
+
+def rebuild() -> Dict[str, int]:
+    """Re-index every essay, submission and quiz from scratch, for rows
+    written before the index existed or outside the ORM."""
+    counts = dict.fromkeys(KINDS, 0)
+    db = SessionLocal()
+    try:
+        connection = db.connection()
+        if connection.dialect.name == "postgresql":
+            # Writers wait for the swap instead of indexing into a half-built table
+            connection.execute(text("LOCK TABLE search_documents IN EXCLUSIVE MODE"))
+        connection.execute(_TABLE.delete())
+        sources = (
+            ("essay", select(Essay.id, Essay.teacher_id, Essay.prompt), essay_documents),
+            ("submission", select(EssaySubmission.id, EssaySubmission.essay_id, EssaySubmission.student_id,
+                                  Essay.teacher_id, EssaySubmission.text).join(Essay, Essay.id == EssaySubmission.essay_id),
+             submission_documents),
+            ("question", select(Quiz.id, Quiz.teacher_id, Quiz.questions), quiz_documents),
+        )
+        for kind, query, documents in sources:
+            result = connection.execute(query.execution_options(yield_per=REBUILD_BATCH))
+            for batch in result.partitions():
+                rows = [document for row in batch for document in documents(*row)]
+                if rows:
+                    connection.execute(_TABLE.insert(), rows)
+                counts[kind] += len(rows)
+        db.commit()
+    finally:
+        db.close()
+    return counts
+
+
+# Read path
+
+def _terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())
+
+
+def _fts_available(db: Session) -> bool:
+    return db.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'search_fts'")).first() is not None
+
+
+def _hit(row, rank: float, highlight: str) -> Dict[str, Any]:
+    hit = {"kind": row.kind, "rank": round(float(rank), 6), "highlight": highlight}
+    if row.kind == "essay":
+        hit["essay_id"] = row.ref_id
+    elif row.kind == "submission":
+        hit.update(submission_id=row.ref_id, essay_id=row.parent_id, student_id=row.student_id)
+    else:
+        hit.update(quiz_id=row.ref_id, question_index=row.position)
+    return hit
+
+
+def _postgres(db: Session, teacher_id: int, query: str, kinds, limit: int, offset: int):
+    match = (
+        "FROM search_documents d, websearch_to_tsquery(CAST(:language AS regconfig), :query) AS q(query) "
+        "WHERE d.teacher_id = :teacher_id AND d.kind IN :kinds AND d.document @@ q.query"
+    )
+    # Headlines re-parse the text, so only the page's rows get one
+    page = text(
+        "SELECT page.*, ts_headline(CAST(:language AS regconfig), page.body, page.query, :options) AS highlight "
+        "FROM (SELECT d.id, d.kind, d.ref_id, d.position, d.parent_id, d.student_id, d.body, q.query, "
+        f"ts_rank_cd(d.document, q.query) AS rank {match} "
+        "ORDER BY rank DESC, d.id DESC LIMIT :limit OFFSET :offset) AS page "
+        "ORDER BY page.rank DESC, page.id DESC"
+    ).bindparams(bindparam("kinds", expanding=True))
+    count = text(f"SELECT count(*) {match}").bindparams(bindparam("kinds", expanding=True))
+    params = {"language": settings.SEARCH_LANGUAGE, "query": query, "teacher_id": teacher_id, "kinds": list(kinds)}
+    options = (f"StartSel={MARK_START}, StopSel={MARK_END}, MaxWords={HIGHLIGHT_WORDS}, "
+               f"MinWords={HIGHLIGHT_WORDS // 3}, MaxFragments=2, FragmentDelimiter=\" … \"")
+    rows = db.execute(page, {**params, "options": options, "limit": limit, "offset": offset}).all()
+    return [_hit(row, row.rank, row.highlight) for row in rows], db.execute(count, params).scalar()
+
+
+def _sqlite(db: Session, teacher_id: int, query: str, kinds, limit: int, offset: int):
+    # Every term must match; quoting keeps FTS5 operators in user input literal
+    terms = _terms(query)
+    if not terms:
+        return [], 0
+    match = (
+        "FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid "
+        "WHERE search_fts MATCH :match AND d.teacher_id = :teacher_id AND d.kind IN :kinds"
+    )
+    page = text(
+        "SELECT d.id, d.kind, d.ref_id, d.position, d.parent_id, d.student_id, bm25(search_fts) AS rank, "
+        f"snippet(search_fts, 0, '{MARK_START}', '{MARK_END}', ' … ', {HIGHLIGHT_WORDS}) AS highlight {match} "
+        "ORDER BY rank, d.id DESC LIMIT :limit OFFSET :offset"
+    ).bindparams(bindparam("kinds", expanding=True))
+    count = text(f"SELECT count(*) {match}").bindparams(bindparam("kinds", expanding=True))
+    params = {"match": " ".join(f'"{term}"' for term in terms), "teacher_id": teacher_id, "kinds": list(kinds)}
+    rows = db.execute(page, {**params, "limit": limit, "offset": offset}).all()
+    # bm25() is lower-is-better; flip it so rank reads the same as on Postgres
+    return [_hit(row, -row.rank, row.highlight) for row in rows], db.execute(count, params).scalar()
+
+
+def highlight(body: str, terms: Iterable[str]) -> str:
+    """Window of HIGHLIGHT_WORDS words around the first match, matches marked."""
+    terms = set(terms)
+    words = body.split()
+    normalized = [" ".join(_terms(word)) for word in words]
+    first = next((i for i, word in enumerate(normalized) if any(term in word for term in terms)), 0)
+    start = max(0, first - HIGHLIGHT_WORDS // 3)
+    window = words[start:start + HIGHLIGHT_WORDS]
+    marked = [
+        f"{MARK_START}{word}{MARK_END}" if any(term in normalized[start + i] for term in terms) else word
+        for i, word in enumerate(window)
+    ]
+    return ("… " if start else "") + " ".join(marked) + (" …" if start + HIGHLIGHT_WORDS < len(words) else "")
+
+
+def _scan(db: Session, teacher_id: int, query: str, kinds, limit: int, offset: int):
+    # No inverted index on this database: substring scan of the teacher's documents
+    terms = _terms(query)
+    if not terms:
+        return [], 0
+    filtered = db.query(SearchDocument).filter(SearchDocument.teacher_id == teacher_id, SearchDocument.kind.in_(kinds))
+    for term in terms:
+        filtered = filtered.filter(SearchDocument.body.ilike(f"%{term}%"))
+    rows = filtered.order_by(SearchDocument.id.desc()).offset(offset).limit(limit).all()
+    return [_hit(row, 0, highlight(row.body, terms)) for row in rows], filtered.count()
+
+
+def search(db: Session, teacher_id: int, query: str, kinds: Sequence[str] = KINDS,
+           limit: int = 20, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+    """Ranked matches for `query` among the teacher's documents, and the
+    total match count. Highlights wrap matched words in <mark></mark>; the
+    surrounding text is returned as written (not HTML-escaped)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return _postgres(db, teacher_id, query, kinds, limit, offset)
+    if dialect == "sqlite" and _fts_available(db):
+        return _sqlite(db, teacher_id, query, kinds, limit, offset)
+    return _scan(db, teacher_id, query, kinds, limit, offset)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the full-text search index")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index all essays, submissions and quizzes")
+    args = parser.parse_args()
+    if args.rebuild:
+        print(f"Indexed {rebuild()}")
+    else:
+        parser.print_help()
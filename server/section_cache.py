@@ -0,0 +1,62 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy.exc import IntegrityError
+
+from config import settings
+from database import SessionLocal
+from models import EssaySectionFeedback
+
+
+def key(model_class: str, reasoning_effort: str, max_output_tokens: int,
+        messages: List[Dict[str, str]]) -> str:
+    """Everything that shapes a section's feedback: the model class, its
+    reasoning effort and output budget, and the full prompt, which includes
+    the rubric and the section text."""
+    payload = json.dumps([model_class, reasoning_effort, max_output_tokens, messages], ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def load(keys: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    if not keys:
+        return {}
+    db = SessionLocal()
+    try:
+        rows = db.query(EssaySectionFeedback.key, EssaySectionFeedback.feedback).filter(
+            EssaySectionFeedback.key.in_(set(keys))
+        ).all()
+        return dict(rows)
+    finally:
+        db.close()
+
+
+def store(entries: Dict[str, Dict[str, Any]]):
+    if not entries:
+        return
+    db = SessionLocal()
+    try:
+        existing = {
+            row_key for (row_key,) in db.query(EssaySectionFeedback.key).filter(EssaySectionFeedback.key.in_(list(entries)))
+        }
+        db.add_all(
+            EssaySectionFeedback(key=entry_key, feedback=feedback)
+            for entry_key, feedback in entries.items() if entry_key not in existing
+        )
+        db.commit()
+    except IntegrityError:
+        # Another worker graded the same section at the same time; keep theirs
+        db.rollback()
+    finally:
+        db.close()
+
+
+def purge_expired():
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.ESSAY_SECTION_CACHE_DAYS)
+    db = SessionLocal()
+    try:
+        db.query(EssaySectionFeedback).filter(EssaySectionFeedback.created_at <= cutoff).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
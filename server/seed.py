@@ -1,11 +1,13 @@
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine, Base
-from models import User, Quiz, QuizSubmission, Essay, EssaySubmission
+from models import User, Quiz, QuizSubmission, Essay, EssaySubmission, Class, Enrollment, QuizAssignment, EssayAssignment
 import json
+import migrations
 
 # Recreate tables (careful: drops everything!)
 # Base.metadata.drop_all(bind=engine)
 Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
 def seed_db():
     db: Session = SessionLocal()
@@ -92,6 +94,18 @@ def seed_db():
     db.add_all([essay_sub1, essay_sub2])
     db.commit()
 
+    # --- Class: students see only work assigned to their classes ---
+    class_ = Class(teacher_id=teacher.id, name="Period 1")
+    db.add(class_)
+    db.commit()
+    db.add_all([
+        Enrollment(class_id=class_.id, student_id=student1.id),
+        Enrollment(class_id=class_.id, student_id=student2.id),
+        QuizAssignment(class_id=class_.id, quiz_id=quiz.id),
+        EssayAssignment(class_id=class_.id, essay_id=essay.id),
+    ])
+    db.commit()
+
     db.close()
     print("✅ Database seeded!")
 
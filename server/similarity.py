@@ -0,0 +1,193 @@
+import hashlib
+import random
+import re
+import struct
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import EssayLSHBucket, EssaySignature, EssaySubmission
+
+# 128 hashes in 16 bands of 8 rows: pairs above ~0.7 Jaccard collide in at
+# least one band with high probability, pairs below ~0.5 rarely do.
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed: signatures are persisted, so the permutations must never change
+_rng = random.Random(1729)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def shingles(text: str) -> set:
+    """Hashed word 5-grams of the lower-cased text (whole text if shorter)."""
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) < SHINGLE_SIZE:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    return {
+        int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=4).digest(), "little")
+        for gram in grams
+    }
+
+
+def minhash(text: str) -> List[int]:
+    hashed = shingles(text)
+    if not hashed:
+        return [_MAX_HASH] * NUM_PERM
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashed)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def estimate_similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Estimated Jaccard similarity of the two shingle sets."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def band_buckets(signature: List[int]) -> List[int]:
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(struct.pack(f"<H{ROWS}I", band, *rows), digest_size=8).digest()
+        # Signed 63-bit so it fits a BIGINT column
+        buckets.append(int.from_bytes(digest, "little") >> 1)
+    return buckets
+
+
+def _pack(signature: List[int]) -> bytes:
+    return array("I", signature).tobytes()
+
+
+def _unpack(data: bytes) -> List[int]:
+    values = array("I")
+    values.frombytes(data)
+    return values.tolist()
+
+
+# Index maintenance
+def index_submission(db: Session, submission: EssaySubmission) -> List[int]:
+    """Add (or refresh) a submission in the index; caller commits."""
+    signature = minhash(submission.text)
+    db.query(EssayLSHBucket).filter(EssayLSHBucket.submission_id == submission.id).delete()
+    db.merge(EssaySignature(
+        submission_id=submission.id,
+        essay_id=submission.essay_id,
+        signature=_pack(signature)
+    ))
+    db.add_all([
+        EssayLSHBucket(bucket=bucket, submission_id=submission.id)
+        for bucket in band_buckets(signature)
+    ])
+    return signature
+
+
+def _signature_for(db: Session, submission: EssaySubmission) -> List[int]:
+    row = db.query(EssaySignature).filter(EssaySignature.submission_id == submission.id).first()
+    if row:
+        return _unpack(row.signature)
+    signature = index_submission(db, submission)
+    db.commit()
+    return signature
+
+
+def find_similar(
+    db: Session,
+    submission: EssaySubmission,
+    threshold: float,
+    essay_ids: Optional[List[int]] = None
+) -> List[Tuple[int, float]]:
+    """(submission_id, similarity) of indexed submissions sharing an LSH
+    bucket with `submission` and at or above `threshold`, most similar first.
+    Only colliding candidates are loaded, never the whole corpus."""
+    signature = _signature_for(db, submission)
+    candidates = db.query(EssayLSHBucket.submission_id).filter(
+        EssayLSHBucket.bucket.in_(band_buckets(signature)),
+        EssayLSHBucket.submission_id != submission.id
+    ).distinct()
+
+    query = db.query(EssaySignature).filter(EssaySignature.submission_id.in_(candidates))
+    if essay_ids is not None:
+        query = query.filter(EssaySignature.essay_id.in_(essay_ids))
+
+    matches = []
+    for row in query:
+        score = estimate_similarity(signature, _unpack(row.signature))
+        if score >= threshold:
+            matches.append((row.submission_id, score))
+    matches.sort(key=lambda match: match[1], reverse=True)
+    return matches
+
+
+def find_reusable_feedback(db: Session, submission: EssaySubmission) -> Optional[Dict]:
+    """Feedback from an already graded, near-identical submission to the same
+    essay (so the same rubric), or None."""
+    if settings.DUPLICATE_REUSE_THRESHOLD > 1:
+        return None
+    matches = find_similar(db, submission, settings.DUPLICATE_REUSE_THRESHOLD, [submission.essay_id])
+    if not matches:
+        return None
+
+    graded = {
+        sub.id: sub for sub in db.query(EssaySubmission).filter(
+            EssaySubmission.id.in_([submission_id for submission_id, _ in matches]),
+            EssaySubmission.ai_feedback.isnot(None)
+        )
+    }
+    for submission_id, score in matches:
+        match = graded.get(submission_id)
+        if match and "error" not in match.ai_feedback:
+            return {
+                **match.ai_feedback,
+                "reused_from_submission": match.id,
+                "similarity": round(score, 3),
+            }
+    return None
+
+
+def similarity_report(db: Session, essay_id: int, threshold: float) -> List[Dict]:
+    """Near-duplicate pairs among one essay's submissions."""
+    submissions = db.query(EssaySubmission).filter(EssaySubmission.essay_id == essay_id).all()
+    by_id = {sub.id: sub for sub in submissions}
+
+    # Index anything submitted before the index existed
+    indexed = {
+        submission_id for (submission_id,) in db.query(EssaySignature.submission_id).filter(
+            EssaySignature.essay_id == essay_id
+        )
+    }
+    missing = [sub for sub in submissions if sub.id not in indexed]
+    for sub in missing:
+        index_submission(db, sub)
+    if missing:
+        db.commit()
+
+    pairs, seen = [], set()
+    for sub in submissions:
+        for other_id, score in find_similar(db, sub, threshold, [essay_id]):
+            key = (min(sub.id, other_id), max(sub.id, other_id))
+            if key in seen:
+                continue
+            seen.add(key)
+            other = by_id[other_id]
+            pairs.append({
+                "submission_id": sub.id,
+                "student_id": sub.student_id,
+                "matched_submission_id": other.id,
+                "matched_student_id": other.student_id,
+                "similarity": round(score, 3),
+                "same_student": sub.student_id == other.student_id,
+            })
+    pairs.sort(key=lambda pair: pair["similarity"], reverse=True)
+    return pairs
@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+
+# A throwaway SQLite file and a local fake LLM; set before the app modules import
+os.environ["DATABASE__URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ["LLM_PROVIDERS"] = "fake:local?latency_ms=300"
+os.environ["LLM_CLASS_PROVIDERS"] = ""
+os.environ["RATE_LIMIT_LLM"] = "0"
+os.environ.setdefault("GROQ_API_KEY", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import itertools
+
+import pytest
+from fastapi.testclient import TestClient
+
+import auth
+import main
+import models
+from database import SessionLocal
+
+_user_ids = itertools.count()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    """Users are detached once created, so requests can use them as the current user."""
+    def make(role: str = "student") -> models.User:
+        n = f"{role}-{next(_user_ids)}-{id(db)}"
+        user = models.User(firebase_uid=n, email=f"{n}@example.com", name=n, role=role)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        return user
+    return make
+
+
+@pytest.fixture
+def login(monkeypatch):
+    """Send the following requests as `user` (Firebase is bypassed)."""
+    def login_as(user: models.User):
+        monkeypatch.setitem(main.app.dependency_overrides, auth.get_current_user, lambda: user)
+    return login_as
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import lifecycle
+import main
+import models
+from config import settings
+
+
+@pytest.fixture
+def submission(db, make_user, login):
+    teacher, student = make_user("teacher"), make_user("student")
+    essay = models.Essay(teacher_id=teacher.id, prompt="Describe a river", rubric={"clarity": 10})
+    db.add(essay)
+    db.flush()
+    sub = models.EssaySubmission(essay_id=essay.id, student_id=student.id, text="The river runs to the sea. " * 20)
+    db.add(sub)
+    db.commit()
+    login(teacher)
+    return essay.id, sub.id
+
+
+async def _wait_for_grading(timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if lifecycle.in_flight_counts().get("essay_grading"):
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+def test_grading_over_capacity_answers_503(submission, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_IN_FLIGHT", 1)
+    essay_id, submission_id = submission
+    url = f"/essays/{essay_id}/feedback?submission_id={submission_id}"
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = asyncio.create_task(client.post(url))
+            # The loop must stay free while the first grading runs
+            assert await _wait_for_grading()
+            second = await client.post(url)
+            return await first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.status_code == 200
+    assert second.status_code == 503
+    assert second.headers["Retry-After"] == str(settings.LLM_RETRY_AFTER_SECONDS)
+
+
+def test_grading_under_capacity_is_admitted(submission, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_IN_FLIGHT", 2)
+    essay_id, submission_id = submission
+    url = f"/essays/{essay_id}/feedback?submission_id={submission_id}"
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(client.post(url), client.post(url))
+
+    assert [response.status_code for response in asyncio.run(scenario())] == [200, 200]
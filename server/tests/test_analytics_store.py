@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import analytics_store
+import models
+from config import settings
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    """Change feed and columnar reads on, with a fresh store directory."""
+    monkeypatch.setattr(settings, "ANALYTICS_CHANGE_FEED", True)
+    monkeypatch.setattr(settings, "ANALYTICS_READS", True)
+    monkeypatch.setattr(settings, "ANALYTICS_STORE_DIR", str(tmp_path))
+    event.listen(Session, "do_orm_execute", analytics_store._record_bulk_write)
+    yield
+    event.remove(Session, "do_orm_execute", analytics_store._record_bulk_write)
+
+
+@pytest.fixture
+def graded(db, make_user):
+    teacher, student = make_user("teacher"), make_user()
+    quiz = models.Quiz(teacher_id=teacher.id, title="Q", questions=[])
+    db.add(quiz)
+    db.flush()
+    submissions = [models.QuizSubmission(quiz_id=quiz.id, student_id=student.id, answers={}, score=score)
+                   for score in (40, 60)]
+    db.add_all(submissions)
+    db.commit()
+    return teacher, quiz, [submission.id for submission in submissions]
+
+
+def test_bulk_delete_reaches_the_outbox(db, store, graded):
+    _, quiz, ids = graded
+    db.query(models.QuizSubmission).filter(models.QuizSubmission.quiz_id == quiz.id).delete(synchronize_session=False)
+    db.commit()
+    queued = db.query(models.SubmissionChange.row_id).filter(
+        models.SubmissionChange.table_name == "quiz_submissions", models.SubmissionChange.row_id.in_(ids)
+    )
+    assert sorted(row_id for (row_id,) in queued) == ids
+
+
+def test_sync_drops_bulk_deleted_rows(db, store, graded):
+    teacher, quiz, _ = graded
+    analytics_store.sync_once()
+    rows, total = analytics_store.snapshot().student_analytics(teacher.id)
+    assert total == 1 and rows[0]["overall_score"] == 50
+
+    db.query(models.QuizSubmission).filter(models.QuizSubmission.quiz_id == quiz.id).delete(synchronize_session=False)
+    db.commit()
+    assert analytics_store.sync_once()["applied"] >= 2
+    assert analytics_store.snapshot().student_analytics(teacher.id) == ([], 0)
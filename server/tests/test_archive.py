@@ -0,0 +1,51 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+import archive
+import models
+from config import settings
+
+pytest.importorskip("pyarrow")
+
+TERM = datetime(2020, 3, 10, 9, 30, tzinfo=timezone.utc)
+
+
+def test_archived_term_round_trips(db, make_user, client, login, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path))
+    teacher, student = make_user("teacher"), make_user()
+    quiz = models.Quiz(teacher_id=teacher.id, title="Old term", questions=[])
+    essay = models.Essay(teacher_id=teacher.id, prompt="Old prompt", rubric={})
+    db.add_all([quiz, essay])
+    db.flush()
+    old_quiz = models.QuizSubmission(quiz_id=quiz.id, student_id=student.id, answers={"0": 2}, score=75, submitted_at=TERM)
+    old_essay = models.EssaySubmission(essay_id=essay.id, student_id=student.id, text="Archived essay text.",
+                                       ai_feedback={"overall_score": 64}, score=64, submitted_at=TERM)
+    current = models.QuizSubmission(quiz_id=quiz.id, student_id=student.id, answers={"0": 1}, score=90)
+    db.add_all([old_quiz, old_essay, current])
+    db.commit()
+    old_quiz_id, old_essay_id = old_quiz.id, old_essay.id
+
+    archived = archive.archive_before(date(2020, 4, 1))
+    assert {(entry["table"], entry["rows"]) for entry in archived} == {("quiz_submissions", 1), ("essay_submissions", 1)}
+    # Re-running skips spans that are already archived
+    assert archive.archive_before(date(2020, 4, 1)) == []
+
+    db.expire_all()
+    assert db.get(models.QuizSubmission, old_quiz_id) is None
+    assert db.get(models.EssaySubmission, old_essay_id) is None
+    assert db.query(models.SearchDocument).filter(
+        models.SearchDocument.kind == "submission", models.SearchDocument.ref_id == old_essay_id
+    ).count() == 0
+
+    quiz_row, = archive.archived_rows(db, "quiz_submissions", student.id)
+    assert (quiz_row["id"], quiz_row["answers"], quiz_row["score"]) == (old_quiz_id, {"0": 2}, 75)
+    assert quiz_row["submitted_at"] == TERM
+    essay_row, = archive.archived_rows(db, "essay_submissions", student.id, columns=["id", "ai_feedback"])
+    assert essay_row["ai_feedback"] == {"overall_score": 64}
+
+    login(student)
+    live = client.get("/student/submissions/quizzes").json()
+    assert [row["id"] for row in live] == [current.id]
+    everything = client.get("/student/submissions/quizzes", params={"include_archived": True}).json()
+    assert [row["id"] for row in everything] == [old_quiz_id, current.id]
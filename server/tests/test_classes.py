@@ -0,0 +1,88 @@
+import pytest
+
+import classes
+import migrations
+import models
+from database import engine
+
+QUESTIONS = [{"question_text": "2 + 2?", "options": ["3", "4"], "correct_answer": 1}]
+
+
+@pytest.fixture
+def school(db, make_user):
+    """A teacher with one class; `enrolled` is in it, `outsider` is not. The
+    class has one quiz and one essay assigned; one more of each is unassigned."""
+    teacher, enrolled, outsider = make_user("teacher"), make_user(), make_user()
+    class_ = models.Class(teacher_id=teacher.id, name="Period 1")
+    quiz, loose_quiz = (models.Quiz(teacher_id=teacher.id, title=t, questions=QUESTIONS) for t in ("Assigned", "Loose"))
+    essay, loose_essay = (models.Essay(teacher_id=teacher.id, prompt=p, rubric={"clarity": 5}) for p in ("Assigned", "Loose"))
+    db.add_all([class_, quiz, loose_quiz, essay, loose_essay])
+    db.flush()
+    db.add_all([
+        models.Enrollment(class_id=class_.id, student_id=enrolled.id),
+        models.QuizAssignment(class_id=class_.id, quiz_id=quiz.id),
+        models.EssayAssignment(class_id=class_.id, essay_id=essay.id),
+    ])
+    db.commit()
+    return {"teacher": teacher, "enrolled": enrolled, "outsider": outsider, "quiz": quiz.id,
+            "loose_quiz": loose_quiz.id, "essay": essay.id, "loose_essay": loose_essay.id}
+
+
+def test_pending_lists_only_hold_work_of_enrolled_classes(db, school):
+    assert [q.id for q in classes.pending_quizzes(db, school["enrolled"].id)] == [school["quiz"]]
+    assert [e.id for e in classes.pending_essays(db, school["enrolled"].id)] == [school["essay"]]
+    assert classes.pending_quizzes(db, school["outsider"].id) == []
+    assert classes.pending_essays(db, school["outsider"].id) == []
+
+
+def test_unassigned_work_is_not_visible(db, school):
+    for student in (school["enrolled"], school["outsider"]):
+        assert not classes.quiz_visible(db, student.id, school["loose_quiz"])
+        assert not classes.essay_visible(db, student.id, school["loose_essay"])
+    assert classes.quiz_visible(db, school["enrolled"].id, school["quiz"])
+    assert classes.essay_visible(db, school["enrolled"].id, school["essay"])
+
+
+def test_submitted_work_leaves_the_pending_list(db, school):
+    db.add(models.QuizSubmission(quiz_id=school["quiz"], student_id=school["enrolled"].id, answers={"0": 1}, score=100))
+    db.commit()
+    assert classes.pending_quizzes(db, school["enrolled"].id) == []
+
+
+def test_quiz_access_requires_enrollment(client, login, school):
+    login(school["outsider"])
+    assert client.get(f"/quizzes/{school['quiz']}").status_code == 404
+    assert client.post(f"/quizzes/{school['quiz']}/submit", json={"answers": {"0": 1}}).status_code == 404
+    assert client.post(f"/essays/{school['essay']}/submit?wait_for_feedback=false",
+                       json={"text": "An essay."}).status_code == 404
+
+    login(school["enrolled"])
+    quiz = client.get(f"/quizzes/{school['quiz']}")
+    assert quiz.status_code == 200
+    assert "correct_answer" not in quiz.json()["questions"][0]
+    assert client.get(f"/quizzes/{school['loose_quiz']}").status_code == 404
+    assert client.post(f"/quizzes/{school['quiz']}/submit", json={"answers": {"0": 1}}).status_code == 200
+
+    # The owner always sees the full quiz
+    login(school["teacher"])
+    assert client.get(f"/quizzes/{school['loose_quiz']}").json()["questions"][0]["correct_answer"] == 1
+
+
+def test_default_classes_adopts_legacy_work(db, make_user):
+    teacher, submitter, bystander = make_user("teacher"), make_user(), make_user()
+    quiz = models.Quiz(teacher_id=teacher.id, title="Legacy", questions=QUESTIONS)
+    essay = models.Essay(teacher_id=teacher.id, prompt="Legacy", rubric={"clarity": 5})
+    db.add_all([quiz, essay])
+    db.flush()
+    db.add(models.QuizSubmission(quiz_id=quiz.id, student_id=submitter.id, answers={"0": 1}, score=100))
+    db.commit()
+
+    with engine.begin() as connection:
+        migrations.default_classes(connection)
+
+    class_ = db.query(models.Class).filter(models.Class.teacher_id == teacher.id).one()
+    assert class_.name == migrations.DEFAULT_CLASS_NAME
+    assert [e.student_id for e in class_.enrollments] == [submitter.id]
+    assert classes.essay_visible(db, submitter.id, essay.id)
+    assert classes.quiz_visible(db, submitter.id, quiz.id)
+    assert not classes.essay_visible(db, bystander.id, essay.id)
@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import event
+
+import events
+import models
+from database import engine
+
+
+@pytest.fixture
+def published(monkeypatch):
+    sent = []
+    monkeypatch.setattr(events, "publish", lambda teacher_id, event: sent.append((teacher_id, event)))
+    return sent
+
+
+@pytest.fixture
+def statements():
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement.lower())
+    event.listen(engine, "before_cursor_execute", record)
+    yield seen
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def test_quiz_submit_publishes_a_delta_without_aggregating(db, make_user, login, client, published, statements):
+    teacher, student = make_user("teacher"), make_user()
+    quiz = models.Quiz(teacher_id=teacher.id, title="Q", questions=[{"question_text": "?", "options": ["a", "b"], "correct_answer": 1}])
+    class_ = models.Class(teacher_id=teacher.id, name="C")
+    db.add_all([quiz, class_])
+    db.flush()
+    db.add_all([models.QuizAssignment(class_id=class_.id, quiz_id=quiz.id),
+                models.Enrollment(class_id=class_.id, student_id=student.id)])
+    db.commit()
+
+    login(student)
+    response = client.post(f"/quizzes/{quiz.id}/submit", json={"answers": {"0": 1}})
+    assert response.status_code == 200
+    assert published == [(teacher.id, {
+        "type": "quiz_submission", "quiz_id": quiz.id, "submission_id": response.json()["id"],
+        "student_id": student.id, "score": 100,
+    })]
+    assert not [s for s in statements if "avg(" in s]
+
+
+def test_regrade_reports_the_replaced_score(db, make_user, login, client, published):
+    teacher, student = make_user("teacher"), make_user()
+    essay = models.Essay(teacher_id=teacher.id, prompt="Rivers", rubric={"clarity": 10})
+    db.add(essay)
+    db.flush()
+    submission = models.EssaySubmission(essay_id=essay.id, student_id=student.id, text="Rivers flow. " * 30, score=55)
+    db.add(submission)
+    db.commit()
+
+    login(teacher)
+    assert client.post(f"/essays/{essay.id}/feedback?submission_id={submission.id}").status_code == 200
+    (teacher_id, delta), = published
+    assert teacher_id == teacher.id
+    assert delta["type"] == "essay_graded" and delta["previous_score"] == 55
+    assert delta["score"] is not None
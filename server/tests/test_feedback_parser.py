@@ -0,0 +1,46 @@
+import pytest
+
+from feedback_parser import extract_json, parse_feedback
+
+
+def test_valid_json_is_direct():
+    assert extract_json('{"grammar_score": 80}') == ({"grammar_score": 80}, "direct")
+
+
+def test_curly_quotes_inside_values_survive_a_fence():
+    text = '```json\n{"strengths": ["Uses the quote “to be or not”"], "grammar_score": 80}\n```'
+    data, outcome = extract_json(text)
+    assert outcome == "repaired"
+    assert data == {"strengths": ["Uses the quote “to be or not”"], "grammar_score": 80}
+
+
+def test_curly_quotes_used_as_delimiters_are_straightened():
+    text = 'Here you go: {“strengths”: [“Cites ‘Hamlet’ well”, "Quotes “to be”"], “grammar_score”: 75}'
+    data, outcome = extract_json(text)
+    assert outcome == "repaired"
+    assert data == {"strengths": ["Cites ‘Hamlet’ well", "Quotes “to be”"], "grammar_score": 75}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"grammar_score": 80, "strengths": ["a", "b",],}', {"grammar_score": 80, "strengths": ["a", "b"]}),
+    ('Sure! {"grammar_score": 80, "strengths": ["clear"', {"grammar_score": 80, "strengths": ["clear"]}),
+    ("{'grammar_score': 80, 'passed': True}", {"grammar_score": 80, "passed": True}),
+    ('{"summary": "ends with \\"quote\\"", "grammar_score": 1} trailing', {"summary": 'ends with "quote"', "grammar_score": 1}),
+])
+def test_repairs(text, expected):
+    assert extract_json(text) == (expected, "repaired")
+
+
+@pytest.mark.parametrize("text", ["", "no json here", "{not: json at all"])
+def test_unusable(text):
+    assert extract_json(text) == (None, "unusable")
+
+
+def test_parse_feedback_keeps_quoted_text_and_clamps_rubric_scores():
+    text = ('```json\n{"overall_score": 82, "grammar_score": 80, "clarity_score": 78, "structure_score": 85, '
+            '"strengths": ["Quotes “the road not taken” aptly"], "improvements": ["Vary sentences"], '
+            '"rubric_scores": {"clarity": 12, "unknown": 3}}\n```')
+    feedback, outcome = parse_feedback(text, rubric={"clarity": 10})
+    assert outcome == "repaired"
+    assert feedback.strengths == ["Quotes “the road not taken” aptly"]
+    assert feedback.rubric_scores == {"clarity": 10.0}
@@ -0,0 +1,36 @@
+import feedback_themes
+import models
+
+
+def _themes(db, teacher_id):
+    return {row.label: row.count for row in db.query(models.FeedbackTheme).filter(
+        models.FeedbackTheme.teacher_id == teacher_id,
+        models.FeedbackTheme.essay_id.is_(None),
+        models.FeedbackTheme.kind == "strength"
+    )}
+
+
+def test_similar_phrases_share_a_theme(db, make_user):
+    teacher = make_user("teacher")
+    feedback_themes._apply_phrases(db, teacher.id, None, "strength", ["Clear thesis statement"], 1)
+    feedback_themes._apply_phrases(db, teacher.id, None, "strength", ["A clear thesis statement!"], 1)
+    db.commit()
+    assert _themes(db, teacher.id) == {"Clear thesis statement": 2}
+
+
+def test_one_off_themes_are_pruned_at_the_cap(db, make_user, monkeypatch):
+    monkeypatch.setattr(feedback_themes, "MAX_CLUSTERS", 3)
+    teacher = make_user("teacher")
+    apply = lambda phrases: feedback_themes._apply_phrases(db, teacher.id, None, "strength", phrases, 1)
+    apply(["Vivid imagery", "Strong evidence"])
+    apply(["Vivid imagery", "Careful citations"])
+    # At the cap: the one-off themes make room for the new phrases
+    apply(["Varied sentence length", "Good counterargument handling"])
+    db.commit()
+    assert _themes(db, teacher.id) == {"Vivid imagery": 2, "Varied sentence length": 1, "Good counterargument handling": 1}
+
+    # Recurring themes fill the cap: the new phrase is not tracked
+    apply(["Varied sentence length", "Good counterargument handling"])
+    apply(["Concise conclusion"])
+    db.commit()
+    assert _themes(db, teacher.id) == {"Vivid imagery": 2, "Varied sentence length": 2, "Good counterargument handling": 2}
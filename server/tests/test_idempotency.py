@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+import pytest
+
+import idempotency
+import models
+import routers
+
+QUESTIONS = [{"question_text": "2 + 2?", "options": ["3", "4"], "correct_answer": 1}]
+
+
+@pytest.fixture
+def student(make_user, login):
+    student = make_user()
+    login(student)
+    return student
+
+
+@pytest.fixture
+def quiz(db, make_user, student):
+    """A quiz assigned to `student`'s class."""
+    teacher = make_user("teacher")
+    quiz = models.Quiz(teacher_id=teacher.id, title="Q", questions=QUESTIONS)
+    class_ = models.Class(teacher_id=teacher.id, name="C")
+    db.add_all([quiz, class_])
+    db.flush()
+    db.add_all([models.QuizAssignment(class_id=class_.id, quiz_id=quiz.id),
+                models.Enrollment(class_id=class_.id, student_id=student.id)])
+    db.commit()
+    return quiz.id
+
+
+def _submit(client, quiz_id, key, answer=1):
+    return client.post(f"/quizzes/{quiz_id}/submit", json={"answers": {"0": answer}}, headers={"Idempotency-Key": key})
+
+
+def _submissions(db, quiz_id):
+    return db.query(models.QuizSubmission).filter(models.QuizSubmission.quiz_id == quiz_id).count()
+
+
+def test_retry_replays_the_first_response(db, client, quiz):
+    first = _submit(client, quiz, "retry")
+    second = _submit(client, quiz, "retry")
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert _submissions(db, quiz) == 1
+
+
+def test_reused_key_with_another_body_is_rejected(client, quiz):
+    assert _submit(client, quiz, "reused").status_code == 200
+    assert _submit(client, quiz, "reused", answer=0).status_code == 422
+
+
+def test_in_flight_key_asks_to_retry_later(db, client, quiz, student):
+    # Claimed by a request that hasn't completed yet
+    assert idempotency.claim(db, student.id, "busy", f"quiz:{quiz}", {"answers": {"0": 1}}) is not None
+    response = _submit(client, quiz, "busy")
+    assert response.status_code == 409
+    assert response.headers["Retry-After"] == "2"
+
+
+def test_failed_request_releases_its_key(db, client, quiz, monkeypatch):
+    create = routers.create_quiz_submission
+
+    def fail_once(*args):
+        monkeypatch.setattr(routers, "create_quiz_submission", create)
+        raise RuntimeError("database went away")
+    monkeypatch.setattr(routers, "create_quiz_submission", fail_once)
+    with pytest.raises(RuntimeError):
+        _submit(client, quiz, "flaky")
+    response = _submit(client, quiz, "flaky")
+    assert response.status_code == 200 and "Idempotent-Replayed" not in response.headers
+    assert _submissions(db, quiz) == 1
+
+
+def test_expired_key_runs_again(db, client, quiz):
+    assert _submit(client, quiz, "old").status_code == 200
+    db.query(models.IdempotencyKey).filter(models.IdempotencyKey.key == "old").update(
+        {models.IdempotencyKey.expires_at: idempotency._now() - timedelta(seconds=1)}
+    )
+    db.commit()
+    response = _submit(client, quiz, "old")
+    assert response.status_code == 200 and "Idempotent-Replayed" not in response.headers
+    assert _submissions(db, quiz) == 2
@@ -0,0 +1,72 @@
+import pytest
+
+import section_cache
+from ai_feedback import ai_feedback_service
+from config import settings
+from text_metrics import compute_metrics
+
+RUBRIC = {"clarity": 10, "evidence": 10}
+PROMPT = "Discuss how rivers shape cities, covering trade, flooding and bridges."
+
+
+def _essay(revised: int = -1, seed: str = "") -> str:
+    paragraphs = []
+    for i in range(12):
+        words = " ".join(f"{seed}word{i}x{j}" for j in range(60))
+        text = f"Paragraph {i} about rivers and trade. {words}."
+        paragraphs.append(text + " Revised with a new closing line." if i == revised else text)
+    return "\n\n".join(paragraphs)
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    calls = []
+    complete = ai_feedback_service._complete
+
+    def counting(essay_prompt, index, decision):
+        calls.append(index)
+        return complete(essay_prompt, index, decision)
+    monkeypatch.setattr(ai_feedback_service, "_complete", counting)
+    monkeypatch.setattr(settings, "ESSAY_INCREMENTAL_GRADING", True)
+    return calls
+
+
+def _grade(text: str, revision: bool):
+    return ai_feedback_service._generate_essay_feedback(text, RUBRIC, compute_metrics(text, PROMPT, RUBRIC), revision=revision)
+
+
+def test_first_submission_is_graded_whole(llm_calls):
+    feedback = _grade(_essay(seed="first"), revision=False)
+    assert llm_calls == [0]
+    assert "sections_reused" not in feedback
+
+
+def test_revision_regrades_only_changed_sections(llm_calls):
+    first = _grade(_essay(seed="rev"), revision=True)
+    sections = first["chunks"]
+    assert sections > 2 and first["sections_reused"] == 0
+    assert len(llm_calls) == sections
+
+    llm_calls.clear()
+    second = _grade(_essay(revised=11, seed="rev"), revision=True)
+    assert len(llm_calls) == second["chunks"] - second["sections_reused"]
+    assert second["sections_reused"] >= sections - 2
+
+
+def test_sectioned_feedback_uses_whole_essay_keyword_coverage(llm_calls):
+    text = _essay(seed="kw")
+    metrics = compute_metrics(text, PROMPT, RUBRIC)
+    feedback = ai_feedback_service._generate_essay_feedback(text, RUBRIC, metrics, revision=True)
+    assert feedback["sections_reused"] == 0
+    assert feedback["keyword_usage_score"] == round(100 * metrics["keyword_coverage"])
+    if metrics["keywords_missing"]:
+        assert feedback["suggestions"][0].startswith("Consider addressing:")
+
+
+def test_cache_key_covers_generation_parameters():
+    messages = [{"role": "user", "content": "section"}]
+    base = section_cache.key("small", "low", 1000, messages)
+    assert base == section_cache.key("small", "low", 1000, messages)
+    assert base != section_cache.key("small", "medium", 1000, messages)
+    assert base != section_cache.key("small", "low", 2000, messages)
+    assert base != section_cache.key("large", "low", 1000, messages)
@@ -0,0 +1,78 @@
+import pytest
+
+import models
+import search
+
+QUESTIONS = [{"question_text": "Which gas do plants absorb during photosynthesis?",
+              "options": ["Oxygen", "Carbon dioxide"], "correct_answer": 1}]
+
+
+@pytest.fixture
+def material(db, make_user):
+    """A teacher's essay prompt, one submission to it and a quiz."""
+    teacher, student = make_user("teacher"), make_user()
+    essay = models.Essay(teacher_id=teacher.id, prompt="Explain how photosynthesis feeds a forest.", rubric={})
+    quiz = models.Quiz(teacher_id=teacher.id, title="Plants", questions=QUESTIONS)
+    db.add_all([essay, quiz])
+    db.flush()
+    submission = models.EssaySubmission(essay_id=essay.id, student_id=student.id,
+                                        text="Leaves turn sunlight and carbon dioxide into sugar.")
+    db.add(submission)
+    db.commit()
+    return {"teacher": teacher, "student": student, "essay": essay, "quiz": quiz, "submission": submission}
+
+
+def _refs(db, teacher, query, kinds=search.KINDS):
+    hits, total = search.search(db, teacher.id, query, kinds)
+    assert total == len(hits)
+    return sorted((hit["kind"], hit.get("essay_id") or hit.get("quiz_id")) for hit in hits)
+
+
+def test_writes_are_indexed_per_teacher(db, make_user, material):
+    essay, quiz = material["essay"], material["quiz"]
+    assert _refs(db, material["teacher"], "photosynthesis") == [("essay", essay.id), ("question", quiz.id)]
+    assert _refs(db, material["teacher"], "carbon dioxide") == [("question", quiz.id), ("submission", essay.id)]
+    assert _refs(db, make_user("teacher"), "photosynthesis") == []
+
+
+def test_index_follows_updates_and_deletes(db, material):
+    essay, quiz, teacher = material["essay"], material["quiz"], material["teacher"]
+    essay.prompt = "Describe the water cycle."
+    db.delete(quiz)
+    db.commit()
+    assert _refs(db, teacher, "photosynthesis") == []
+    assert _refs(db, teacher, "water cycle") == [("essay", essay.id)]
+
+
+def test_grading_does_not_reindex_the_submission(db, material):
+    submission = material["submission"]
+    before = db.query(models.SearchDocument.id).filter(
+        models.SearchDocument.kind == "submission", models.SearchDocument.ref_id == submission.id
+    ).scalar()
+    submission.score = 90
+    submission.ai_feedback = {"overall_score": 90}
+    db.commit()
+    after = db.query(models.SearchDocument.id).filter(
+        models.SearchDocument.kind == "submission", models.SearchDocument.ref_id == submission.id
+    ).scalar()
+    assert before is not None and after == before
+
+
+def test_rebuild_restores_documents_written_outside_the_orm(db, material):
+    db.execute(models.SearchDocument.__table__.delete())
+    db.commit()
+    assert _refs(db, material["teacher"], "photosynthesis") == []
+    search.rebuild()
+    assert len(_refs(db, material["teacher"], "photosynthesis")) == 2
+
+
+def test_search_endpoint_highlights_and_filters_by_kind(client, login, material):
+    login(material["teacher"])
+    response = client.get("/teacher/search", params={"q": "sunlight", "kind": "submission"})
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "1"
+    hit, = response.json()
+    assert hit["submission_id"] == material["submission"].id
+    assert hit["student_id"] == material["student"].id
+    assert "<mark>sunlight</mark>" in hit["highlight"]
+    assert client.get("/teacher/search", params={"q": "sunlight", "kind": "grades"}).status_code == 400
@@ -0,0 +1,167 @@
+import json
+import math
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from prompt_builder import MAX_LIST_ITEMS
+
+_WORD_RE = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?")
+_SENTENCE_END_RE = re.compile(r"[.!?]+(?=\s|$)")
+_VOWEL_GROUP_RE = re.compile(r"[aeiouy]+")
+
+STOPWORDS = frozenset("""
+a about above after again against all also an and any are as at be because been before being
+below between both but by can could did do does doing down during each essay explain few for
+from further had has have having he her here hers him his how i if in into is it its itself
+just me more most my no nor not now of off on once only or other our out over own same she
+should so some such than that the their them then there these they this those through to too
+under until up very was we were what when where which while who whom why will with would write
+you your discuss describe answer paragraph words demonstrate show use include provide
+""".split())
+
+MAX_KEYWORDS = 25
+
+
+def stem(word: str) -> str:
+    # Crude suffix stripping, enough to match "impacts"/"impacted" to "impact"
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+def _syllables(word: str) -> int:
+    word = word.lower()
+    count = len(_VOWEL_GROUP_RE.findall(word))
+    if word.endswith("e") and not word.endswith("le") and count > 1:
+        count -= 1
+    return max(1, count)
+
+
+def _rubric_text(rubric: Any) -> List[str]:
+    # Criterion descriptions and explicit keyword lists, not criterion names
+    texts = []
+    if isinstance(rubric, dict):
+        for value in rubric.values():
+            texts.extend(_rubric_text(value))
+    elif isinstance(rubric, list):
+        for value in rubric:
+            texts.extend(_rubric_text(value))
+    elif isinstance(rubric, str):
+        texts.append(rubric)
+    return texts
+
+
+@lru_cache(maxsize=1024)
+def _keywords(prompt: str, rubric_json: str) -> Tuple[str, ...]:
+    texts = [prompt] + _rubric_text(json.loads(rubric_json))
+    keywords = []
+    for text in texts:
+        for word in _WORD_RE.findall(text.lower()):
+            if len(word) > 2 and word not in STOPWORDS and stem(word) not in STOPWORDS and word not in keywords:
+                keywords.append(word)
+    return tuple(keywords[:MAX_KEYWORDS])
+
+
+def essay_keywords(prompt: str, rubric: Any) -> List[str]:
+    """Content words from the essay prompt and rubric descriptions."""
+    return list(_keywords(prompt or "", json.dumps(rubric or {}, sort_keys=True, default=str)))
+
+
+def compute_metrics(text: str, prompt: str = "", rubric: Any = None) -> Dict[str, Any]:
+    """Deterministic text statistics for an essay; pure Python, no I/O."""
+    text = text or ""
+    words = _WORD_RE.findall(text)
+    word_count = len(words)
+    sentence_count = max(1, len(_SENTENCE_END_RE.findall(text))) if word_count else 0
+    paragraph_count = len([p for p in re.split(r"\n\s*\n", text) if p.strip()])
+    syllable_count = sum(_syllables(word) for word in words)
+    lowered = [word.lower() for word in words]
+    unique_words = len(set(lowered))
+
+    words_per_sentence = word_count / sentence_count if sentence_count else 0.0
+    syllables_per_word = syllable_count / word_count if word_count else 0.0
+    if word_count:
+        reading_ease = 206.835 - 1.015 * words_per_sentence - 84.6 * syllables_per_word
+        grade_level = 0.39 * words_per_sentence + 11.8 * syllables_per_word - 15.59
+    else:
+        reading_ease = grade_level = 0.0
+
+    keywords = essay_keywords(prompt, rubric)
+    stems = {stem(word) for word in lowered}
+    matched = [keyword for keyword in keywords if stem(keyword) in stems]
+    missing = [keyword for keyword in keywords if keyword not in matched]
+
+    return {
+        "word_count": word_count,
+        "char_count": len(text),
+        "sentence_count": sentence_count,
+        "paragraph_count": paragraph_count,
+        "avg_sentence_length": round(words_per_sentence, 1),
+        "avg_word_length": round(sum(len(w) for w in words) / word_count, 2) if word_count else 0.0,
+        "flesch_reading_ease": round(reading_ease, 1),
+        "flesch_kincaid_grade": round(grade_level, 1),
+        # Type-token ratio falls with length; root TTR is comparable across lengths
+        "type_token_ratio": round(unique_words / word_count, 3) if word_count else 0.0,
+        "root_type_token_ratio": round(unique_words / math.sqrt(word_count), 2) if word_count else 0.0,
+        "keyword_coverage": round(len(matched) / len(keywords), 3) if keywords else None,
+        "keywords_matched": matched,
+        "keywords_missing": missing,
+    }
+
+
+def provisional_scores(metrics: Dict[str, Any]) -> Dict[str, int]:
+    """Rough 0-100 scores from metrics alone, shown until (or instead of) AI
+    feedback. These are heuristics, not grades."""
+    if not metrics.get("word_count"):
+        return {"grammar_score": 0, "clarity_score": 0, "keyword_usage_score": 0}
+
+    # Clarity: readable sentences of moderate length
+    sentence_length = metrics["avg_sentence_length"]
+    length_penalty = max(0.0, abs(sentence_length - 18) - 7) * 3
+    reading_ease = max(0.0, min(100.0, metrics["flesch_reading_ease"]))
+    clarity = 0.6 * (100 - length_penalty) + 0.4 * max(reading_ease, 40)
+
+    # Grammar proxy: run-on or fragment-heavy writing and very short essays
+    grammar = 100 - length_penalty - (20 if metrics["word_count"] < 50 else 0)
+
+    coverage = metrics.get("keyword_coverage")
+    keyword_usage = 100 * coverage if coverage is not None else 50 + 50 * min(1.0, metrics["type_token_ratio"])
+
+    return {
+        "grammar_score": int(max(0, min(100, round(grammar)))),
+        "clarity_score": int(max(0, min(100, round(clarity)))),
+        "keyword_usage_score": int(max(0, min(100, round(keyword_usage)))),
+    }
+
+
+def metrics_summary(metrics: Dict[str, Any]) -> str:
+    """One-paragraph digest for the LLM prompt so it needn't count things itself."""
+    parts = [
+        f"{metrics['word_count']} words",
+        f"{metrics['sentence_count']} sentences",
+        f"{metrics['paragraph_count']} paragraphs",
+        f"average sentence length {metrics['avg_sentence_length']} words",
+        f"Flesch reading ease {metrics['flesch_reading_ease']}",
+    ]
+    if metrics.get("keyword_coverage") is not None:
+        parts.append(f"keyword coverage {round(metrics['keyword_coverage'] * 100)}%")
+        if metrics["keywords_missing"]:
+            parts.append("missing keywords: " + ", ".join(metrics["keywords_missing"][:10]))
+    return "Measured (do not recount): " + "; ".join(parts) + "."
+
+
+def apply_essay_metrics(feedback: Dict[str, Any], metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """For feedback merged from sections graded on their own: keyword usage
+    is a whole-essay measure, so it comes from the measured coverage, and
+    missing keywords lead the suggestions."""
+    if metrics.get("keyword_coverage") is None:
+        return feedback
+    feedback["keyword_usage_score"] = provisional_scores(metrics)["keyword_usage_score"]
+    missing = metrics.get("keywords_missing") or []
+    if missing:
+        suggestion = f"Consider addressing: {', '.join(missing[:5])}"
+        suggestions = [s for s in feedback.get("suggestions") or [] if s != suggestion]
+        feedback["suggestions"] = [suggestion, *suggestions][:MAX_LIST_ITEMS]
+    return feedback
@@ -0,0 +1,136 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, literal, union_all
+from sqlalchemy.orm import Session
+
+from models import Essay, EssaySubmission, Quiz, QuizSubmission
+
+GRANULARITIES = ("day", "week", "month")
+DEFAULT_SPAN = {"day": timedelta(days=30), "week": timedelta(weeks=12), "month": timedelta(days=365)}
+MAX_BUCKETS = 1000
+
+
+def bucket_start(value: date, granularity: str) -> date:
+    """Python twin of the SQL bucketing (weeks start on Monday)."""
+    if granularity == "week":
+        return value - timedelta(days=value.weekday())
+    if granularity == "month":
+        return value.replace(day=1)
+    return value
+
+
+def next_bucket(value: date, granularity: str) -> date:
+    if granularity == "week":
+        return value + timedelta(weeks=1)
+    if granularity == "month":
+        return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return value + timedelta(days=1)
+
+
+def _bucket_expression(db: Session, column, granularity: str):
+    if db.get_bind().dialect.name == "sqlite":
+        if granularity == "week":
+            return func.date(column, "weekday 0", "-6 days")
+        if granularity == "month":
+            return func.strftime("%Y-%m-01", column)
+        return func.date(column)
+    return func.date_trunc(granularity, column)
+
+
+def _as_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def score_series(
+    db: Session,
+    teacher_id: int,
+    granularity: str = "week",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    kind: str = "all",
+    quiz_id: Optional[int] = None,
+    essay_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+    fill: bool = True,
+) -> List[Dict[str, Any]]:
+    """Average score per disjoint time bucket, computed in a single grouped
+    query over the (assignment, submitted_at) indexes."""
+    end = end or datetime.now(timezone.utc)
+    start = start or end - DEFAULT_SPAN[granularity]
+
+    selects = []
+    if kind in ("all", "quiz") and essay_id is None:
+        query = db.query(
+            QuizSubmission.submitted_at.label("submitted_at"),
+            QuizSubmission.score.label("score"),
+            QuizSubmission.student_id.label("student_id"),
+            literal("quiz").label("kind")
+        ).join(Quiz, Quiz.id == QuizSubmission.quiz_id).filter(
+            Quiz.teacher_id == teacher_id,
+            QuizSubmission.submitted_at >= start,
+            QuizSubmission.submitted_at < end
+        )
+        if quiz_id is not None:
+            query = query.filter(QuizSubmission.quiz_id == quiz_id)
+        if student_id is not None:
+            query = query.filter(QuizSubmission.student_id == student_id)
+        selects.append(query.statement)
+
+    if kind in ("all", "essay") and quiz_id is None:
+        query = db.query(
+            EssaySubmission.submitted_at.label("submitted_at"),
+            EssaySubmission.score.label("score"),
+            EssaySubmission.student_id.label("student_id"),
+            literal("essay").label("kind")
+        ).join(Essay, Essay.id == EssaySubmission.essay_id).filter(
+            Essay.teacher_id == teacher_id,
+            EssaySubmission.submitted_at >= start,
+            EssaySubmission.submitted_at < end
+        )
+        if essay_id is not None:
+            query = query.filter(EssaySubmission.essay_id == essay_id)
+        if student_id is not None:
+            query = query.filter(EssaySubmission.student_id == student_id)
+        selects.append(query.statement)
+
+    rows = []
+    if selects:
+        submissions = (union_all(*selects) if len(selects) > 1 else selects[0]).subquery()
+        bucket = _bucket_expression(db, submissions.c.submitted_at, granularity).label("bucket")
+        rows = db.query(
+            bucket,
+            func.avg(submissions.c.score),
+            func.count(submissions.c.score),
+            func.count(func.distinct(submissions.c.student_id))
+        ).group_by(bucket).order_by(bucket).all()
+
+    return series_from_rows(rows, granularity, start, end, fill)
+
+
+def series_from_rows(rows, granularity: str, start: datetime, end: datetime, fill: bool = True) -> List[Dict[str, Any]]:
+    """(bucket, average, submissions, students) rows -> series entries."""
+    by_bucket = {
+        _as_date(bucket_value): {
+            "bucket": _as_date(bucket_value),
+            "average": round(float(average), 1) if average is not None else None,
+            "submissions": count,
+            "students": students,
+        }
+        for bucket_value, average, count, students in rows
+    }
+    if not fill:
+        return list(by_bucket.values())
+
+    # Zero-fill so charts get a continuous axis
+    series = []
+    current = bucket_start(_as_date(start), granularity)
+    last = _as_date(end)
+    while current <= last and len(series) < MAX_BUCKETS:
+        series.append(by_bucket.get(current, {"bucket": current, "average": None, "submissions": 0, "students": 0}))
+        current = next_bucket(current, granularity)
+    return series